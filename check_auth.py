@@ -1,19 +1,16 @@
-import xmlrpc.client
-import ssl
+from odoo_jsonrpc import jsonrpc_services
 
 url = "https://aulavie.xtd.es/"
 db = "aulavie"
 username = "admin"
 password = "admin"
+common, models = jsonrpc_services(url)
 
 try:
-    context = ssl._create_unverified_context()
-    common = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/common", context=context)
     uid = common.authenticate(db, username, password, {})
     print(f"UID: {uid}")
 
     if uid:
-        models = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/object", context=context)
         # Check fields of res.users
         fields = models.execute_kw(
             db,
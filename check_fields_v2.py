@@ -1,15 +1,12 @@
-import xmlrpc.client
-import ssl
+from odoo_jsonrpc import jsonrpc_services
 
 url = "https://aulavie.xtd.es/"
 db = "aulavie"
 username = "admin"
 password = "admin"
+common, models = jsonrpc_services(url)
 
 try:
-    ctx = ssl._create_unverified_context()
-    common = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/common", context=ctx)
-    models = xmlrpc.client.ServerProxy(f"{url}/xmlrpc/2/object", context=ctx)
     uid = common.authenticate(db, username, password, {})
 
     if not uid:
@@ -20,7 +17,13 @@ try:
 
     # Check fields of res.users filtering for 'group'
     fields = models.execute_kw(
-        db, uid, password, "res.users", "fields_get", [], {"attributes": ["type"]}
+        db,
+        uid,
+        password,
+        "res.users",
+        "fields_get",
+        [],
+        {"attributes": ["type"]},
     )
     keys = sorted(fields.keys())
     group_fields = [k for k in keys if "group" in k]
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Benchmark reproducible de provision.py contra el Odoo simulado (mock_odoo.py).
+
+Para cada escenario (número de usuarios) crea una base de datos limpia en el
+servidor simulado, ejecuta el provisioning completo de provision.yml tres veces
+(`cold`: DB recién creada, `rerun`: todo ya aplicado, `forced`: re-ejecución
+con --force, verificando todas las etapas) y mide llamadas RPC
+(vistas por el cliente y por el servidor) y tiempo total.
+
+Uso:
+    python3 benchmark.py                        # 1, 100 y 5000 usuarios
+    python3 benchmark.py --users 1 100 --latency-ms 20 --json bench.json
+    python3 benchmark.py --baseline bench.json  # sale con 1 si hay regresión
+"""
+
+import argparse
+import copy
+import csv
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import provision
+from mock_odoo import MockOdoo, MockOdooServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ADMIN_LOGIN = "admin"
+ADMIN_PASSWORD = "bench-admin"
+MASTER_PASSWORD = "bench-master"
+
+
+def scenario_config(
+    base: Dict[str, Any], url: str, db: str, n_users: int
+) -> Dict[str, Any]:
+    # provision.yml apuntando al servidor simulado con `n_users` usuarios. Sin
+    # contraseña en el YAML (se reescribiría en cada ejecución, ver ensure_users)
+    cfg = copy.deepcopy(base)
+    cfg["odoo"].update(
+        base_url=url,
+        db=db,
+        admin_login=ADMIN_LOGIN,
+        admin_password=ADMIN_PASSWORD,
+        master_password=MASTER_PASSWORD,
+    )
+    cfg["settings"]["ir_config_parameter"][0]["value"] = url
+    template = [u for u in base.get("users") or [] if u.get("groups")]
+    groups = template[0]["groups"] if template else []
+    users = []
+    for i in range(n_users):
+        users.append(
+            {
+                "name": f"Usuario {i}",
+                "login": f"user{i}@bench.local",
+                "email": f"user{i}@bench.local",
+                "lang": "es_ES",
+                # Alterna usuarios internos y administradores
+                "groups": groups if i % 2 else groups[:2],
+            }
+        )
+    cfg["users"] = users
+    return cfg
+
+
+def write_partners_csv(path: str, n_rows: int):
+    # CSV en formato de importación de Odoo para la etapa `data`
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "email", "country_id/id"])
+        for i in range(n_rows):
+            writer.writerow(
+                [
+                    f"bench_partner_{i}",
+                    f"Contacto {i}",
+                    f"partner{i}@bench.local",
+                    "base.es" if i % 2 else "base.fr",
+                ]
+            )
+
+
+def template_country_error(
+    odoo: MockOdoo, cfg: Dict[str, Any], prefix: str
+) -> Optional[str]:
+    # La plantilla se crea con el país de la compañía (company.country_code)
+    lang, country = provision.template_language_country(cfg)
+    modules = (cfg.get("modules", {}) or {}).get("install", []) or []
+    name = provision.template_name(prefix, modules, lang, country)
+    db = odoo.dbs.get(name)
+    if db is None:
+        return f"no existe la plantilla {name}"
+    company = db.table("res.company")[min(db.table("res.company"))]
+    country_id = company.get("country_id")
+    code = db.table("res.country")[country_id]["code"] if country_id else ""
+    if code != country:
+        return f"plantilla {name} con país {code!r}, se esperaba {country!r}"
+    return None
+
+
+def run_once(
+    odoo: MockOdoo, cfg: Dict[str, Any], args: argparse.Namespace
+) -> Dict[str, Any]:
+    provision.RPC_STATS.reset()
+    odoo.reset_stats()
+    start = time.perf_counter()
+    ok = True
+    try:
+        provision.provision(cfg, args)
+    except SystemExit:
+        ok = False
+    elapsed = time.perf_counter() - start
+    server = odoo.stats()
+    client = provision.RPC_STATS.summary()
+    return {
+        "ok": ok,
+        "wall_s": round(elapsed, 3),
+        "server_requests": server["requests"],
+        "client_calls": client["calls"],
+        "retries": client["retries"],
+        "calls": server["calls"],
+    }
+
+
+def run_benchmark(opts: argparse.Namespace) -> List[Dict[str, Any]]:
+    base = provision.load_config(opts.config)
+    odoo = MockOdoo(
+        latency=opts.latency_ms / 1000.0,
+        admin_login=ADMIN_LOGIN,
+        admin_password=ADMIN_PASSWORD,
+        master_password=MASTER_PASSWORD,
+        install_delay=opts.install_delay_ms / 1000.0,
+    )
+    server = MockOdooServer(odoo).start()
+    provision_args = provision.parse_args(
+        [
+            "--config",
+            opts.config,
+            "--protocol",
+            opts.protocol,
+            "--install-mode",
+            opts.install_mode,
+            "--engine",
+            opts.engine,
+            "--concurrency",
+            str(opts.concurrency),
+            "--batch-size",
+            str(opts.batch_size),
+            "--max-retries",
+            "1",
+        ]
+        + (["--template"] if opts.template else [])
+    )
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            provision.CACHE_DIR = cache_dir
+            for n_users in opts.users:
+                db = f"bench_{n_users}"
+                if not opts.template:
+                    odoo.add_database(db)
+                cfg = scenario_config(base, server.url, db, n_users)
+                if opts.data_rows:
+                    path = os.path.join(cache_dir, "partners.csv")
+                    write_partners_csv(path, opts.data_rows)
+                    cfg["data"] = {"files": [{"model": "res.partner", "file": path}]}
+                for run in ("cold", "rerun", "forced"):
+                    run_args = argparse.Namespace(**vars(provision_args))
+                    run_args.force = run == "forced"
+                    res = run_once(odoo, cfg, run_args)
+                    res.update(users=n_users, run=run)
+                    if opts.template and run == "cold":
+                        error = template_country_error(
+                            odoo, cfg, provision_args.template_prefix
+                        )
+                        if error:
+                            print(f"  {error}", flush=True)
+                            res["ok"] = False
+                    results.append(res)
+                    print(
+                        f"{n_users:>6} usuarios {run:<6} "
+                        f"rpc={res['server_requests']:>5} "
+                        f"(cliente {res['client_calls']:>5}) "
+                        f"t={res['wall_s']:>7.3f}s "
+                        f"{'OK' if res['ok'] else 'FALLO'}",
+                        flush=True,
+                    )
+    finally:
+        server.stop()
+    return results
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    max_regression: float,
+) -> List[str]:
+    """
+    Compara con un benchmark anterior: cualquier aumento de llamadas RPC es una
+    regresión; el tiempo solo si empeora más de `max_regression` (fracción).
+    """
+    previous = {(r["users"], r["run"]): r for r in baseline}
+    problems = []
+    for res in results:
+        key = (res["users"], res["run"])
+        if not res["ok"]:
+            problems.append(f"{key}: el provisioning falló")
+        old = previous.get(key)
+        if old is None:
+            continue
+        if res["server_requests"] > old["server_requests"]:
+            problems.append(
+                f"{key}: llamadas RPC {old['server_requests']} -> {res['server_requests']}"
+            )
+        if res["wall_s"] > old["wall_s"] * (1 + max_regression) + 0.05:
+            problems.append(f"{key}: tiempo {old['wall_s']}s -> {res['wall_s']}s")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument("--config", default=os.path.join(HERE, "provision.yml"))
+    ap.add_argument("--users", type=int, nargs="+", default=[1, 100, 5000])
+    ap.add_argument(
+        "--latency-ms",
+        type=float,
+        default=5.0,
+        help="Latencia inyectada por petición en el servidor simulado",
+    )
+    ap.add_argument("--protocol", choices=["xmlrpc", "jsonrpc"], default="xmlrpc")
+    ap.add_argument(
+        "--install-mode", choices=["immediate", "batch"], default="immediate"
+    )
+    ap.add_argument(
+        "--install-delay-ms",
+        type=float,
+        default=0.0,
+        help="Tiempo simulado de instalación por módulo en el servidor",
+    )
+    ap.add_argument(
+        "--template",
+        action="store_true",
+        help="Crear cada DB clonando la plantilla de módulos (provision.py --template)",
+    )
+    ap.add_argument("--engine", choices=["rpc", "server"], default="rpc")
+    ap.add_argument(
+        "--data-rows",
+        type=int,
+        default=0,
+        help="Importar además un CSV de N contactos en la etapa `data`",
+    )
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--json", help="Guardar resultados en este fichero JSON")
+    ap.add_argument(
+        "--baseline", help="Resultados JSON anteriores con los que comparar"
+    )
+    ap.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.25,
+        help="Empeoramiento de tiempo tolerado frente a --baseline (0.25 = 25%%)",
+    )
+    opts = ap.parse_args()
+
+    # Solo avisos y errores de provision.py; el informe va por stdout
+    logging.getLogger("odoo_provision").setLevel(logging.WARNING)
+
+    results = run_benchmark(opts)
+    if opts.json:
+        with open(opts.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    problems = [
+        f"{(r['users'], r['run'])}: el provisioning falló"
+        for r in results
+        if not r["ok"]
+    ]
+    if opts.baseline:
+        with open(opts.baseline, "r", encoding="utf-8") as f:
+            problems = compare(results, json.load(f), opts.max_regression)
+    for problem in problems:
+        print(f"REGRESIÓN: {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1030 @@
+#!/usr/bin/env python3
+"""
+Servidor Odoo simulado (en memoria) para probar y medir provision.py sin
+tocar un tenant real.
+
+Implementa los servicios XML-RPC (/xmlrpc/2/common, /xmlrpc/2/object,
+/xmlrpc/2/db) y el endpoint /jsonrpc con los modelos que usa provision.py:
+res.company, res.country(.state), res.lang, ir.config_parameter,
+ir.module.module, base.module.upgrade, res.users, res.groups, ir.model,
+ir.model.data, ir.model.fields, ir.default, ir.actions.server,
+ir.mail_server, fetchmail.server y res.partner (importación con `load`).
+
+Uso:
+    python3 mock_odoo.py --port 8069 --latency-ms 20
+"""
+
+import argparse
+import copy
+import dis
+import gzip
+import itertools
+import json
+import logging
+import random
+import re
+import socket
+import threading
+import time
+import xmlrpc.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("mock_odoo")
+
+# Campos many2one por modelo: se guardan como id y se leen como [id, nombre]
+M2O = {
+    ("res.country.state", "country_id"): "res.country",
+    ("res.company", "country_id"): "res.country",
+    ("res.company", "state_id"): "res.country.state",
+    ("ir.default", "field_id"): "ir.model.fields",
+    ("ir.actions.server", "model_id"): "ir.model",
+    ("ir.model.fields", "model_id"): "ir.model",
+    ("res.partner", "country_id"): "res.country",
+    ("res.partner", "parent_id"): "res.partner",
+}
+
+# Modelos con campo `active` (se filtran salvo context active_test=False)
+ACTIVE_MODELS = {"res.lang", "res.users", "ir.mail_server", "fetchmail.server"}
+
+# Valores por defecto al crear registros
+DEFAULTS = {
+    "res.users": {"active": True, "lang": "en_US", "groups_id": []},
+    "res.lang": {"active": False},
+    "ir.mail_server": {"active": True},
+    "fetchmail.server": {"active": True, "state": "draft"},
+    "ir.module.module": {"state": "uninstalled"},
+    "ir.actions.server": {"state": "code", "code": ""},
+}
+
+# Opcodes que safe_eval de Odoo no admite en el código de ir.actions.server
+# (imports, `with`, generadores, clases); basta con los que podría usar el
+# código de provision.py
+UNSAFE_OPCODES = {
+    "IMPORT_NAME",
+    "IMPORT_FROM",
+    "IMPORT_STAR",
+    "SETUP_WITH",
+    "BEFORE_WITH",
+    "SETUP_ASYNC_WITH",
+    "BEFORE_ASYNC_WITH",
+    "WITH_EXCEPT_START",
+    "YIELD_VALUE",
+    "YIELD_FROM",
+    "GET_AWAITABLE",
+    "LOAD_BUILD_CLASS",
+}
+
+# Módulos disponibles por defecto (los de provision.yml y algunos más)
+DEFAULT_MODULES = [
+    "base",
+    "web",
+    "contacts",
+    "mail",
+    "account",
+    "website",
+    "crm",
+    "l10n_es",
+    "sale_management",
+    "sales_team",
+    "purchase",
+    "web_responsive",
+    "l10n_es_partner",
+    "stock",
+    "l10n_es_aeat",
+    "l10n_es_sii",
+]
+
+# Grupos (XML ID) que aporta cada módulo al instalarse
+MODULE_GROUPS = {
+    "base": [
+        "base.group_user",
+        "base.group_system",
+        "base.group_erp_manager",
+        "base.group_partner_manager",
+        "base.group_no_one",
+    ],
+    "account": ["account.group_account_manager"],
+    "sale_management": ["sales_team.group_sale_manager"],
+    "purchase": ["purchase.group_purchase_manager"],
+    "website": ["website.group_website_designer"],
+}
+
+
+class MockError(Exception):
+    # Se devuelve al cliente como Fault (XML-RPC) o error (JSON-RPC)
+    pass
+
+
+def check_safe_eval(code: str) -> None:
+    # Como test_python_expr(mode="exec") de Odoo: compila y recorre los opcodes
+    # (también de funciones y comprensiones anidadas)
+    try:
+        pending = [compile(code, "<ir.actions.server>", "exec")]
+    except SyntaxError as e:
+        raise MockError(f"Código de la acción no válido: {e}")
+    while pending:
+        co = pending.pop()
+        for ins in dis.get_instructions(co):
+            if ins.opname in UNSAFE_OPCODES:
+                raise MockError(f"forbidden opcode(s) in code: {ins.opname}")
+        dunder = [n for n in co.co_names if n.startswith("__")]
+        if dunder:
+            raise MockError(f"Acceso prohibido a {dunder[0]} en el código")
+        pending += [c for c in co.co_consts if hasattr(c, "co_code")]
+
+
+def like_regex(pattern: str, sql: bool) -> "re.Pattern":
+    if not sql:
+        return re.compile(re.escape(pattern), re.IGNORECASE)
+    parts = [".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern]
+    return re.compile("^" + "".join(parts) + "$", re.DOTALL)
+
+
+class MockDatabase:
+    """
+    Base de datos en memoria: {modelo: {id: registro}} con un evaluador de
+    dominios (notación polaca con &, |, ! y rutas many2one con punto).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        admin_login: str = "admin",
+        admin_password: str = "admin",
+        modules: Optional[List[str]] = None,
+    ):
+        self.name = name
+        self.tables: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._ids = itertools.count(1)
+        self.seed(admin_login, admin_password, modules or DEFAULT_MODULES)
+
+    def clone(self, name: str) -> "MockDatabase":
+        other = copy.copy(self)
+        other.name = name
+        other.tables = copy.deepcopy(self.tables)
+        start = max((i for t in self.tables.values() for i in t), default=0) + 1
+        other._ids = itertools.count(start)
+        return other
+
+    # -- datos iniciales -------------------------------------------------
+
+    def seed(self, admin_login: str, admin_password: str, modules: List[str]):
+        self.insert("ir.model", {"model": "res.users", "name": "Usuario"})
+        partner_model = self.insert(
+            "ir.model", {"model": "res.partner", "name": "Contacto"}
+        )
+        self.insert(
+            "ir.model.fields",
+            {"model": "res.partner", "name": "lang", "model_id": partner_model},
+        )
+        spain = self.insert("res.country", {"code": "ES", "name": "España"})
+        france = self.insert("res.country", {"code": "FR", "name": "Francia"})
+        for name, res_id in (("es", spain), ("fr", france)):
+            self.insert(
+                "ir.model.data",
+                {
+                    "module": "base",
+                    "name": name,
+                    "model": "res.country",
+                    "res_id": res_id,
+                },
+            )
+        self.insert(
+            "res.country.state", {"country_id": spain, "name": "Sevilla", "code": "SE"}
+        )
+        self.insert(
+            "res.country.state", {"country_id": spain, "name": "Madrid", "code": "M"}
+        )
+        self.insert(
+            "res.company",
+            {"name": "My Company", "email": False, "country_id": False},
+        )
+        self.insert(
+            "res.lang", {"code": "en_US", "name": "English (US)", "active": True}
+        )
+        self.insert("res.lang", {"code": "es_ES", "name": "Spanish / Español"})
+        self.insert("res.lang", {"code": "fr_FR", "name": "French / Français"})
+        for name in modules:
+            self.insert("ir.module.module", {"name": name})
+        self.install_modules(self.search("ir.module.module", [("name", "=", "base")]))
+        self.insert(
+            "res.users",
+            {
+                "login": admin_login,
+                "password": admin_password,
+                "name": "Administrator",
+                "email": False,
+                "groups_id": [self.xml_id("base.group_system")],
+            },
+        )
+
+    def xml_id(self, xml_id: str) -> Optional[int]:
+        module, name = xml_id.split(".", 1)
+        for rec in self.table("ir.model.data").values():
+            if rec["module"] == module and rec["name"] == name:
+                return rec["res_id"]
+        return None
+
+    def install_modules(self, ids: List[int]) -> int:
+        # Devuelve cuántos módulos se han instalado realmente
+        installed = 0
+        for rec in (self.table("ir.module.module")[i] for i in ids):
+            if rec["state"] == "installed":
+                continue
+            rec["state"] = "installed"
+            installed += 1
+            for xml_id in MODULE_GROUPS.get(rec["name"], []):
+                if self.xml_id(xml_id):
+                    continue
+                module, name = xml_id.split(".", 1)
+                gid = self.insert("res.groups", {"name": name})
+                self.insert(
+                    "ir.model.data",
+                    {
+                        "module": module,
+                        "name": name,
+                        "model": "res.groups",
+                        "res_id": gid,
+                    },
+                )
+        return installed
+
+    # -- acceso a tablas -------------------------------------------------
+
+    def table(self, model: str) -> Dict[int, Dict[str, Any]]:
+        return self.tables.setdefault(model, {})
+
+    def insert(self, model: str, vals: Dict[str, Any]) -> int:
+        new_id = next(self._ids)
+        rec = dict(copy.deepcopy(DEFAULTS.get(model, {})), **vals)
+        rec["id"] = new_id
+        self.table(model)[new_id] = rec
+        return new_id
+
+    def display_name(self, model: str, rec_id: int) -> str:
+        rec = self.table(model).get(rec_id) or {}
+        return str(rec.get("name") or rec.get("model") or f"{model},{rec_id}")
+
+    def read_value(self, model: str, rec: Dict[str, Any], field: str) -> Any:
+        value = rec.get(field, False)
+        comodel = M2O.get((model, field))
+        if comodel and value:
+            return [value, self.display_name(comodel, value)]
+        if value is None:
+            return False
+        return copy.deepcopy(value)
+
+    def field_value(self, model: str, rec: Dict[str, Any], path: str) -> Any:
+        field, _, rest = path.partition(".")
+        value = rec.get(field, False)
+        if not rest:
+            return value
+        comodel = M2O.get((model, field))
+        target = self.table(comodel).get(value) if comodel and value else None
+        if target is None:
+            return False
+        return self.field_value(comodel, target, rest)
+
+    # -- dominios --------------------------------------------------------
+
+    def match_leaf(self, model: str, rec: Dict[str, Any], leaf) -> bool:
+        path, op, value = leaf
+        current = self.field_value(model, rec, path)
+        if op == "=":
+            return current == value or (not current and value is False)
+        if op == "!=":
+            return not (current == value or (not current and value is False))
+        if op == "in":
+            return current in value
+        if op == "not in":
+            return current not in value
+        if op in ("like", "ilike", "not like", "not ilike"):
+            found = bool(like_regex(str(value), False).search(str(current or "")))
+            return found if not op.startswith("not") else not found
+        if op in ("=like", "=ilike"):
+            regex = like_regex(str(value), True)
+            if op == "=ilike":
+                regex = re.compile(regex.pattern, re.IGNORECASE | re.DOTALL)
+            return bool(regex.match(str(current or "")))
+        if op in ("<", "<=", ">", ">="):
+            if current is False or current is None:
+                return False
+            return {
+                "<": current < value,
+                "<=": current <= value,
+                ">": current > value,
+                ">=": current >= value,
+            }[op]
+        raise MockError(f"Operador de dominio no soportado: {op}")
+
+    def match(self, model: str, rec: Dict[str, Any], domain: List[Any]) -> bool:
+        stack: List[bool] = []
+        for term in reversed(domain):
+            if term == "&":
+                a, b = stack.pop(), stack.pop()
+                stack.append(a and b)
+            elif term == "|":
+                a, b = stack.pop(), stack.pop()
+                stack.append(a or b)
+            elif term == "!":
+                stack.append(not stack.pop())
+            else:
+                stack.append(self.match_leaf(model, rec, term))
+        return all(stack)
+
+    def search(
+        self,
+        model: str,
+        domain: List[Any],
+        offset: int = 0,
+        limit: Optional[int] = None,
+        order: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> List[int]:
+        active_test = (context or {}).get("active_test", True)
+        skip_inactive = (
+            model in ACTIVE_MODELS
+            and active_test
+            and not any(
+                isinstance(t, (list, tuple)) and t[0] == "active" for t in domain
+            )
+        )
+        # Los operandos de `in` se convierten a set una sola vez por búsqueda
+        domain = [
+            (
+                (t[0], t[1], frozenset(t[2]))
+                if isinstance(t, (list, tuple))
+                and t[1] in ("in", "not in")
+                and all(isinstance(v, (str, int)) for v in t[2])
+                else t
+            )
+            for t in domain
+        ]
+        rows = [
+            rec
+            for rec in self.table(model).values()
+            if not (skip_inactive and not rec.get("active"))
+            and self.match(model, rec, domain)
+        ]
+        for part in reversed((order or "id").split(",")):
+            field, _, direction = part.strip().partition(" ")
+            rows.sort(
+                key=lambda r: (r.get(field) is False, r.get(field) or 0),
+                reverse=direction.strip().lower() == "desc",
+            )
+        ids = [r["id"] for r in rows][offset:]
+        return ids[:limit] if limit else ids
+
+    def read(self, model: str, ids: List[int], fields: Optional[List[str]] = None):
+        table = self.table(model)
+        result = []
+        for rec_id in ids:
+            rec = table.get(rec_id)
+            if rec is None:
+                raise MockError(f"Registro {model}({rec_id}) no existe")
+            names = fields or [f for f in rec if f != "password"]
+            row = {f: self.read_value(model, rec, f) for f in names if f != "id"}
+            row["id"] = rec_id
+            result.append(row)
+        return result
+
+
+class MockOdoo:
+    """
+    Estado del servidor simulado: bases de datos, autenticación, latencia
+    inyectada y contadores de llamadas por (modelo, método).
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        admin_login: str = "admin",
+        admin_password: str = "admin",
+        master_password: str = "admin",
+        modules: Optional[List[str]] = None,
+        install_delay: float = 0.0,
+    ):
+        self.latency = latency
+        self.install_delay = install_delay
+        self.local = threading.local()
+        self.jitter = jitter
+        self.admin_login = admin_login
+        self.admin_password = admin_password
+        self.master_password = master_password
+        self.modules = modules or DEFAULT_MODULES
+        self.dbs: Dict[str, MockDatabase] = {}
+        self.lock = threading.RLock()
+        self.calls: Dict[Tuple[str, str], int] = {}
+        self.requests = 0
+
+    # -- utilidades ------------------------------------------------------
+
+    def add_database(
+        self,
+        name: str,
+        login: Optional[str] = None,
+        password: Optional[str] = None,
+    ) -> MockDatabase:
+        with self.lock:
+            db = MockDatabase(
+                name,
+                login or self.admin_login,
+                password or self.admin_password,
+                self.modules,
+            )
+            self.dbs[name] = db
+            return db
+
+    def count(self, model: str, method: str):
+        with self.lock:
+            self.requests += 1
+            self.calls[(model, method)] = self.calls.get((model, method), 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "calls": {
+                    f"{m}.{meth}": n for (m, meth), n in sorted(self.calls.items())
+                },
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = 0
+            self.calls = {}
+
+    def sleep(self):
+        delay = (
+            self.latency + random.uniform(0, self.jitter)
+            if self.jitter
+            else self.latency
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_db(self, name: str) -> MockDatabase:
+        db = self.dbs.get(name)
+        if db is None:
+            raise MockError(f'database "{name}" does not exist')
+        return db
+
+    def check_user(self, db: MockDatabase, uid: int, password: str):
+        rec = db.table("res.users").get(uid)
+        if not rec or not rec.get("active") or rec.get("password") != password:
+            raise MockError("Access Denied")
+
+    # -- servicios -------------------------------------------------------
+
+    def dispatch(self, service: str, method: str, args: List[Any]) -> Any:
+        self.sleep()
+        handler = getattr(self, f"svc_{service}_{method}", None)
+        if handler is None:
+            raise MockError(f"Método {service}.{method} no soportado")
+        if service != "object":
+            self.count(service, method)
+        with self.lock:
+            result = handler(*args)
+        # Tiempo de instalación de módulos simulado, fuera del lock como en Odoo
+        delay, self.local.delay = getattr(self.local, "delay", 0.0), 0.0
+        if delay:
+            time.sleep(delay)
+        return result
+
+    def install(self, db: MockDatabase, ids: List[int]):
+        installed = db.install_modules(ids)
+        self.local.delay = getattr(self.local, "delay", 0.0) + (
+            installed * self.install_delay
+        )
+
+    def svc_common_version(self):
+        return {
+            "server_version": "17.0",
+            "server_version_info": [17, 0, 0, "final", 0, ""],
+        }
+
+    def svc_common_authenticate(self, db_name, login, password, user_agent_env=None):
+        db = self.get_db(db_name)
+        for rec in db.table("res.users").values():
+            if rec["login"] == login and rec.get("active"):
+                return rec["id"] if rec.get("password") == password else False
+        return False
+
+    def svc_common_login(self, db_name, login, password):
+        return self.svc_common_authenticate(db_name, login, password)
+
+    def svc_db_list(self):
+        return sorted(self.dbs)
+
+    def svc_db_db_exist(self, name):
+        return name in self.dbs
+
+    def check_master(self, master_password):
+        if master_password != self.master_password:
+            raise MockError("Access Denied")
+
+    def svc_db_create_database(
+        self,
+        master_password,
+        name,
+        demo=False,
+        lang="en_US",
+        user_password="admin",
+        login="admin",
+        country_code=None,
+        phone=None,
+    ):
+        self.check_master(master_password)
+        if name in self.dbs:
+            raise MockError(f"Database {name} already exists")
+        db = self.add_database(name, login, user_password)
+        for rec in db.table("res.lang").values():
+            rec["active"] = rec["active"] or rec["code"] == lang
+        if country_code:
+            # Como Odoo: el país de la compañía principal
+            countries = db.search("res.country", [("code", "=", country_code.upper())])
+            company = db.table("res.company")[min(db.table("res.company"))]
+            company["country_id"] = countries[0] if countries else False
+        return True
+
+    def svc_db_duplicate_database(self, master_password, source, name, *args):
+        self.check_master(master_password)
+        if name in self.dbs:
+            raise MockError(f"Database {name} already exists")
+        self.dbs[name] = self.get_db(source).clone(name)
+        return True
+
+    def svc_object_execute_kw(
+        self, db_name, uid, password, model, method, args=None, kwargs=None
+    ):
+        self.count(model, method)
+        db = self.get_db(db_name)
+        self.check_user(db, uid, password)
+        args = list(args or [])
+        kwargs = dict(kwargs or {})
+        context = kwargs.pop("context", None) or {}
+        special = getattr(self, f"m_{model.replace('.', '_')}_{method}", None)
+        if special is not None:
+            return special(db, *args, context=context, **kwargs)
+        generic = getattr(self, f"m_{method}", None)
+        if generic is None:
+            raise MockError(f"Método {model}.{method} no soportado")
+        return generic(db, model, *args, context=context, **kwargs)
+
+    # -- métodos ORM genéricos --------------------------------------------
+
+    def m_search(
+        self, db, model, domain, offset=0, limit=None, order=None, context=None
+    ):
+        return db.search(model, domain, offset, limit, order, context)
+
+    def m_search_count(self, db, model, domain, context=None, **kwargs):
+        return len(db.search(model, domain, context=context))
+
+    def m_search_read(
+        self,
+        db,
+        model,
+        domain=None,
+        fields=None,
+        offset=0,
+        limit=None,
+        order=None,
+        context=None,
+    ):
+        ids = db.search(model, domain or [], offset, limit, order, context)
+        return db.read(model, ids, fields)
+
+    def m_read(self, db, model, ids, fields=None, context=None):
+        return db.read(model, ids if isinstance(ids, list) else [ids], fields)
+
+    def m_create(self, db, model, vals, context=None):
+        many = isinstance(vals, list)
+        vals_list = vals if many else [vals]
+        if model == "res.users":
+            logins = {u["login"] for u in db.table(model).values()}
+            for v in vals_list:
+                if v.get("login") in logins:
+                    raise MockError(f"Ya existe un usuario con login {v.get('login')}")
+                logins.add(v.get("login"))
+        if model == "ir.actions.server":
+            for v in vals_list:
+                check_safe_eval(v.get("code") or "")
+        ids = [db.insert(model, dict(v)) for v in vals_list]
+        return ids if many else ids[0]
+
+    def m_write(self, db, model, ids, vals, context=None):
+        table = db.table(model)
+        if model == "ir.actions.server" and "code" in vals:
+            check_safe_eval(vals["code"] or "")
+        for rec_id in ids:
+            if rec_id not in table:
+                raise MockError(f"Registro {model}({rec_id}) no existe")
+            table[rec_id].update(copy.deepcopy(vals))
+        return True
+
+    def m_unlink(self, db, model, ids, context=None):
+        table = db.table(model)
+        for rec_id in ids:
+            table.pop(rec_id, None)
+        return True
+
+    def m_load(self, db, model, fields, data, context=None):
+        # Importación al estilo de Odoo: columna `.id` (id de base de datos) o
+        # `id` (XML ID) y `campo/id` para many2one; si una fila falla no se
+        # importa nada del bloque
+        snapshot = copy.deepcopy(db.tables)
+        xml_ids = {
+            (r["module"], r["name"]): r for r in db.table("ir.model.data").values()
+        }
+        ids, messages = [], []
+        for index, row in enumerate(data):
+            vals, xml_id, res_id = {}, None, None
+            try:
+                for field, value in zip(fields, row):
+                    if field == ".id":
+                        res_id = int(value) if value else None
+                    elif field == "id":
+                        module, _, name = value.rpartition(".")
+                        xml_id = (module or "__import__", name)
+                    elif field.endswith("/id"):
+                        module, _, name = value.rpartition(".")
+                        ref = xml_ids.get((module or "__import__", name))
+                        if value and ref is None:
+                            raise MockError(f"No se encuentra el XML ID {value}")
+                        vals[field[:-3]] = ref["res_id"] if ref else False
+                    else:
+                        vals[field] = value
+                if "name" in vals and not vals["name"]:
+                    raise MockError("El campo 'name' es obligatorio")
+            except MockError as e:
+                messages.append({"type": "error", "record": index, "message": str(e)})
+                continue
+            if res_id is not None:
+                if res_id not in db.table(model):
+                    messages.append(
+                        {
+                            "type": "error",
+                            "record": index,
+                            "message": f"No existe {model}({res_id})",
+                        }
+                    )
+                    continue
+                db.table(model)[res_id].update(vals)
+                ids.append(res_id)
+                continue
+            existing = xml_ids.get(xml_id) if xml_id else None
+            if existing and existing["model"] != model:
+                messages.append(
+                    {
+                        "type": "error",
+                        "record": index,
+                        "message": f"El XML ID {'.'.join(xml_id)} es de otro modelo",
+                    }
+                )
+                continue
+            if existing and existing["res_id"] in db.table(model):
+                db.table(model)[existing["res_id"]].update(vals)
+                ids.append(existing["res_id"])
+                continue
+            rec_id = db.insert(model, vals)
+            ids.append(rec_id)
+            if xml_id:
+                xml_ids[xml_id] = db.table("ir.model.data")[
+                    db.insert(
+                        "ir.model.data",
+                        {
+                            "module": xml_id[0],
+                            "name": xml_id[1],
+                            "model": model,
+                            "res_id": rec_id,
+                        },
+                    )
+                ]
+        if messages:
+            db.tables = snapshot
+            return {"ids": False, "messages": messages}
+        return {"ids": ids, "messages": []}
+
+    def m_fields_get(self, db, model, allfields=None, attributes=None, context=None):
+        names = {f for rec in db.table(model).values() for f in rec}
+        names.update(DEFAULTS.get(model, {}))
+        result = {}
+        for name in sorted(allfields or names):
+            result[name] = {"type": "char", "string": name}
+            if (model, name) in M2O:
+                result[name].update(type="many2one", relation=M2O[(model, name)])
+        return result
+
+    # -- métodos específicos ----------------------------------------------
+
+    def m_ir_module_module_button_immediate_install(self, db, ids, context=None):
+        self.install(db, ids)
+        return True
+
+    def m_ir_module_module_button_install(self, db, ids, context=None):
+        table = db.table("ir.module.module")
+        for rec_id in ids:
+            if table[rec_id]["state"] != "installed":
+                table[rec_id]["state"] = "to install"
+        return True
+
+    def m_base_module_upgrade_upgrade_module(self, db, ids, context=None):
+        self.install(
+            db,
+            db.search(
+                "ir.module.module", [("state", "in", ["to install", "to upgrade"])]
+            ),
+        )
+        return True
+
+    def m_ir_actions_server_run(self, db, ids, context=None):
+        # Solo se simulan las acciones de provision.py (payload en contexto)
+        actions = db.table("ir.actions.server")
+        for action_id in ids if isinstance(ids, list) else [ids]:
+            if action_id in actions:
+                check_safe_eval(actions[action_id].get("code") or "")
+        if "provision_payload" in (context or {}):
+            return self.apply_payload(db, context["provision_payload"])
+        payload = (context or {}).get("provision_groups") or {}
+        users = db.table("res.users")
+        for user_id, group_ids in payload.items():
+            rec = users.get(int(user_id))
+            if rec is None:
+                continue
+            rec["groups_id"] = sorted(set(rec.get("groups_id") or []) | set(group_ids))
+        return False
+
+    def apply_payload(self, db: MockDatabase, payload: Dict[str, Any]):
+        # Equivalente de APPLY_ACTION_CODE: todo o nada, informe por operación
+        snapshot = copy.deepcopy(db.tables)
+        lookups: Dict[Tuple[str, str], Dict[Any, int]] = {}
+        report = []
+        for op in payload.get("ops") or []:
+            entry = {
+                "op": op["op"],
+                "model": op.get("model") or False,
+                "key": op.get("key") or False,
+                "status": "unchanged",
+                "fields": [],
+                "warnings": [],
+            }
+            report.append(entry)
+            try:
+                self.apply_op(db, op, entry, lookups)
+            except MockError as e:
+                entry["status"] = "error"
+                entry["error"] = str(e)
+        failed = any(e["status"] == "error" for e in report)
+        if failed or payload.get("dry_run"):
+            db.tables = snapshot
+        return {
+            "provision_report": report,
+            "rolled_back": bool(failed or payload.get("dry_run")),
+        }
+
+    def find_one(self, db: MockDatabase, model: str, domain, lookups) -> List[int]:
+        # Búsquedas (campo = valor) indexadas por payload: evita O(n²) con miles de usuarios
+        if len(domain) != 1 or domain[0][1] != "=":
+            return db.search(model, domain, limit=1, context={"active_test": False})
+        field, _, value = domain[0]
+        index = lookups.get((model, field))
+        if index is None:
+            index = lookups[(model, field)] = {}
+            for rec in db.table(model).values():
+                index.setdefault(rec.get(field), rec["id"])
+        return [index[value]] if value in index else []
+
+    def apply_op(
+        self,
+        db: MockDatabase,
+        op: Dict[str, Any],
+        entry: Dict[str, Any],
+        lookups: Dict[Tuple[str, str], Dict[Any, int]],
+    ):
+        inactive = {"active_test": False}
+        if op["op"] == "lang":
+            ids = db.search("res.lang", [("code", "=", op["key"])], context=inactive)
+            if not ids:
+                raise MockError(f"Idioma no encontrado: {op['key']}")
+            lang = db.table("res.lang")[ids[0]]
+            if not lang["active"]:
+                lang["active"] = True
+                entry.update(status="updated", fields=["active"])
+        elif op["op"] == "param":
+            ids = db.search("ir.config_parameter", [("key", "=", op["key"])])
+            if not ids:
+                db.insert(
+                    "ir.config_parameter", {"key": op["key"], "value": op["value"]}
+                )
+                entry.update(status="created", fields=["value"])
+            elif db.table("ir.config_parameter")[ids[0]]["value"] != op["value"]:
+                db.table("ir.config_parameter")[ids[0]]["value"] = op["value"]
+                entry.update(status="updated", fields=["value"])
+        elif op["op"] == "upsert":
+            model = op["model"]
+            vals = dict(op.get("vals") or {})
+            for field, (comodel, domain) in (op.get("refs") or {}).items():
+                target = db.search(comodel, domain, limit=1, context=inactive)
+                if target:
+                    vals[field] = target[0]
+                else:
+                    entry["warnings"].append(f"{comodel} no encontrado: {domain}")
+            domain = op.get("domain") or []
+            ids = self.find_one(db, model, domain, lookups)
+            if ids:
+                rec = db.table(model)[ids[0]]
+                changes = {
+                    k: v
+                    for k, v in vals.items()
+                    if (rec.get(k) or False) != (v if v not in (None, "") else False)
+                }
+                changes.update(op.get("always") or {})
+                if changes:
+                    rec.update(changes)
+                    entry.update(status="updated", fields=sorted(changes))
+            elif op.get("update_only"):
+                raise MockError(f"No existe ningún registro de {model}")
+            else:
+                vals.update(op.get("always") or {})
+                vals.update(op.get("create") or {})
+                rec = db.table(model)[db.insert(model, vals)]
+                if len(domain) == 1 and (model, domain[0][0]) in lookups:
+                    lookups[(model, domain[0][0])][domain[0][2]] = rec["id"]
+                entry.update(status="created", fields=sorted(vals))
+            entry["id"] = rec["id"]
+            new_groups = []
+            for xml_id in op.get("groups") or []:
+                gid = db.xml_id(xml_id)
+                if not gid:
+                    entry["warnings"].append(f"XML ID no encontrado: {xml_id}")
+                elif gid not in rec.get("groups_id", []):
+                    new_groups.append(gid)
+            if new_groups:
+                rec["groups_id"] = sorted(
+                    set(rec.get("groups_id") or []) | set(new_groups)
+                )
+                entry["fields"] = entry["fields"] + ["groups_id"]
+                if entry["status"] == "unchanged":
+                    entry["status"] = "updated"
+        else:
+            raise MockError(f"Operación desconocida: {op['op']}")
+
+
+class MockOdooHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOdoo/17.0"
+
+    def setup(self):
+        super().setup()
+        # Cabeceras y cuerpo van en dos write(): sin TCP_NODELAY, Nagle + ACK
+        # retardado añadirían ~40 ms a cada respuesta keep-alive
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        path = re.sub("/+", "/", self.path)
+        if path.endswith("/jsonrpc"):
+            self.reply(self.handle_jsonrpc(body), "application/json")
+            return
+        match = re.search(r"/xmlrpc/2/(\w+)$", path)
+        if not match:
+            self.send_error(404)
+            return
+        self.reply(self.handle_xmlrpc(match.group(1), body), "text/xml")
+
+    def handle_xmlrpc(self, service: str, body: bytes) -> bytes:
+        try:
+            args, method = xmlrpc.client.loads(body, use_builtin_types=True)
+            result = self.server.odoo.dispatch(service, method, list(args))
+            # Como Odoo: sin allow_none, un None en la respuesta es un error
+            return xmlrpc.client.dumps((result,), methodresponse=True).encode("utf-8")
+        except Exception as e:
+            fault = xmlrpc.client.Fault(1, f"{type(e).__name__}: {e}")
+            return xmlrpc.client.dumps(fault).encode("utf-8")
+
+    def handle_jsonrpc(self, body: bytes) -> bytes:
+        req_id = None
+        try:
+            req = json.loads(body)
+            req_id = req.get("id")
+            params = req.get("params") or {}
+            result = self.server.odoo.dispatch(
+                params.get("service"),
+                params.get("method"),
+                list(params.get("args") or []),
+            )
+            resp = {"jsonrpc": "2.0", "id": req_id, "result": result}
+        except Exception as e:
+            resp = {
+                "jsonrpc": "2.0",
+                "id": req_id,
+                "error": {
+                    "code": 200,
+                    "message": "Odoo Server Error",
+                    "data": {
+                        "name": type(e).__name__,
+                        "debug": f"{type(e).__name__}: {e}",
+                    },
+                },
+            }
+        return json.dumps(resp, default=str).encode("utf-8")
+
+    def reply(self, data: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if len(data) > 1024 and "gzip" in (self.headers.get("Accept-Encoding") or ""):
+            data = gzip.compress(data, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockOdooServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, odoo: MockOdoo, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MockOdooHandler)
+        self.odoo = odoo
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOdooServer":
+        self.thread = threading.Thread(
+            target=self.serve_forever, name="mock-odoo", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor Odoo simulado para pruebas")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8069)
+    ap.add_argument(
+        "--db", action="append", default=[], help="Bases de datos iniciales"
+    )
+    ap.add_argument("--admin-login", default="admin")
+    ap.add_argument("--admin-password", default="admin")
+    ap.add_argument("--master-password", default="admin")
+    ap.add_argument(
+        "--latency-ms", type=float, default=0.0, help="Latencia inyectada por petición"
+    )
+    ap.add_argument(
+        "--jitter-ms",
+        type=float,
+        default=0.0,
+        help="Latencia aleatoria adicional (0..N ms)",
+    )
+    ap.add_argument(
+        "--install-delay-ms",
+        type=float,
+        default=0.0,
+        help="Tiempo simulado de instalación por módulo",
+    )
+    args = ap.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(levelname)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    odoo = MockOdoo(
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        admin_login=args.admin_login,
+        admin_password=args.admin_password,
+        master_password=args.master_password,
+        install_delay=args.install_delay_ms / 1000.0,
+    )
+    for name in args.db or ["odoo"]:
+        odoo.add_database(name)
+    server = MockOdooServer(odoo, args.host, args.port)
+    logger.info(
+        f"Odoo simulado en {server.url} (dbs={sorted(odoo.dbs)}, latencia={args.latency_ms}ms)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Peticiones atendidas: {odoo.stats()['requests']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,54 @@
 import argparse
+import csv
+import functools
+import glob
+import gzip
+import http.client
+import itertools
 import os
+import random
+import secrets
 import sys
 import time
 import socket
 import logging
+import subprocess
+import hashlib
+import hmac
+import json
+import threading
+import urllib.parse
 import yaml
 import xmlrpc.client
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+# Parser JSON rápido si está instalado (orjson > ujson > json estándar)
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    try:
+        import ujson
+
+        json_loads = ujson.loads
+
+        def json_dumps(obj: Any) -> bytes:
+            return ujson.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    except ImportError:
+        json_loads = json.loads
+
+        def json_dumps(obj: Any) -> bytes:
+            return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
 
 # Configurar logging
 logging.basicConfig(
@@ -19,8 +61,43 @@ logger = logging.getLogger("odoo_provision")
 # Set socket timeout to prevent indefinite hangs (e.g., 5 minutes)
 socket.setdefaulttimeout(300)
 
+# Reintentos ante errores de transporte: backoff exponencial con jitter
+# entre RETRY_DELAY y RETRY_MAX_DELAY segundos (configurable por CLI)
 MAX_RETRIES = 3
 RETRY_DELAY = 5
+RETRY_MAX_DELAY = 60
+
+# Cortacircuitos por host: tras N fallos seguidos se deja de llamar durante X s
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+
+# Métodos sin efectos en el servidor: se reintentan siempre
+READ_METHODS = {
+    "search",
+    "search_read",
+    "search_count",
+    "read",
+    "read_group",
+    "fields_get",
+    "name_search",
+    "default_get",
+}
+# Métodos que se pueden repetir sin duplicar nada (mismo estado final)
+IDEMPOTENT_METHODS = READ_METHODS | {"write", "unlink", "button_install"}
+# Errores que garantizan que la petición nunca llegó al servidor
+NOT_SENT_ERRORS = (ConnectionRefusedError, socket.gaierror)
+TRANSPORT_ERRORS = (
+    socket.timeout,
+    socket.gaierror,
+    ConnectionError,
+    http.client.HTTPException,
+    xmlrpc.client.ProtocolError,
+)
+
+# Caché local (XML IDs resueltos, etc.) por base de datos
+CACHE_DIR = os.path.expanduser(
+    os.getenv("ODOO_PROVISION_CACHE", "~/.cache/odoo_provision")
+)
 
 
 def die(msg: str, code: int = 2):
@@ -28,272 +105,1654 @@ def die(msg: str, code: int = 2):
     sys.exit(code)
 
 
+# Etapa en curso de cada hilo, como (etapa, conjunto de etapas con avisos).
+# run_stages la fija y in_current_stage la lleva a los hilos auxiliares.
+STAGE_CONTEXT = threading.local()
+
+
+def stage_warning(msg: str):
+    """
+    Aviso de configuración que no se ha podido aplicar (idioma, país, XML ID
+    no encontrado...): la etapa termina, pero no se guarda su huella para
+    que la siguiente ejecución lo vuelva a intentar.
+    """
+    logger.warning(msg)
+    current = getattr(STAGE_CONTEXT, "current", None)
+    if current:
+        current[1].add(current[0])
+
+
+def in_current_stage(fn: Callable[..., Any]) -> Callable[..., Any]:
+    # Envuelve fn para que, en otro hilo, sus avisos cuenten en la etapa actual
+    current = getattr(STAGE_CONTEXT, "current", None)
+
+    def run(*args, **kwargs):
+        previous = getattr(STAGE_CONTEXT, "current", None)
+        STAGE_CONTEXT.current = current
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            STAGE_CONTEXT.current = previous
+
+    return run
+
+
+# Cargador YAML en C (libyaml) si PyYAML se compiló con él: ~10x más rápido
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
 def load_config(path: str) -> Dict[str, Any]:
     if not os.path.exists(path):
         die(f"No existe el fichero de configuración: {path}")
     with open(path, "r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f) or {}
+        cfg = yaml.load(f, Loader=YamlLoader) or {}
     return cfg
 
 
-def env_expand(value: Any) -> Any:
-    # Expande strings del tipo "${VAR}"
+def env_var(value: Any) -> Optional[str]:
+    # Nombre de la variable si `value` es "${VAR}"
     if isinstance(value, str) and value.startswith("${") and value.endswith("}"):
-        var = value[2:-1]
-        v = os.getenv(var)
-        if v is None:
-            die(f"Falta variable de entorno requerida: {var}")
-        return v
-    return value
+        return value[2:-1]
+    return None
 
 
-def deep_env_expand(obj: Any) -> Any:
+def env_slots(obj: Any, path: Tuple[Any, ...] = ()) -> List[List[Any]]:
+    # Rutas (claves/índices) de todos los "${VAR}" del árbol
     if isinstance(obj, dict):
-        return {k: deep_env_expand(env_expand(v)) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [deep_env_expand(env_expand(v)) for v in obj]
-    return env_expand(obj)
+        items = obj.items()
+    elif isinstance(obj, list):
+        items = enumerate(obj)
+    else:
+        var = env_var(obj)
+        return [[list(path), var]] if var else []
+    return [slot for k, v in items for slot in env_slots(v, path + (k,))]
+
+
+def is_text(value: Any) -> bool:
+    return isinstance(value, str) and value.strip() != ""
+
+
+def is_port(value: Any) -> bool:
+    try:
+        return 0 < int(value) < 65536
+    except (TypeError, ValueError):
+        return False
+
+
+def validate_config(cfg: Any, replay: bool = False) -> List[str]:
+    """
+    Valida el esquema completo de provision.yml (ya expandido) y devuelve
+    todos los errores encontrados, para fallar antes de conectar a Odoo.
+    Con `replay` (--replay) no se conecta a Odoo: admin_password no es
+    obligatoria.
+    """
+    if not isinstance(cfg, dict):
+        return ["La configuración debe ser un diccionario YAML"]
+    errors: List[str] = []
+
+    def section(name: str, kind=dict):
+        value = cfg.get(name)
+        if value is None:
+            return kind()
+        if not isinstance(value, kind):
+            errors.append(
+                f"{name}: debe ser {'una lista' if kind is list else 'un diccionario'}"
+            )
+            return kind()
+        return value
+
+    def require(obj: Dict[str, Any], path: str, fields: List[str]):
+        for field in fields:
+            if not is_text(obj.get(field)):
+                errors.append(f"{path}.{field}: obligatorio (texto no vacío)")
+
+    def text_list(value: Any, path: str) -> List[str]:
+        if value is None:
+            return []
+        if not isinstance(value, list) or not all(is_text(v) for v in value):
+            errors.append(f"{path}: debe ser una lista de textos")
+            return []
+        return value
+
+    odoo = section("odoo")
+    require(odoo, "odoo", ["base_url", "db"] + ([] if replay else ["admin_password"]))
+
+    instance = section("instance")
+    text_list(instance.get("extra_langs"), "instance.extra_langs")
+
+    section("company")
+
+    logins = set()
+    for i, user in enumerate(section("users", list)):
+        path = f"users[{i}]"
+        if not isinstance(user, dict):
+            errors.append(f"{path}: debe ser un diccionario")
+            continue
+        require(user, path, ["login"])
+        login = user.get("login")
+        if login in logins:
+            errors.append(f"{path}.login: '{login}' duplicado")
+        logins.add(login)
+        if "password" in user and not isinstance(user["password"], str):
+            errors.append(f"{path}.password: debe ser texto (usa comillas en el YAML)")
+        for xml_id in text_list(user.get("groups"), f"{path}.groups"):
+            if "." not in xml_id:
+                errors.append(
+                    f"{path}.groups: '{xml_id}' no es un XML ID (modulo.nombre)"
+                )
+
+    mail = section("mail")
+    smtp = mail.get("outgoing_smtp")
+    if smtp:
+        if not isinstance(smtp, dict):
+            errors.append("mail.outgoing_smtp: debe ser un diccionario")
+        else:
+            require(smtp, "mail.outgoing_smtp", ["name", "smtp_host"])
+            if not is_port(smtp.get("smtp_port")):
+                errors.append("mail.outgoing_smtp.smtp_port: puerto no válido")
+            if smtp.get("smtp_encryption", "starttls") not in (
+                "none",
+                "starttls",
+                "ssl",
+            ):
+                errors.append(
+                    "mail.outgoing_smtp.smtp_encryption: none | starttls | ssl"
+                )
+    imap = mail.get("incoming_imap")
+    if imap:
+        if not isinstance(imap, dict):
+            errors.append("mail.incoming_imap: debe ser un diccionario")
+        else:
+            require(imap, "mail.incoming_imap", ["name", "server_host"])
+            if not is_port(imap.get("server_port")):
+                errors.append("mail.incoming_imap.server_port: puerto no válido")
+            if imap.get("server_type", "imap") not in ("imap", "pop"):
+                errors.append("mail.incoming_imap.server_type: imap | pop")
+
+    text_list(section("modules").get("install"), "modules.install")
+
+    data = section("data")
+    files = data.get("files") or []
+    if not isinstance(files, list):
+        errors.append("data.files: debe ser una lista")
+        files = []
+    for key in ("chunk_size", "workers"):
+        if key in data and not (isinstance(data[key], int) and data[key] > 0):
+            errors.append(f"data.{key}: debe ser un entero positivo")
+    for i, entry in enumerate(files):
+        path = f"data.files[{i}]"
+        if not isinstance(entry, dict):
+            errors.append(f"{path}: debe ser un diccionario model/file")
+            continue
+        require(entry, path, ["model", "file"])
+        if is_text(entry.get("file")) and not os.path.isfile(entry["file"]):
+            errors.append(f"{path}.file: no existe {entry['file']}")
+        if "depends" in entry:
+            known = {e.get("file") for e in files if isinstance(e, dict)}
+            depends = entry["depends"]
+            if not isinstance(depends, list) or any(d not in known for d in depends):
+                errors.append(f"{path}.depends: lista de ficheros de data.files")
+
+    settings = section("settings")
+    params = settings.get("ir_config_parameter") or []
+    if not isinstance(params, list):
+        errors.append("settings.ir_config_parameter: debe ser una lista")
+        params = []
+    for i, param in enumerate(params):
+        path = f"settings.ir_config_parameter[{i}]"
+        if not isinstance(param, dict):
+            errors.append(f"{path}: debe ser un diccionario key/value")
+            continue
+        require(param, path, ["key"])
+        if param.get("value") is None:
+            errors.append(f"{path}.value: obligatorio")
+    return errors
+
+
+# Versión del formato compilado: cambiarla invalida las cachés existentes
+CONFIG_CACHE_VERSION = 1
+
+
+def compile_config(path: str, replay: bool = False) -> Dict[str, Any]:
+    """
+    Carga, expande y valida provision.yml. El árbol YAML parseado y las rutas
+    de sus "${VAR}" se cachean en disco por hash del fichero, de modo que las
+    ejecuciones siguientes no vuelven a parsear el YAML. Las variables de
+    entorno se resuelven siempre en el momento (no se guardan en la caché).
+    Con `replay` la contraseña de admin puede faltar (ver validate_config).
+    """
+    if not os.path.exists(path):
+        die(f"No existe el fichero de configuración: {path}")
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"config_{digest}.json")
+
+    compiled = None
+    try:
+        with open(cache_path, "rb") as f:
+            compiled = json_loads(f.read())
+        if compiled.get("version") != CONFIG_CACHE_VERSION:
+            compiled = None
+    except (OSError, ValueError):
+        compiled = None
+
+    if compiled is None:
+        try:
+            tree = yaml.load(raw, Loader=YamlLoader) or {}
+        except yaml.YAMLError as e:
+            die(f"YAML no válido en {path}: {e}")
+        compiled = {
+            "version": CONFIG_CACHE_VERSION,
+            "tree": tree,
+            "env": env_slots(tree),
+        }
+        save_compiled_config(cache_path, compiled)
+
+    cfg = compiled["tree"]
+    missing = []
+    for keys, var in compiled["env"]:
+        value = os.getenv(var)
+        if value is None:
+            if not (replay and keys == ["odoo", "admin_password"]):
+                missing.append(var)
+                continue
+        target = cfg
+        for key in keys[:-1]:
+            target = target[key]
+        target[keys[-1]] = value
+    # Los CSV de `data:` son relativos al fichero de configuración
+    base_dir = os.path.dirname(os.path.abspath(path))
+    data = cfg.get("data") if isinstance(cfg, dict) else None
+    for entry in (data or {}).get("files") or [] if isinstance(data, dict) else []:
+        if isinstance(entry, dict) and isinstance(entry.get("file"), str):
+            entry["file"] = os.path.join(base_dir, entry["file"])
+        if isinstance(entry, dict) and isinstance(entry.get("depends"), list):
+            entry["depends"] = [
+                os.path.join(base_dir, d) if isinstance(d, str) else d
+                for d in entry["depends"]
+            ]
+    errors = [f"Falta variable de entorno requerida: {var}" for var in missing]
+    errors += validate_config(cfg, replay)
+    if errors:
+        for error in errors:
+            logger.error(f"  {error}")
+        die(f"Configuración no válida ({len(errors)} errores): {path}")
+    return cfg
+
+
+def save_compiled_config(path: str, compiled: Dict[str, Any]):
+    # Solo se cachea si el árbol sobrevive intacto a JSON (sin fechas, claves no str...)
+    try:
+        blob = json_dumps(compiled)
+        if json_loads(blob) != compiled:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        # El YAML puede contener contraseñas en claro: caché solo legible por el usuario
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):
+        pass
 
 
 import ssl
 
 
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Cortacircuitos compartido por todos los hilos que hablan con un host.
+
+    Tras BREAKER_THRESHOLD fallos de transporte seguidos se abre y las llamadas
+    fallan de inmediato durante BREAKER_COOLDOWN segundos; después deja pasar
+    una única llamada de prueba (half-open) que lo cierra o lo vuelve a abrir.
+    """
+
+    def __init__(
+        self, threshold: Optional[int] = None, cooldown: Optional[float] = None
+    ):
+        self.threshold = threshold or BREAKER_THRESHOLD
+        self.cooldown = cooldown or BREAKER_COOLDOWN
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.cooldown or self.probing:
+                raise CircuitOpenError(
+                    f"circuito abierto tras {self.failures} fallos seguidos"
+                )
+            self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+# Límites (s) de los buckets del histograma de latencia por modelo/método
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class RpcStats:
+    """
+    Contadores thread-safe de llamadas RPC: latencias, reintentos, fallos y
+    bytes, en total y por (modelo, método) con histograma de latencia.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.retries = 0
+            self.failures = 0
+            self.latencies: List[float] = []
+            self.by_call: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def record(
+        self,
+        model: str,
+        method: str,
+        elapsed: float,
+        retries: int,
+        ok: bool,
+        sent: int = 0,
+        received: int = 0,
+    ):
+        with self._lock:
+            self.calls += 1
+            self.retries += retries
+            if not ok:
+                self.failures += 1
+            self.latencies.append(elapsed)
+            st = self.by_call.get((model, method))
+            if st is None:
+                st = self.by_call[(model, method)] = {
+                    "calls": 0,
+                    "failures": 0,
+                    "retries": 0,
+                    "total_s": 0.0,
+                    "max_s": 0.0,
+                    "request_bytes": 0,
+                    "response_bytes": 0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+                }
+            st["calls"] += 1
+            st["failures"] += 0 if ok else 1
+            st["retries"] += retries
+            st["total_s"] += elapsed
+            st["max_s"] = max(st["max_s"], elapsed)
+            st["request_bytes"] += sent
+            st["response_bytes"] += received
+            bucket = next(
+                (i for i, le in enumerate(LATENCY_BUCKETS) if elapsed <= le),
+                len(LATENCY_BUCKETS),
+            )
+            st["buckets"][bucket] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = sorted(self.latencies)
+            calls, retries, failures = self.calls, self.retries, self.failures
+
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0
+
+        return {
+            "calls": calls,
+            "retries": retries,
+            "failures": failures,
+            "total_s": sum(lat),
+            "p50_s": pct(0.50),
+            "p95_s": pct(0.95),
+            "max_s": lat[-1] if lat else 0.0,
+        }
+
+    def profile(self) -> List[Dict[str, Any]]:
+        # Estadísticas por modelo/método, de mayor a menor tiempo total
+        with self._lock:
+            rows = [
+                dict(st, model=model, method=method, buckets=list(st["buckets"]))
+                for (model, method), st in self.by_call.items()
+            ]
+        return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+
+RPC_STATS = RpcStats()
+
+
+class _ResumableHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPSConnection que reutiliza la sesión TLS del pool (resumption) al conectar.
+    """
+
+    def __init__(self, host, pool, **kwargs):
+        super().__init__(host, **kwargs)
+        self._pool = pool
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._context.wrap_socket(
+            self.sock,
+            server_hostname=server_hostname,
+            session=self._pool.tls_session,
+        )
+        self._pool.tls_connected(self.sock)
+
+
+class HTTPConnectionPool:
+    """
+    Pool thread-safe de conexiones HTTP/1.1 keep-alive hacia un host Odoo.
+
+    Cada hilo toma una conexión libre (o abre una nueva), la usa para una
+    petición completa y la devuelve al pool, de modo que una llamada RPC
+    cuesta un único round trip en lugar de TCP + handshake TLS + petición.
+    """
+
+    # Errores típicos de una conexión keep-alive que el servidor ya cerró
+    STALE_ERRORS = (
+        http.client.RemoteDisconnected,
+        http.client.CannotSendRequest,
+        BrokenPipeError,
+        ConnectionResetError,
+    )
+
+    def __init__(self, scheme: str, host: str, context=None, max_idle: int = 16):
+        self.scheme = scheme
+        self.host = host
+        self.context = context
+        self.max_idle = max_idle
+        self.tls_session = None
+        self.breaker = CircuitBreaker()
+        # Bytes enviados/recibidos por hilo, para atribuirlos a cada llamada
+        self.io = threading.local()
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.tls_resumed = 0
+        self.requests = 0
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            conn = _ResumableHTTPSConnection(self.host, pool=self, context=self.context)
+        else:
+            conn = http.client.HTTPConnection(self.host)
+        return conn
+
+    def tls_connected(self, sock):
+        with self._lock:
+            if sock.session_reused:
+                self.tls_resumed += 1
+            self.tls_session = sock.session
+
+    def acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            self.requests += 1
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def release(self, conn: http.client.HTTPConnection):
+        sock = conn.sock
+        with self._lock:
+            # Con TLS 1.3 el ticket de sesión llega tras el handshake
+            if self.scheme == "https" and sock is not None and sock.session:
+                self.tls_session = sock.session
+            if sock is not None and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method: str, path: str, body: bytes, headers: Dict[str, str]):
+        """
+        Envía una petición y devuelve (status, reason, headers, body) ya leídos.
+        """
+        conn, reused = self.acquire()
+        try:
+            if conn.sock is None:
+                conn.connect()
+                with self._lock:
+                    self.connections_opened += 1
+            conn.request(method, path, body, headers)
+            resp = conn.getresponse()
+            data = resp.read()
+            self.io.sent = getattr(self.io, "sent", 0) + len(body)
+            self.io.received = getattr(self.io, "received", 0) + len(data)
+            if resp.getheader("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+        except self.STALE_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # La conexión reutilizada estaba caída: reintentar una vez en una nueva
+            with self._lock:
+                self.requests -= 1
+            return self.request(method, path, body, headers)
+        except BaseException:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self.release(conn)
+        return resp.status, resp.reason, resp.msg, data
+
+    def thread_bytes(self) -> Tuple[int, int]:
+        # (enviados, recibidos) acumulados por el hilo actual
+        return getattr(self.io, "sent", 0), getattr(self.io, "received", 0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections": self.connections_opened,
+                "tls_resumed": self.tls_resumed,
+                "handshakes_saved": self.requests - self.connections_opened,
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class PooledTransport(xmlrpc.client.Transport):
+    """
+    Transport XML-RPC que envía todas las peticiones por un HTTPConnectionPool.
+    """
+
+    def __init__(self, pool: HTTPConnectionPool):
+        super().__init__()
+        self.pool = pool
+
+    def request(self, host, handler, request_body, verbose=False):
+        headers = {
+            "Content-Type": "text/xml",
+            "User-Agent": self.user_agent,
+            "Accept-Encoding": "gzip",
+        }
+        status, reason, resp_headers, data = self.pool.request(
+            "POST", handler, request_body, headers
+        )
+        if status != 200:
+            raise xmlrpc.client.ProtocolError(
+                host + handler, status, reason, dict(resp_headers)
+            )
+        p, u = self.getparser()
+        p.feed(data)
+        p.close()
+        return u.close()
+
+    def close(self):
+        self.pool.close()
+
+
+class JsonRpcProxy:
+    """
+    Proxy sobre el endpoint /jsonrpc de Odoo con la misma interfaz que
+    xmlrpc.client.ServerProxy (execute_kw, authenticate, proxy("transport")),
+    de modo que model_exec y el resto del script no distinguen el protocolo.
+    Negocia gzip y decodifica con orjson/ujson si están instalados.
+    """
+
+    def __init__(self, pool: HTTPConnectionPool, path: str, service: str):
+        self.pool = pool
+        self.path = path
+        self.service = service
+        self._ids = itertools.count(1)
+
+    def __call__(self, attr: str):
+        if attr == "transport":
+            return self
+        if attr == "close":
+            return self.pool.close
+        raise AttributeError(f"Atributo {attr} no soportado")
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return functools.partial(self._call, name)
+
+    def _call(self, method: str, *args):
+        body = json_dumps(
+            {
+                "jsonrpc": "2.0",
+                "method": "call",
+                "params": {"service": self.service, "method": method, "args": args},
+                "id": next(self._ids),
+            }
+        )
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+        }
+        status, reason, resp_headers, data = self.pool.request(
+            "POST", self.path, body, headers
+        )
+        if status != 200:
+            raise xmlrpc.client.ProtocolError(
+                self.pool.host + self.path, status, reason, dict(resp_headers)
+            )
+        resp = json_loads(data)
+        error = resp.get("error")
+        if error:
+            # Mismo tipo de error que XML-RPC para que model_exec lo trate igual
+            debug = (error.get("data") or {}).get("debug")
+            raise xmlrpc.client.Fault(error.get("code", 1), debug or error["message"])
+        return resp.get("result")
+
+
+def jsonrpc_connect(base_url: str, db: str, login: str, password: str):
+    logger.info(f"Conectando a {base_url} por JSON-RPC (db={db})...")
+    try:
+        context = ssl._create_unverified_context()
+        url = urllib.parse.urlsplit(base_url)
+        pool = HTTPConnectionPool(url.scheme, url.netloc, context=context)
+        path = f"{url.path.rstrip('/')}/jsonrpc"
+        uid = JsonRpcProxy(pool, path, "common").authenticate(db, login, password, {})
+        if not uid:
+            die("Autenticación fallida. Revisa db/admin_login/admin_password.")
+        return uid, JsonRpcProxy(pool, path, "object")
+    except Exception as e:
+        die(f"Error de conexión JSON-RPC: {e}")
+
+
+def db_service(base_url: str, protocol: str = "xmlrpc"):
+    # Proxy del servicio `db` de Odoo (crear, duplicar, listar bases de datos)
+    context = ssl._create_unverified_context()
+    url = urllib.parse.urlsplit(base_url)
+    pool = HTTPConnectionPool(url.scheme, url.netloc, context=context)
+    if protocol == "jsonrpc":
+        return JsonRpcProxy(pool, f"{url.path.rstrip('/')}/jsonrpc", "db")
+    return xmlrpc.client.ServerProxy(
+        f"{base_url}/xmlrpc/2/db", transport=PooledTransport(pool)
+    )
+
+
+def connect(base_url: str, db: str, login: str, password: str, protocol="xmlrpc"):
+    if protocol == "jsonrpc":
+        return jsonrpc_connect(base_url, db, login, password)
+    return xmlrpc_connect(base_url, db, login, password)
+
+
 def xmlrpc_connect(base_url: str, db: str, login: str, password: str):
     logger.info(f"Conectando a {base_url} (db={db})...")
     try:
         # Create unverified SSL context to avoid certificate errors
         context = ssl._create_unverified_context()
+        url = urllib.parse.urlsplit(base_url)
+        # Un único pool (y transport) compartido por common y object
+        transport = PooledTransport(
+            HTTPConnectionPool(url.scheme, url.netloc, context=context)
+        )
         common = xmlrpc.client.ServerProxy(
-            f"{base_url}/xmlrpc/2/common", context=context
+            f"{base_url}/xmlrpc/2/common", transport=transport
         )
         uid = common.authenticate(db, login, password, {})
         if not uid:
             die("Autenticación fallida. Revisa db/admin_login/admin_password.")
         models = xmlrpc.client.ServerProxy(
-            f"{base_url}/xmlrpc/2/object", context=context
+            f"{base_url}/xmlrpc/2/object", transport=transport
         )
         return uid, models
     except Exception as e:
         die(f"Error de conexión XML-RPC: {e}")
 
 
+def log_connection_stats(models):
+    pool = get_pool(models)
+    if pool is None:
+        return
+    stats = pool.stats()
+    logger.info(
+        f"Conexiones HTTP: {stats['requests']} peticiones sobre "
+        f"{stats['connections']} conexiones ({stats['tls_resumed']} sesiones TLS "
+        f"reanudadas, {stats['handshakes_saved']} handshakes ahorrados)."
+    )
+
+
+SECRET_PLACEHOLDER = "***"
+
+
+def scrub_secrets(value: Any) -> Any:
+    # Copia de `value` con los campos de SECRET_FIELDS sustituidos
+    if isinstance(value, dict):
+        return {
+            k: (
+                SECRET_PLACEHOLDER
+                if k in SECRET_FIELDS and v not in (None, False, "")
+                else scrub_secrets(v)
+            )
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [scrub_secrets(v) for v in value]
+    return value
+
+
+def canonical_domains(value: Any) -> Any:
+    """
+    Ordena los valores de las condiciones `in` / `not in` de los dominios: el
+    orden de esas listas no cambia el resultado y puede depender del orden en
+    que terminan las etapas concurrentes.
+    """
+    if isinstance(value, dict):
+        return {k: canonical_domains(v) for k, v in value.items()}
+    if not isinstance(value, (list, tuple)):
+        return value
+    if (
+        len(value) == 3
+        and value[1] in ("in", "not in")
+        and isinstance(value[0], str)
+        and isinstance(value[2], (list, tuple))
+    ):
+        return [
+            value[0],
+            value[1],
+            sorted(value[2], key=lambda v: json.dumps(v, default=str)),
+        ]
+    return [canonical_domains(v) for v in value]
+
+
+def cassette_key(model: str, method: str, args: Any, kwargs: Any) -> str:
+    return json.dumps(
+        canonical_domains(scrub_secrets([model, method, args, kwargs])),
+        sort_keys=True,
+        default=str,
+    )
+
+
+class CassetteRecorder:
+    """
+    Proxy sobre `models` que graba cada execute_kw (petición, respuesta o
+    Fault y latencia) en un cassette JSON-lines comprimido con gzip. Las
+    contraseñas (argumento de execute_kw y SECRET_FIELDS) no se guardan.
+    """
+
+    def __init__(self, models, path: str, header: Dict[str, Any]):
+        self.models = models
+        self.path = path
+        self.header = dict(header, version=1, created=time.time())
+        self.entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, attr: str):
+        # proxy("transport") sigue llegando al pool real (breaker, bytes)
+        return self.models(attr)
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs):
+        entry = {
+            "model": model,
+            "method": method,
+            "args": scrub_secrets(args),
+            "kwargs": scrub_secrets(kwargs),
+        }
+        start = time.monotonic()
+        try:
+            result = self.models.execute_kw(
+                db, uid, password, model, method, args, kwargs
+            )
+            entry["result"] = scrub_secrets(result)
+            return result
+        except xmlrpc.client.Fault as e:
+            entry["fault"] = [e.faultCode, e.faultString]
+            raise
+        finally:
+            # Los errores de transporte no se graban: se reintentan y no son respuesta
+            if "result" in entry or "fault" in entry:
+                entry["elapsed"] = round(time.monotonic() - start, 6)
+                with self._lock:
+                    self.entries.append(entry)
+
+    def close(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for item in [self.header] + self.entries:
+                f.write(json.dumps(item, default=str, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+        logger.info(f"Cassette grabado: {len(self.entries)} llamadas en {self.path}")
+
+
+class CassettePlayer:
+    """
+    Sustituye a `models` reproduciendo un cassette de CassetteRecorder: cada
+    llamada se empareja con la siguiente respuesta grabada para la misma
+    petición (modelo, método y argumentos) y espera la latencia original
+    multiplicada por `speed` (0 = sin espera).
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get("version") != 1:
+            die(f"Cassette no válido: {path}")
+        self.path = path
+        self.header = lines[0]
+        self.speed = speed
+        self.queues: Dict[str, List[Dict[str, Any]]] = {}
+        for entry in lines[1:]:
+            key = cassette_key(
+                entry["model"], entry["method"], entry["args"], entry["kwargs"]
+            )
+            self.queues.setdefault(key, []).append(entry)
+        self.total = len(lines) - 1
+        self.replayed = 0
+        self.unmatched = 0
+        self._lock = threading.Lock()
+
+    @property
+    def uid(self) -> int:
+        return self.header["uid"]
+
+    def __call__(self, attr: str):
+        raise AttributeError(f"Atributo {attr} no disponible en modo replay")
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs):
+        keys = [cassette_key(model, method, list(args), kwargs)]
+        secret_only = False
+        if method == "write" and len(args) == 2 and isinstance(args[1], dict):
+            # Un campo secreto se graba como ***: al reproducir siempre "cambia"
+            # y el write lo incluye aunque en la grabación no estuviera
+            vals = {k: v for k, v in args[1].items() if k not in SECRET_FIELDS}
+            if len(vals) < len(args[1]):
+                secret_only = not vals
+                if vals:
+                    keys.append(cassette_key(model, method, [args[0], vals], kwargs))
+        with self._lock:
+            entry = None
+            for key in keys:
+                queue = self.queues.get(key)
+                if queue:
+                    entry = queue.pop(0)
+                    break
+            if entry is not None:
+                self.replayed += 1
+            elif not secret_only:
+                self.unmatched += 1
+        if entry is None:
+            if secret_only:
+                logger.info(f"[REPLAY] write de campos secretos omitido: {model}")
+                return True
+            logger.warning(f"[REPLAY] Llamada no grabada: {model}.{method}")
+            raise xmlrpc.client.Fault(
+                1, f"Llamada no grabada en {self.path}: {model}.{method}"
+            )
+        if self.speed > 0:
+            time.sleep(entry["elapsed"] * self.speed)
+        if "fault" in entry:
+            raise xmlrpc.client.Fault(*entry["fault"])
+        return entry["result"]
+
+    def log_summary(self):
+        unused = sum(len(q) for q in self.queues.values())
+        logger.info(
+            f"Replay: {self.replayed}/{self.total} llamadas reproducidas, "
+            f"{self.unmatched} no grabadas, {unused} grabadas sin usar."
+        )
+
+
+def retry_delay(attempt: int) -> float:
+    # Backoff exponencial con jitter ("equal jitter"): entre d/2 y d
+    delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def get_pool(models) -> Optional[HTTPConnectionPool]:
+    try:
+        return models("transport").pool
+    except Exception:
+        return None
+
+
+def log_rpc_stats():
+    st = RPC_STATS.summary()
+    logger.info(
+        f"RPC: {st['calls']} llamadas, {st['retries']} reintentos, "
+        f"{st['failures']} fallos; latencia p50={st['p50_s'] * 1000:.0f}ms "
+        f"p95={st['p95_s'] * 1000:.0f}ms max={st['max_s'] * 1000:.0f}ms "
+        f"(total {st['total_s']:.1f}s)."
+    )
+
+
+def log_profile(limit: int = 20):
+    logger.info("Perfil RPC (por tiempo total):")
+    logger.info(
+        f"  {'modelo.método':<45} {'llamadas':>8} {'total':>8} {'media':>8} "
+        f"{'max':>8} {'reint.':>6} {'enviado':>9} {'recibido':>9}"
+    )
+    for r in RPC_STATS.profile()[:limit]:
+        logger.info(
+            f"  {r['model'] + '.' + r['method']:<45} {r['calls']:>8} "
+            f"{r['total_s']:>7.2f}s {r['total_s'] / r['calls'] * 1000:>6.0f}ms "
+            f"{r['max_s'] * 1000:>6.0f}ms {r['retries']:>6} "
+            f"{r['request_bytes'] / 1024:>7.1f}KB {r['response_bytes'] / 1024:>7.1f}KB"
+        )
+
+
+def write_profile(path_prefix: str, labels: Dict[str, str]):
+    """
+    Guarda el perfil RPC como JSON (<prefijo>.json) y como textfile de
+    Prometheus (<prefijo>.prom) para el node_exporter.
+    """
+    rows = RPC_STATS.profile()
+    with open(f"{path_prefix}.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "labels": labels,
+                "summary": RPC_STATS.summary(),
+                "buckets": list(LATENCY_BUCKETS),
+                "calls": rows,
+            },
+            f,
+            indent=2,
+        )
+
+    def fmt(extra: Dict[str, str]) -> str:
+        items = dict(labels, **extra)
+        return ",".join(f'{k}="{v}"' for k, v in items.items())
+
+    name = "odoo_provision_rpc"
+    lines = [
+        f"# HELP {name}_duration_seconds Latencia de llamadas RPC por modelo y método.",
+        f"# TYPE {name}_duration_seconds histogram",
+    ]
+    for r in rows:
+        lbl = {"model": r["model"], "method": r["method"]}
+        acc = 0
+        for le, count in zip(LATENCY_BUCKETS, r["buckets"]):
+            acc += count
+            lines.append(
+                f"{name}_duration_seconds_bucket{{{fmt(dict(lbl, le=str(le)))}}} {acc}"
+            )
+        lines.append(
+            f"{name}_duration_seconds_bucket{{{fmt(dict(lbl, le='+Inf'))}}} {r['calls']}"
+        )
+        lines.append(f"{name}_duration_seconds_sum{{{fmt(lbl)}}} {r['total_s']:.6f}")
+        lines.append(f"{name}_duration_seconds_count{{{fmt(lbl)}}} {r['calls']}")
+    for metric, key, help_ in (
+        ("request_bytes_total", "request_bytes", "Bytes enviados"),
+        ("response_bytes_total", "response_bytes", "Bytes recibidos"),
+        ("retries_total", "retries", "Reintentos"),
+        ("failures_total", "failures", "Llamadas fallidas"),
+    ):
+        lines.append(f"# HELP {name}_{metric} {help_} por modelo y método.")
+        lines.append(f"# TYPE {name}_{metric} counter")
+        for r in rows:
+            lbl = {"model": r["model"], "method": r["method"]}
+            lines.append(f"{name}_{metric}{{{fmt(lbl)}}} {r[key]}")
+    # Escritura atómica: el node_exporter no debe leer un fichero a medias
+    tmp = f"{path_prefix}.prom.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, f"{path_prefix}.prom")
+    logger.info(f"Perfil RPC guardado en {path_prefix}.json y {path_prefix}.prom")
+
+
 def model_exec(
     models, db: str, uid: int, password: str, model: str, method: str, *args, **kwargs
 ):
     """
     Ejecuta una llamada XML-RPC con reintentos para fallos transitorios.
+
+    Las lecturas y los métodos idempotentes se reintentan con backoff
+    exponencial y jitter; el resto (create, button_immediate_install, run...)
+    solo si el error garantiza que la petición no llegó a enviarse.
     """
+    pool = get_pool(models)
+    breaker = pool.breaker if pool else None
+    bytes_before = pool.thread_bytes() if pool else (0, 0)
     attempt = 0
-    while attempt < MAX_RETRIES:
-        try:
-            return models.execute_kw(db, uid, password, model, method, args, kwargs)
-        except (socket.timeout, ConnectionError, xmlrpc.client.ProtocolError) as e:
-            attempt += 1
-            logger.warning(
-                f"Error en {model}.{method} (intento {attempt}/{MAX_RETRIES}): {e}"
-            )
-            if attempt >= MAX_RETRIES:
-                die(
-                    f"Fallo permanente tras {MAX_RETRIES} intentos en {model}.{method}: {e}"
+    start = time.monotonic()
+    ok = False
+    try:
+        while True:
+            try:
+                if breaker:
+                    breaker.before_call()
+                result = models.execute_kw(
+                    db, uid, password, model, method, args, kwargs
                 )
-            time.sleep(RETRY_DELAY)
-        except xmlrpc.client.Fault as e:
-            # Errores de lógica de Odoo no se deben reintentar ciegamente, pero logueamos
-            logger.error(
-                f"Odoo Fault en {model}.{method}: {e.faultCode} - {e.faultString}"
-            )
-            raise e
-        except Exception as e:
-            logger.error(f"Excepción inesperada en {model}.{method}: {e}")
-            raise e
+                ok = True
+                if breaker:
+                    breaker.record_success()
+                return result
+            except CircuitOpenError as e:
+                die(f"Odoo no responde, se aborta {model}.{method}: {e}")
+            except TRANSPORT_ERRORS as e:
+                if breaker:
+                    breaker.record_failure()
+                attempt += 1
+                retriable = method in IDEMPOTENT_METHODS or isinstance(
+                    e, NOT_SENT_ERRORS
+                )
+                if not retriable:
+                    die(
+                        f"Error de transporte en {model}.{method} (no idempotente, "
+                        f"no se reintenta para no duplicar cambios): {e}"
+                    )
+                if attempt >= MAX_RETRIES:
+                    die(
+                        f"Fallo permanente tras {MAX_RETRIES} intentos en {model}.{method}: {e}"
+                    )
+                delay = retry_delay(attempt)
+                logger.warning(
+                    f"Error en {model}.{method} (intento {attempt}/{MAX_RETRIES}), "
+                    f"reintento en {delay:.1f}s: {e}"
+                )
+                time.sleep(delay)
+            except xmlrpc.client.Fault as e:
+                # Errores de lógica de Odoo no se deben reintentar ciegamente, pero logueamos
+                if breaker:
+                    breaker.record_success()
+                logger.error(
+                    f"Odoo Fault en {model}.{method}: {e.faultCode} - {e.faultString}"
+                )
+                raise e
+            except Exception as e:
+                logger.error(f"Excepción inesperada en {model}.{method}: {e}")
+                raise e
+    finally:
+        # Reintentos = reenvíos efectivos (el último fallo no se reenvía)
+        retries = attempt if ok else max(0, attempt - 1)
+        sent, received = (
+            [a - b for a, b in zip(pool.thread_bytes(), bytes_before)]
+            if pool
+            else (0, 0)
+        )
+        RPC_STATS.record(
+            model, method, time.monotonic() - start, retries, ok, sent, received
+        )
 
 
-def ensure_company(models, db, uid, password, company_data: Dict[str, Any]):
-    logger.info("Verificando configuración de compañía...")
-    # Buscar compañía principal (limit=1)
-    ids = model_exec(models, db, uid, password, "res.company", "search", [], limit=1)
-    if not ids:
-        logger.warning("No se encontró ninguna compañía para actualizar.")
-        return
+def iter_search_read(
+    models,
+    db: str,
+    uid: int,
+    password: str,
+    model: str,
+    domain: List[Any],
+    fields: Optional[List[str]] = None,
+    page_size: int = 1000,
+    context: Optional[Dict[str, Any]] = None,
+):
+    """
+    Recorre `model` página a página sin cargarlo entero en memoria.
 
-    vals = {
-        "name": company_data.get("name"),
-        "vat": company_data.get("vat"),
-        "email": company_data.get("email"),
-        "phone": company_data.get("phone"),
-        "website": company_data.get("website"),
-        "street": company_data.get("street"),
-        "zip": company_data.get("zip"),
-        "city": company_data.get("city"),
-    }
-    # Country
-    country_code = company_data.get("country_code")
-    if country_code:
-        c_ids = model_exec(
+    Pagina por clave (`id > último id`, orden por id) en lugar de offset, así
+    que cada página cuesta lo mismo aunque la tabla sea enorme y no se saltan
+    ni repiten registros si cambia mientras se recorre. La página siguiente se
+    pide en segundo plano mientras el llamador procesa la actual: como mucho
+    hay dos páginas en memoria.
+    """
+    kwargs: Dict[str, Any] = {"limit": page_size, "order": "id asc"}
+    if fields:
+        kwargs["fields"] = fields
+    if context:
+        kwargs["context"] = context
+
+    def fetch(last_id: int):
+        return model_exec(
             models,
             db,
             uid,
             password,
-            "res.country",
-            "search",
-            [("code", "=", country_code)],
-            limit=1,
+            model,
+            "search_read",
+            list(domain) + [("id", ">", last_id)],
+            **kwargs,
         )
-        if c_ids:
-            vals["country_id"] = c_ids[0]
-            # State
-            state_name = company_data.get("state")
-            if state_name:
-                s_ids = model_exec(
-                    models,
-                    db,
-                    uid,
-                    password,
-                    "res.country.state",
-                    "search",
-                    [
-                        ("country_id", "=", c_ids[0]),
-                        "|",
-                        ("name", "=", state_name),
-                        ("code", "=", state_name),
-                    ],
-                    limit=1,
-                )
-                if s_ids:
-                    vals["state_id"] = s_ids[0]
-                else:
-                    logger.warning(
-                        f"Estado '{state_name}' no encontrado para país '{country_code}'"
-                    )
-        else:
-            logger.warning(f"País '{country_code}' no encontrado.")
 
-    model_exec(models, db, uid, password, "res.company", "write", ids, vals)
-    logger.info(f"Compañía actualizada: {vals['name']}")
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        page = fetch(0)
+        while page:
+            upcoming = (
+                prefetcher.submit(fetch, page[-1]["id"])
+                if len(page) == page_size
+                else None
+            )
+            try:
+                yield from page
+            except GeneratorExit:
+                if upcoming:
+                    upcoming.cancel()
+                raise
+            page = upcoming.result() if upcoming else []
+
+
+def normalize_value(value: Any) -> Any:
+    # many2one leído como [id, nombre] -> id; None y "" equivalen a False
+    if isinstance(value, list) and len(value) == 2 and isinstance(value[0], int):
+        return value[0]
+    if value is None or value == "":
+        return False
+    return value
 
 
-def ensure_language(models, db, uid, password, lang_code: str):
-    logger.info(f"Verificando idioma: {lang_code}")
-    # Activa idioma si no está activo
-    # 1) buscar en res.lang incluyendo inactivos
-    ids = model_exec(
-        models,
-        db,
-        uid,
-        password,
-        "res.lang",
-        "search",
-        [("code", "=", lang_code)],
-        limit=1,
-        context={"active_test": False},
-    )
-    if ids:
-        # aseguramos active = True
-        model_exec(
-            models, db, uid, password, "res.lang", "write", ids, {"active": True}
-        )
-        logger.info(f"Idioma {lang_code} activado.")
-        return
+def diff_vals(
+    record: Dict[str, Any], vals: Dict[str, Any]
+) -> Dict[str, Tuple[Any, Any]]:
+    # Campos cuyo valor deseado difiere del registro leído: {campo: (actual, nuevo)}
+    return {
+        k: (record.get(k), v)
+        for k, v in vals.items()
+        if k not in record or normalize_value(record[k]) != normalize_value(v)
+    }
 
-    logger.warning(
-        f"Idioma {lang_code} no encontrado en res.lang. No se puede activar."
-    )
 
+SECRET_FIELDS = ("password", "smtp_pass")
 
-def ensure_ir_config(models, db, uid, password, key: str, value: str):
-    logger.info(f"Configurando parámetro {key} = {value}")
-    ids = model_exec(
-        models,
-        db,
-        uid,
-        password,
-        "ir.config_parameter",
-        "search",
-        [("key", "=", key)],
-        limit=1,
-    )
-    if ids:
+
+def log_diff(label: str, changes: Dict[str, Tuple[Any, Any]], plan: bool):
+    prefix = "[PLAN] " if plan else ""
+    for field, (old, new) in changes.items():
+        if field in SECRET_FIELDS:
+            old, new = "***", "***"
+        logger.info(f"  {prefix}{label}.{field}: {old!r} -> {new!r}")
+
+
+def apply_vals(
+    models,
+    db,
+    uid,
+    password,
+    model: str,
+    record: Dict[str, Any],
+    vals: Dict[str, Any],
+    label: str,
+    plan: bool = False,
+) -> bool:
+    """
+    Escribe en `record` solo los campos de `vals` que cambian. En modo plan
+    se limita a mostrar el diff. Devuelve si había cambios.
+    """
+    changes = diff_vals(record, vals)
+    if not changes:
+        logger.info(f"{label}: sin cambios.")
+        return False
+    log_diff(label, changes, plan)
+    if not plan:
         model_exec(
             models,
             db,
             uid,
             password,
-            "ir.config_parameter",
+            model,
             "write",
-            ids,
-            {"value": value},
+            [record["id"]],
+            {k: vals[k] for k in changes},
         )
-    else:
-        model_exec(
+    return True
+
+
+def plan_create(label: str, vals: Dict[str, Any]):
+    logger.info(f"  [PLAN] crear {label}:")
+    log_diff(label, {k: (None, v) for k, v in vals.items()}, True)
+
+
+def or_pairs(pairs: List[Tuple[Any, Any]], f1: str, f2: str) -> List[Any]:
+    # Dominio OR de (f1 = a AND f2 = b) para cada par
+    domain: List[Any] = ["|"] * (len(pairs) - 1)
+    for a, b in pairs:
+        domain += ["&", (f1, "=", a), (f2, "=", b)]
+    return domain
+
+
+def collect_lookups(
+    cfg: Dict[str, Any], stages: Optional[List[str]] = None
+) -> Dict[str, set]:
+    """
+    Recorre la configuración y reúne todas las búsquedas auxiliares que
+    necesitarán las etapas indicadas (por defecto, todas).
+    """
+    stages = stages or list(STAGE_DEPENDS)
+    needs: Dict[str, set] = {
+        "countries": set(),
+        "states": set(),
+        "langs": set(),
+        "fields": set(),
+        "defaults": set(),
+    }
+    if "company" in stages:
+        company = cfg.get("company") or {}
+        if company.get("country_code"):
+            needs["countries"].add(company["country_code"])
+            if company.get("state"):
+                needs["states"].add((company["country_code"], company["state"]))
+    if "langs" in stages:
+        inst = cfg.get("instance") or {}
+        langs = [inst.get("main_lang")] + (inst.get("extra_langs") or [])
+        needs["langs"].update(l for l in langs if l)
+        if inst.get("main_lang"):
+            needs["fields"].add(("res.partner", "lang"))
+            needs["defaults"].add(("res.partner", "lang"))
+    return needs
+
+
+def preflight(
+    models, db, uid, password, needs: Dict[str, set], workers: int = 4
+) -> Dict[str, Dict[Any, Any]]:
+    """
+    Resuelve todas las búsquedas reunidas por collect_lookups con una consulta
+    por modelo (lanzadas en paralelo) y devuelve un índice en memoria:
+    countries {code: id}, states {(country_id, name|code): id},
+    langs {code: row}, fields {(model, name): id}, defaults {(model, name): row}.
+    """
+    countries = sorted(needs.get("countries", ()))
+    states = sorted(needs.get("states", ()))
+    langs = sorted(needs.get("langs", ()))
+    fields = sorted(needs.get("fields", ()))
+    defaults = sorted(needs.get("defaults", ()))
+
+    def search_read(model, domain, fields_, **kwargs):
+        return model_exec(
             models,
             db,
             uid,
             password,
-            "ir.config_parameter",
-            "create",
-            [{"key": key, "value": value}],
+            model,
+            "search_read",
+            domain,
+            fields=fields_,
+            **kwargs,
+        )
+
+    queries = []
+    if countries:
+        queries.append(
+            ("countries", "res.country", [("code", "in", countries)], ["code"], {})
+        )
+    if states:
+        names = sorted({name for _, name in states})
+        queries.append(
+            (
+                "states",
+                "res.country.state",
+                [
+                    ("country_id.code", "in", sorted({c for c, _ in states})),
+                    "|",
+                    ("name", "in", names),
+                    ("code", "in", names),
+                ],
+                ["country_id", "name", "code"],
+                {},
+            )
+        )
+    if langs:
+        queries.append(
+            (
+                "langs",
+                "res.lang",
+                [("code", "in", langs)],
+                ["code", "active"],
+                {"context": {"active_test": False}},
+            )
+        )
+    if fields:
+        queries.append(
+            (
+                "fields",
+                "ir.model.fields",
+                or_pairs(fields, "model", "name"),
+                ["model", "name"],
+                {},
+            )
+        )
+    if defaults:
+        queries.append(
+            (
+                "defaults",
+                "ir.default",
+                or_pairs(defaults, "field_id.model", "field_id.name"),
+                ["field_id", "json_value"],
+                {},
+            )
         )
 
+    results = dict(
+        zip(
+            [q[0] for q in queries],
+            run_parallel(lambda q: search_read(*q[1:4], **q[4]), queries, workers),
+        )
+    )
 
-def ensure_default_lang(models, db, uid, password, lang_code: str):
-    logger.info(f"Configurando idioma por defecto para nuevos registros: {lang_code}")
-    # En Odoo, el idioma por defecto se suele manejar por el valor por defecto del campo 'lang' en 'res.partner'.
-    # Buscamos si ya existe un valor por defecto para 'res.partner.lang'.
-    ids = model_exec(
+    index: Dict[str, Dict[Any, Any]] = {
+        "countries": {r["code"]: r["id"] for r in results.get("countries", [])},
+        "states": {},
+        "langs": {r["code"]: r for r in results.get("langs", [])},
+        "fields": {},
+        "defaults": {},
+    }
+    for r in results.get("states", []):
+        country_id = normalize_value(r["country_id"])
+        index["states"].setdefault((country_id, r["name"]), r["id"])
+        index["states"].setdefault((country_id, r["code"]), r["id"])
+    field_keys = {}
+    for r in results.get("fields", []):
+        index["fields"][(r["model"], r["name"])] = r["id"]
+        field_keys[r["id"]] = (r["model"], r["name"])
+    for r in results.get("defaults", []):
+        # field_id llega como [id, "Etiqueta"]: se busca su (model, name)
+        key = field_keys.get(normalize_value(r["field_id"]))
+        if key is None and len(defaults) == 1:
+            key = defaults[0]
+        if key is not None:
+            index["defaults"].setdefault(key, r)
+    return index
+
+
+COMPANY_FIELDS = [
+    "name",
+    "vat",
+    "email",
+    "phone",
+    "website",
+    "street",
+    "zip",
+    "city",
+    "country_id",
+    "state_id",
+]
+
+
+def company_vals(company_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Campos simples de la compañía (país y provincia se resuelven aparte)
+    return {
+        "name": company_data.get("name"),
+        "vat": company_data.get("vat"),
+        "email": company_data.get("email"),
+        "phone": company_data.get("phone"),
+        "website": company_data.get("website"),
+        "street": company_data.get("street"),
+        "zip": company_data.get("zip"),
+        "city": company_data.get("city"),
+    }
+
+
+def ensure_company(
+    models,
+    db,
+    uid,
+    password,
+    company_data: Dict[str, Any],
+    plan: bool = False,
+    index: Optional[Dict[str, Any]] = None,
+):
+    logger.info("Verificando configuración de compañía...")
+    # Buscar compañía principal (limit=1)
+    rows = model_exec(
         models,
         db,
         uid,
         password,
-        "ir.default",
-        "search",
-        [("field_id.model", "=", "res.partner"), ("field_id.name", "=", "lang")],
+        "res.company",
+        "search_read",
+        [],
+        fields=COMPANY_FIELDS,
         limit=1,
     )
+    if not rows:
+        stage_warning("No se encontró ninguna compañía para actualizar.")
+        return
+
+    vals = company_vals(company_data)
+    if index is None:
+        index = preflight(
+            models, db, uid, password, collect_lookups({"company": company_data})
+        )
+    # Country
+    country_code = company_data.get("country_code")
+    if country_code:
+        country_id = index["countries"].get(country_code)
+        if country_id:
+            vals["country_id"] = country_id
+            # State
+            state_name = company_data.get("state")
+            if state_name:
+                state_id = index["states"].get((country_id, state_name))
+                if state_id:
+                    vals["state_id"] = state_id
+                else:
+                    stage_warning(
+                        f"Estado '{state_name}' no encontrado para país '{country_code}'"
+                    )
+        else:
+            stage_warning(f"País '{country_code}' no encontrado.")
+
+    if (
+        apply_vals(
+            models,
+            db,
+            uid,
+            password,
+            "res.company",
+            rows[0],
+            vals,
+            "res.company",
+            plan,
+        )
+        and not plan
+    ):
+        logger.info(f"Compañía actualizada: {vals['name']}")
+
+
+def ensure_language(
+    models,
+    db,
+    uid,
+    password,
+    lang_code: str,
+    plan: bool = False,
+    index: Optional[Dict[str, Any]] = None,
+):
+    logger.info(f"Verificando idioma: {lang_code}")
+    # Activa idioma si no está activo
+    # 1) buscar en res.lang incluyendo inactivos
+    if index is None:
+        index = preflight(models, db, uid, password, {"langs": {lang_code}})
+    lang = index["langs"].get(lang_code)
+    if lang:
+        # aseguramos active = True
+        if (
+            apply_vals(
+                models,
+                db,
+                uid,
+                password,
+                "res.lang",
+                lang,
+                {"active": True},
+                f"res.lang {lang_code}",
+                plan,
+            )
+            and not plan
+        ):
+            logger.info(f"Idioma {lang_code} activado.")
+        return
+
+    stage_warning(f"Idioma {lang_code} no encontrado en res.lang. No se puede activar.")
+
+
+def ensure_ir_config(models, db, uid, password, key: str, value: str):
+    ensure_ir_configs(models, db, uid, password, {key: value})
+
+
+def ensure_ir_configs(
+    models, db, uid, password, params: Dict[str, str], plan: bool = False
+):
+    """
+    Reconcilia todos los parámetros de una vez: un search_read y un único
+    `load` con los que cambian o faltan (columna `.id` con el id existente o
+    vacía para crearlo), sea cual sea el número de valores distintos.
+    """
+    if not params:
+        return
+    current = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.config_parameter",
+        "search_read",
+        [("key", "in", list(params))],
+        fields=["key", "value"],
+    )
+    existing = {r["key"]: r for r in current}
+
+    rows = []
+    prefix = "[PLAN] " if plan else ""
+    for key, value in params.items():
+        rec = existing.get(key)
+        if rec is None:
+            logger.info(f"{prefix}Creando parámetro {key} = {value}")
+            rows.append(["", key, value])
+        elif rec["value"] != value:
+            logger.info(
+                f"{prefix}Configurando parámetro {key}: {rec['value']!r} -> {value!r}"
+            )
+            rows.append([str(rec["id"]), key, value])
+        else:
+            logger.info(f"Parámetro {key} sin cambios.")
+    if plan or not rows:
+        return
 
-    # Necesitamos el ID del campo 'lang' de 'res.partner'
-    field_ids = model_exec(
+    result = model_exec(
         models,
         db,
         uid,
         password,
-        "ir.model.fields",
-        "search",
-        [("model", "=", "res.partner"), ("name", "=", "lang")],
-        limit=1,
+        "ir.config_parameter",
+        "load",
+        [".id", "key", "value"],
+        rows,
     )
+    errors = [m for m in result.get("messages", []) if m.get("type") == "error"]
+    if errors:
+        die(f"Error guardando parámetros del sistema: {errors[0].get('message')}")
+
+
+def ensure_default_lang(
+    models,
+    db,
+    uid,
+    password,
+    lang_code: str,
+    plan: bool = False,
+    index: Optional[Dict[str, Any]] = None,
+):
+    logger.info(f"Configurando idioma por defecto para nuevos registros: {lang_code}")
+    # En Odoo, el idioma por defecto se suele manejar por el valor por defecto del campo 'lang' en 'res.partner'.
+    # Buscamos si ya existe un valor por defecto para 'res.partner.lang'
+    # y el ID del campo 'lang' de 'res.partner'.
+    key = ("res.partner", "lang")
+    if index is None:
+        index = preflight(
+            models, db, uid, password, {"fields": {key}, "defaults": {key}}
+        )
+    field_id = index["fields"].get(key)
+    current = index["defaults"].get(key)
 
-    if not field_ids:
-        logger.warning("No se encontró el campo 'lang' en 'res.partner'.")
+    if not field_id:
+        stage_warning("No se encontró el campo 'lang' en 'res.partner'.")
         return
 
     vals = {
-        "field_id": field_ids[0],
+        "field_id": field_id,
         "json_value": f'"{lang_code}"',
     }
 
-    if ids:
-        model_exec(models, db, uid, password, "ir.default", "write", ids, vals)
+    label = "ir.default res.partner.lang"
+    if current:
+        if not apply_vals(
+            models, db, uid, password, "ir.default", current, vals, label, plan
+        ):
+            return
+    elif plan:
+        plan_create(label, vals)
+        return
     else:
         model_exec(models, db, uid, password, "ir.default", "create", [vals])
     logger.info(f"Idioma por defecto '{lang_code}' aplicado a res.partner.")
 
 
-def ensure_outgoing_mail_server(models, db, uid, password, smtp: Dict[str, Any]):
+def ensure_record(
+    models,
+    db,
+    uid,
+    password,
+    model: str,
+    domain: List[Any],
+    vals: Dict[str, Any],
+    plan: bool = False,
+) -> Optional[int]:
+    # Busca un registro por `domain` y lo crea o actualiza solo con lo que cambia
+    rows = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        model,
+        "search_read",
+        domain,
+        fields=list(vals),
+        limit=1,
+        context={"active_test": False},
+    )
+    label = f"{model} {vals.get('name', '')}".strip()
+    if rows:
+        apply_vals(models, db, uid, password, model, rows[0], vals, label, plan)
+        return rows[0]["id"]
+    if plan:
+        plan_create(label, vals)
+        return None
+    return model_exec(models, db, uid, password, model, "create", [vals])
+
+
+def ensure_outgoing_mail_server(
+    models, db, uid, password, smtp: Dict[str, Any], plan: bool = False
+):
     logger.info(f"Configurando SMTP: {smtp.get('name')}")
     # Buscar por nombre
-    name = smtp["name"]
-    ids = model_exec(
+    vals = outgoing_mail_vals(smtp)
+    return ensure_record(
         models,
         db,
         uid,
         password,
         "ir.mail_server",
-        "search",
-        [("name", "=", name)],
-        limit=1,
+        [("name", "=", vals["name"])],
+        vals,
+        plan,
     )
-    vals = {
-        "name": name,
+
+
+def outgoing_mail_vals(smtp: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": smtp["name"],
         "smtp_host": smtp["smtp_host"],
         "smtp_port": int(smtp["smtp_port"]),
         "smtp_encryption": smtp.get("smtp_encryption", "starttls"),
@@ -303,27 +1762,28 @@ def ensure_outgoing_mail_server(models, db, uid, password, smtp: Dict[str, Any])
         "sequence": int(smtp.get("sequence", 10)),
         "active": True,
     }
-    if ids:
-        model_exec(models, db, uid, password, "ir.mail_server", "write", ids, vals)
-        return ids[0]
-    return model_exec(models, db, uid, password, "ir.mail_server", "create", [vals])
 
 
-def ensure_incoming_mail_server(models, db, uid, password, imap: Dict[str, Any]):
+def ensure_incoming_mail_server(
+    models, db, uid, password, imap: Dict[str, Any], plan: bool = False
+):
     logger.info(f"Configurando IMAP/POP: {imap.get('name')}")
-    name = imap["name"]
-    ids = model_exec(
+    vals = incoming_mail_vals(imap)
+    return ensure_record(
         models,
         db,
         uid,
         password,
         "fetchmail.server",
-        "search",
-        [("name", "=", name)],
-        limit=1,
+        [("name", "=", vals["name"])],
+        vals,
+        plan,
     )
-    vals = {
-        "name": name,
+
+
+def incoming_mail_vals(imap: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": imap["name"],
         "server_type": imap.get("server_type", "imap"),
         "server": imap["server_host"],
         "port": int(imap["server_port"]),
@@ -332,13 +1792,97 @@ def ensure_incoming_mail_server(models, db, uid, password, imap: Dict[str, Any])
         "password": imap.get("password"),
         "active": True,
     }
-    if ids:
-        model_exec(models, db, uid, password, "fetchmail.server", "write", ids, vals)
-        return ids[0]
-    return model_exec(models, db, uid, password, "fetchmail.server", "create", [vals])
 
 
-def install_modules(models, db, uid, password, module_names: List[str]):
+# Sondeo del estado de ir.module.module en la instalación por lotes
+MODULE_POLL_INTERVAL = 5
+MODULE_INSTALL_TIMEOUT = 3600
+
+
+def install_modules_batch(models, db, uid, password, mods: List[Dict[str, Any]]):
+    """
+    Marca todos los módulos con button_install y lanza una única pasada de
+    actualización (una sola recarga del registro) en segundo plano, mientras
+    el hilo principal sondea ir.module.module e informa de progreso y ETA.
+    """
+    ids = [m["id"] for m in mods]
+    names = [m["name"] for m in mods]
+    model_exec(models, db, uid, password, "ir.module.module", "button_install", ids)
+    wizard_id = model_exec(
+        models, db, uid, password, "base.module.upgrade", "create", [{}]
+    )
+    if isinstance(wizard_id, list):
+        wizard_id = wizard_id[0]
+
+    errors = []
+
+    def trigger():
+        # Sin reintentos: repetir upgrade_module relanzaría la instalación
+        try:
+            models.execute_kw(
+                db,
+                uid,
+                password,
+                "base.module.upgrade",
+                "upgrade_module",
+                [[wizard_id]],
+                {},
+            )
+        except xmlrpc.client.Fault as e:
+            errors.append(e)
+        except Exception as e:
+            # Un timeout del cliente no detiene la instalación en el servidor
+            logger.warning(f"upgrade_module sin respuesta ({e}); se sigue sondeando.")
+
+    worker = threading.Thread(target=trigger, name="module-upgrade", daemon=True)
+    worker.start()
+    logger.info(f"Instalando {len(ids)} módulos en una única pasada: {names}")
+
+    start = time.monotonic()
+    while True:
+        worker.join(MODULE_POLL_INTERVAL)
+        rows = model_exec(
+            models,
+            db,
+            uid,
+            password,
+            "ir.module.module",
+            "search_read",
+            [("id", "in", ids)],
+            fields=["name", "state"],
+        )
+        done = [r["name"] for r in rows if r["state"] == "installed"]
+        elapsed = time.monotonic() - start
+        if len(done) == len(ids):
+            logger.info(
+                f"Módulos instalados: {len(done)}/{len(ids)} en {elapsed:.0f}s."
+            )
+            return
+        if errors:
+            die(f"Error instalando módulos: {errors[0].faultString}")
+        pending = [r["name"] for r in rows if r["state"] != "installed"]
+        if not worker.is_alive() and not any(
+            r["state"] in ("to install", "to upgrade") for r in rows
+        ):
+            die(f"La actualización terminó sin instalar: {pending}")
+        if elapsed > MODULE_INSTALL_TIMEOUT:
+            die(f"Tiempo agotado instalando módulos. Pendientes: {pending}")
+        eta = f"{elapsed / len(done) * len(pending):.0f}s" if done else "?"
+        logger.info(
+            f"Instalando módulos: {len(done)}/{len(ids)} ({elapsed:.0f}s, ETA {eta}). "
+            f"Pendientes: {pending}"
+        )
+
+
+def install_modules(
+    models,
+    db,
+    uid,
+    password,
+    module_names: List[str],
+    mode: str = "immediate",
+    plan: bool = False,
+):
     # Instala módulos declarados (idempotente)
     logger.info(f"Verificando instalación de módulos: {module_names}")
 
@@ -370,10 +1914,20 @@ def install_modules(models, db, uid, password, module_names: List[str]):
 
     if not to_install_ids:
         logger.info("Todos los módulos ya están instalados.")
-        return
+        return []
+
+    if plan:
+        logger.info(f"[PLAN] Módulos a instalar: {to_install_names}")
+        return []
 
     logger.info(f"Iniciando instalación de: {to_install_names}")
 
+    if mode == "batch":
+        install_modules_batch(
+            models, db, uid, password, [m for m in mods if m["id"] in to_install_ids]
+        )
+        return to_install_names
+
     # Instalar uno a uno para mejor feedback y evitar timeouts gigantes en lote
     for i, mod_name in enumerate(to_install_names):
         # Volvemos a buscar el ID por si acaso
@@ -393,265 +1947,1704 @@ def install_modules(models, db, uid, password, module_names: List[str]):
         )
         logger.info(f"Módulo {mod_name} instalado (o acción desencadenada).")
 
+    return to_install_names
 
-def get_xml_id_res_id(models, db, uid, password, xml_id):
-    if "." not in xml_id:
-        return None
-    module, name = xml_id.split(".", 1)
-    # domain needs to be flat list of tuples
-    domain = [("module", "=", module), ("name", "=", name)]
-    ids = model_exec(
-        models, db, uid, password, "ir.model.data", "search", domain, limit=1
+
+def collect_xml_ids(cfg: Dict[str, Any]) -> List[str]:
+    # Todos los XML IDs de grupos referenciados en la configuración
+    xml_ids = set()
+    for user_data in cfg.get("users", []) or []:
+        xml_ids.update(x for x in user_data.get("groups", []) or [] if "." in x)
+    return sorted(xml_ids)
+
+
+def xml_id_cache_path(base_url: str, db: str) -> str:
+    key = hashlib.sha1(f"{base_url.rstrip('/')}|{db}".encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"xml_ids_{key}.json")
+
+
+def modules_signature(module_names: List[str]) -> str:
+    return hashlib.sha1(",".join(sorted(module_names)).encode("utf-8")).hexdigest()
+
+
+def load_xml_id_cache(path: str, signature: str) -> Dict[str, int]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("modules") != signature:
+        return {}
+    return data.get("xml_ids", {})
+
+
+def save_xml_id_cache(path: str, signature: str, xml_ids: Dict[str, int]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"modules": signature, "xml_ids": xml_ids}, f, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def invalidate_xml_id_cache(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def fetch_xml_ids(models, db, uid, password, xml_ids: List[str]) -> Dict[str, int]:
+    # Un único search_read con un OR de (module = m AND name = n) por XML ID
+    if not xml_ids:
+        return {}
+    domain = or_pairs([x.split(".", 1) for x in xml_ids], "module", "name")
+    rows = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.model.data",
+        "search_read",
+        domain,
+        fields=["module", "name", "res_id"],
     )
-    if not ids:
-        return None
-    # read returns list of dicts
-    data = model_exec(
-        models, db, uid, password, "ir.model.data", "read", ids, ["res_id"]
+    return {f"{r['module']}.{r['name']}": r["res_id"] for r in rows if r.get("res_id")}
+
+
+def resolve_xml_ids(
+    models,
+    db,
+    uid,
+    password,
+    xml_ids: List[str],
+    cache_path: str,
+    signature: str,
+) -> Dict[str, int]:
+    """
+    Resuelve XML IDs a res_id con un único search_read sobre ir.model.data,
+    apoyándose en la caché en disco de la base de datos. La caché se descarta
+    si cambia la lista de módulos (ver modules_signature / install_modules).
+    """
+    cached = load_xml_id_cache(cache_path, signature)
+    missing = [x for x in xml_ids if x not in cached]
+    if not missing:
+        logger.info(f"{len(xml_ids)} XML IDs resueltos desde caché.")
+        return cached
+
+    found = fetch_xml_ids(models, db, uid, password, missing)
+    resolved = dict(cached, **found)
+    logger.info(
+        f"{len(found)}/{len(missing)} XML IDs resueltos en una consulta "
+        f"({len(cached)} desde caché)."
     )
-    if data and data[0].get("res_id"):
-        return data[0]["res_id"]
-    return None
-
+    save_xml_id_cache(cache_path, signature, resolved)
+    return resolved
+
+
+# Acción de servidor reutilizable para asignar grupos a usuarios. Recibe en el
+# contexto `provision_groups` = {"<user_id>": [group_id, ...]} (payload JSON) y
+# hace todas las inserciones en una sola sentencia SQL, para esquivar los
+# problemas de visibilidad del campo de grupos vía XML-RPC. Es idempotente.
+GROUPS_ACTION_NAME = "Provisioning: asignar grupos a usuarios"
+GROUPS_ACTION_CODE = """
+payload = env.context.get('provision_groups') or {}
+uids = []
+gids = []
+for user_id, group_ids in payload.items():
+    for group_id in group_ids:
+        uids.append(int(user_id))
+        gids.append(int(group_id))
+if uids:
+    env.cr.execute(
+        "INSERT INTO res_groups_users_rel (gid, uid) "
+        "SELECT gid, uid FROM unnest(%s, %s) AS t(gid, uid) "
+        "ON CONFLICT DO NOTHING",
+        (gids, uids),
+    )
+    env['res.users'].invalidate_model()
+    env['res.groups'].invalidate_model()
+"""
 
-def ensure_user(models, db, uid, password, user_data):
-    login = user_data.get("login")
-    if not login:
-        return
 
-    logger.info(f"Procesando usuario: {login}")
+def ensure_server_action(models, db, uid, password, name: str, code: str):
+    """
+    Busca la acción de servidor `name` (sobre res.users) y la crea o actualiza
+    su código. Devuelve (id, creada).
+    """
+    rows = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.actions.server",
+        "search_read",
+        [("name", "=", name)],
+        fields=["code"],
+        limit=1,
+    )
+    if rows:
+        if rows[0]["code"] != code:
+            model_exec(
+                models,
+                db,
+                uid,
+                password,
+                "ir.actions.server",
+                "write",
+                [rows[0]["id"]],
+                {"code": code},
+            )
+        return rows[0]["id"], False
 
-    # Check if user exists
-    ids = model_exec(
+    model_ids = model_exec(
         models,
         db,
         uid,
         password,
-        "res.users",
+        "ir.model",
         "search",
-        [("login", "=", login)],
+        [("model", "=", "res.users")],
         limit=1,
     )
+    action_id = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.actions.server",
+        "create",
+        [{"name": name, "model_id": model_ids[0], "state": "code", "code": code}],
+    )
+    if isinstance(action_id, list):
+        action_id = action_id[0]
+    return action_id, True
 
-    # Defensive flatten if XMLRPC returns nested list
-    if ids and isinstance(ids[0], list):
-        ids = [i for sub in ids for i in sub]
 
-    vals = {
-        "name": user_data.get("name"),
-        "login": login,
-        "email": user_data.get("email"),
-        "active": True,
-        "lang": user_data.get("lang", "es_ES"),  # Default to es_ES as per user request
-    }
+def ensure_groups_action(models, db, uid, password) -> int:
+    action_id, created = ensure_server_action(
+        models, db, uid, password, GROUPS_ACTION_NAME, GROUPS_ACTION_CODE
+    )
+    if not created:
+        return action_id
 
-    # Resolve groups
-    group_ids = []
-    for xml_id in user_data.get("groups", []):
-        gid = get_xml_id_res_id(models, db, uid, password, xml_id)
-        if gid:
-            group_ids.append(gid)
-        else:
-            logger.warning(f"  [WARN] XML ID no encontrado: {xml_id}")
+    # Limpiar las acciones que versiones anteriores creaban por usuario y ejecución
+    old_ids = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.actions.server",
+        "search",
+        [("name", "=like", "Provision User % Groups")],
+    )
+    if old_ids:
+        model_exec(models, db, uid, password, "ir.actions.server", "unlink", old_ids)
+        logger.info(f"Eliminadas {len(old_ids)} acciones de grupos antiguas.")
+    return action_id
 
-    target_uid = None
 
-    if ids:
-        # Update
-        if "password" in user_data:
-            vals["password"] = user_data["password"]
+def chunked(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
 
-        model_exec(models, db, uid, password, "res.users", "write", ids, vals)
-        logger.info(f"  Usuario {login} actualizado.")
-        target_uid = ids[0]
-    else:
-        # Create
-        if "password" in user_data:
-            vals["password"] = user_data["password"]
-        else:
-            vals["password"] = login
 
-        new_id = model_exec(models, db, uid, password, "res.users", "create", [vals])
+USER_FIELDS = ["login", "name", "email", "active", "lang"]
 
-        # Defensive check for create return
-        if isinstance(new_id, list):
-            new_id = new_id[0]
 
-        logger.info(
-            f"  Usuario {login} creado con password='{vals['password']}' (id={new_id})"
-        )
-        target_uid = new_id
+def user_vals(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "name": user_data.get("name"),
+        "login": user_data["login"],
+        "email": user_data.get("email"),
+        "active": True,
+        "lang": user_data.get("lang", "es_ES"),  # Default to es_ES
+    }
 
-    # Assign groups via Server Action to bypass XMLRPC field visibility issues
-    group_xml_ids = user_data.get("groups", [])
-    if group_xml_ids:
-        # DEBUG: Dump available fields related to groups
-        try:
-            u_fields = model_exec(
-                models,
-                db,
-                uid,
-                password,
-                "res.users",
-                "fields_get",
-                [],
-                {"attributes": ["string", "type"]},
-            )
-            keys = sorted(u_fields.keys())
-            group_keys = [k for k in keys if "group" in k or "user" in k]
-            logger.info(f"DEBUG: res.users fields (partial): {group_keys}")
-        except Exception as e:
-            logger.error(f"DEBUG Error: {e}")
 
-        # Find model_id for res.users
-        res_users_model = model_exec(
+def ensure_users(
+    models,
+    db,
+    uid,
+    password,
+    users: List[Dict[str, Any]],
+    xml_ids: Optional[Dict[str, int]] = None,
+    batch_size: int = 500,
+    plan: bool = False,
+):
+    """
+    Crea/actualiza usuarios en lote: un search_read por lote de logins, creates
+    multi-registro, writes agrupados por valores idénticos y una única
+    ejecución de la acción de servidor de grupos para todos los usuarios.
+    """
+    users = [u for u in users if u.get("login")]
+    if not users:
+        return
+    logger.info(f"Procesando {len(users)} usuarios (lotes de {batch_size})...")
+
+    existing: Dict[str, Dict[str, Any]] = {}
+    for chunk in chunked([u["login"] for u in users], batch_size):
+        rows = model_exec(
             models,
             db,
             uid,
             password,
-            "ir.model",
-            "search",
-            [("model", "=", "res.users")],
-            limit=1,
-        )
-
-        if res_users_model:
-            model_id = res_users_model[0]
-            if isinstance(model_id, list):
-                model_id = model_id[0]
-
-            # Python code to run on server (using sudo to ensure rights)
-            # Try to use the 'groups_id' field which standard in Odoo.
-            # If that fails, we might need to inspect what fields are actually available.
-            code = f"""
-user = env['res.users'].search([('login', '=', '{login}')], limit=1)
-xml_ids = {group_xml_ids}
-for xml_id in xml_ids:
-    group = env.ref(xml_id, False)
-    if group and user:
-        # Use direct SQL to bypass any ORM field visibility/validity issues
-        # The relation table between res.groups and res.users is standard 'res_groups_users_rel'.
-        env.cr.execute("INSERT INTO res_groups_users_rel (gid, uid) VALUES (%s, %s) ON CONFLICT DO NOTHING", (group.id, user.id))
-        # Invalidate cache to ensure changes are seen
-        user.invalidate_model() # Invalidate everything for safey
-        group.invalidate_model()
-            """
-
-            action_vals = {
-                "name": f"Provision User {login} Groups",
-                "model_id": model_id,
-                "state": "code",
-                "code": code,
-            }
+            "res.users",
+            "search_read",
+            [("login", "in", chunk)],
+            fields=USER_FIELDS,
+            context={"active_test": False},
+        )
+        existing.update({r["login"]: r for r in rows})
+
+    user_ids: Dict[str, int] = {}
+    to_create = []
+    to_write: Dict[str, Tuple[Dict[str, Any], List[int]]] = {}
+    for user_data in users:
+        login = user_data["login"]
+        vals = user_vals(user_data)
+        current = existing.get(login)
+        if current:
+            user_ids[login] = current["id"]
+            changes = diff_vals(current, vals)
+            # La contraseña no se puede leer: si está en la config se reescribe
+            if "password" in user_data:
+                changes["password"] = (None, user_data["password"])
+            if not changes:
+                logger.info(f"  Usuario {login} sin cambios.")
+                continue
+            log_diff(f"res.users {login}", changes, plan)
+            vals = {k: new for k, (old, new) in changes.items()}
+            # Usuarios con los mismos cambios comparten un único write
+            key = json.dumps(vals, sort_keys=True, default=str)
+            to_write.setdefault(key, (vals, []))[1].append(current["id"])
+        else:
+            vals["password"] = user_data.get("password", login)
+            if plan:
+                plan_create(f"res.users {login}", vals)
+            to_create.append(vals)
+
+    if plan:
+        return
 
-            action_id = model_exec(
-                models, db, uid, password, "ir.actions.server", "create", [action_vals]
+    for vals, ids in to_write.values():
+        for chunk in chunked(ids, batch_size):
+            model_exec(models, db, uid, password, "res.users", "write", chunk, vals)
+    if to_write:
+        updated = sum(len(ids) for _, ids in to_write.values())
+        logger.info(f"  {updated} usuarios actualizados.")
+
+    for chunk in chunked(to_create, batch_size):
+        new_ids = model_exec(models, db, uid, password, "res.users", "create", chunk)
+        if not isinstance(new_ids, list):
+            new_ids = [new_ids]
+        for vals, new_id in zip(chunk, new_ids):
+            user_ids[vals["login"]] = new_id
+            logger.info(
+                f"  Usuario {vals['login']} creado con password='{vals['password']}' (id={new_id})"
             )
 
-            if isinstance(action_id, list):
-                action_id = action_id[0]
+    # Resolver grupos y asignarlos todos en una sola ejecución
+    if xml_ids is None:
+        xml_ids = fetch_xml_ids(
+            models, db, uid, password, collect_xml_ids({"users": users})
+        )
+    payload: Dict[str, List[int]] = {}
+    not_found = set()
+    for user_data in users:
+        group_ids = []
+        for xml_id in user_data.get("groups", []) or []:
+            gid = xml_ids.get(xml_id)
+            if gid:
+                group_ids.append(gid)
+            elif xml_id not in not_found:
+                not_found.add(xml_id)
+                stage_warning(f"  [WARN] XML ID no encontrado: {xml_id}")
+        if group_ids:
+            payload[str(user_ids[user_data["login"]])] = group_ids
+
+    if payload:
+        action_id = ensure_groups_action(models, db, uid, password)
+        model_exec(
+            models,
+            db,
+            uid,
+            password,
+            "ir.actions.server",
+            "run",
+            [action_id],
+            context={"provision_groups": payload},
+        )
+        logger.info(f"  Grupos asignados a {len(payload)} usuarios (Server Action).")
 
-            model_exec(
-                models, db, uid, password, "ir.actions.server", "run", [action_id]
+
+def ensure_user(
+    models, db, uid, password, user_data, xml_ids: Optional[Dict[str, int]] = None
+):
+    ensure_users(models, db, uid, password, [user_data], xml_ids)
+
+
+# Acción de servidor que aplica de una vez toda la configuración (--engine
+# server). Recibe en el contexto `provision_payload` = {"ops": [...], "dry_run"}
+# con operaciones lang / param / upsert, aplica cada una en su savepoint y lo
+# revierte todo si alguna falla (o si es dry_run). Devuelve el informe por
+# operación en `action`, que es lo que ir.actions.server.run() retorna. El
+# código pasa por safe_eval (sin `with` ni imports) y el informe viaja por
+# XML-RPC sin allow_none, así que no puede contener None.
+APPLY_ACTION_NAME = "Provisioning: aplicar configuración"
+APPLY_ACTION_CODE = """
+payload = env.context.get('provision_payload') or {}
+report = []
+failed = False
+# safe_eval no admite `with`: savepoints explícitos, uno general y uno por operación
+env.flush_all()
+env.cr.execute('SAVEPOINT provision_apply')
+for op in payload.get('ops') or []:
+    entry = {'op': op['op'], 'model': op.get('model') or False, 'key': op.get('key') or False,
+             'status': 'unchanged', 'fields': [], 'warnings': []}
+    report.append(entry)
+    env.cr.execute('SAVEPOINT provision_op')
+    try:
+        if op['op'] == 'lang':
+            lang = env['res.lang'].with_context(active_test=False).search(
+                [('code', '=', op['key'])], limit=1)
+            if not lang:
+                raise UserError('Idioma no encontrado: %s' % op['key'])
+            if not lang.active:
+                lang.write({'active': True})
+                entry['status'] = 'updated'
+                entry['fields'] = ['active']
+        elif op['op'] == 'param':
+            params = env['ir.config_parameter'].sudo()
+            current = params.get_param(op['key'])
+            if current != op['value']:
+                params.set_param(op['key'], op['value'])
+                entry['status'] = 'created' if current is False else 'updated'
+                entry['fields'] = ['value']
+        elif op['op'] == 'upsert':
+            Model = env[op['model']].with_context(active_test=False)
+            vals = dict(op.get('vals') or {})
+            for field, ref in (op.get('refs') or {}).items():
+                target = env[ref[0]].with_context(active_test=False).search(
+                    ref[1], limit=1)
+                if target:
+                    vals[field] = target.id
+                else:
+                    entry['warnings'].append('%s no encontrado: %s' % (ref[0], ref[1]))
+            rec = Model.search(op.get('domain') or [], limit=1)
+            if rec:
+                current = rec.read(list(vals))[0]
+                changes = {}
+                for field, value in vals.items():
+                    old = current.get(field)
+                    if isinstance(old, (list, tuple)) and old:
+                        old = old[0]
+                    if old in (None, ''):
+                        old = False
+                    if value in (None, ''):
+                        value = False
+                    if old != value:
+                        changes[field] = value
+                changes.update(op.get('always') or {})
+                if changes:
+                    rec.write(changes)
+                    entry['status'] = 'updated'
+                    entry['fields'] = sorted(changes)
+            elif op.get('update_only'):
+                raise UserError('No existe ningún registro de %s' % op['model'])
+            else:
+                vals.update(op.get('always') or {})
+                vals.update(op.get('create') or {})
+                rec = Model.create(vals)
+                entry['status'] = 'created'
+                entry['fields'] = sorted(vals)
+            entry['id'] = rec.id
+            new_groups = []
+            for xml_id in op.get('groups') or []:
+                group = env.ref(xml_id, raise_if_not_found=False)
+                if not group:
+                    entry['warnings'].append('XML ID no encontrado: %s' % xml_id)
+                elif group not in rec.groups_id:
+                    new_groups.append((4, group.id))
+            if new_groups:
+                rec.write({'groups_id': new_groups})
+                entry['fields'] = entry['fields'] + ['groups_id']
+                if entry['status'] == 'unchanged':
+                    entry['status'] = 'updated'
+        else:
+            raise UserError('Operación desconocida: %s' % op['op'])
+        env.flush_all()
+        env.cr.execute('RELEASE SAVEPOINT provision_op')
+    except Exception as e:
+        env.cr.execute('ROLLBACK TO SAVEPOINT provision_op')
+        env.cr.execute('RELEASE SAVEPOINT provision_op')
+        env.invalidate_all()
+        failed = True
+        entry['status'] = 'error'
+        entry['error'] = str(e)
+rolled_back = bool(failed or payload.get('dry_run'))
+if rolled_back:
+    env.cr.execute('ROLLBACK TO SAVEPOINT provision_apply')
+    env.invalidate_all()
+env.cr.execute('RELEASE SAVEPOINT provision_apply')
+action = {'provision_report': report, 'rolled_back': rolled_back}
+"""
+
+
+def build_apply_ops(cfg: Dict[str, Any], stages: List[str]) -> List[Dict[str, Any]]:
+    """
+    Traduce las secciones de provision.yml de las etapas indicadas a la lista
+    de operaciones que ejecuta APPLY_ACTION_CODE en el servidor.
+    """
+    ops: List[Dict[str, Any]] = []
+    if "langs" in stages:
+        inst = cfg.get("instance", {}) or {}
+        langs = [inst.get("main_lang")] + (inst.get("extra_langs") or [])
+        ops += [{"op": "lang", "key": lang} for lang in langs if lang]
+        if inst.get("main_lang"):
+            field = [["model", "=", "res.partner"], ["name", "=", "lang"]]
+            ops.append(
+                {
+                    "op": "upsert",
+                    "model": "ir.default",
+                    "key": "res.partner.lang",
+                    "domain": [
+                        ["field_id.model", "=", "res.partner"],
+                        ["field_id.name", "=", "lang"],
+                        ["company_id", "=", False],
+                        ["user_id", "=", False],
+                    ],
+                    "vals": {"json_value": f'"{inst["main_lang"]}"'},
+                    "refs": {"field_id": ["ir.model.fields", field]},
+                }
             )
-            logger.info(f"  Grupos asignados a {login} (Server Action).")
+    if "params" in stages:
+        params = (cfg.get("settings", {}) or {}).get("ir_config_parameter", []) or []
+        ops += [
+            {"op": "param", "key": p["key"], "value": str(p["value"])} for p in params
+        ]
+    company = cfg.get("company") or {}
+    if "company" in stages and company:
+        refs = {}
+        country = company.get("country_code")
+        if country:
+            refs["country_id"] = ["res.country", [["code", "=", country]]]
+            if company.get("state"):
+                refs["state_id"] = [
+                    "res.country.state",
+                    [
+                        ["country_id.code", "=", country],
+                        "|",
+                        ["name", "=", company["state"]],
+                        ["code", "=", company["state"]],
+                    ],
+                ]
+        ops.append(
+            {
+                "op": "upsert",
+                "model": "res.company",
+                "key": company.get("name"),
+                "domain": [],
+                "update_only": True,
+                "vals": company_vals(company),
+                "refs": refs,
+            }
+        )
+    if "users" in stages:
+        for user_data in cfg.get("users", []) or []:
+            if not user_data.get("login"):
+                continue
+            op = {
+                "op": "upsert",
+                "model": "res.users",
+                "key": user_data["login"],
+                "domain": [["login", "=", user_data["login"]]],
+                "vals": user_vals(user_data),
+                "groups": [x for x in user_data.get("groups", []) or [] if "." in x],
+            }
+            # Igual que ensure_users: la contraseña del YAML se reescribe siempre
+            if "password" in user_data:
+                op["always"] = {"password": user_data["password"]}
+            else:
+                op["create"] = {"password": user_data["login"]}
+            ops.append(op)
+    if "mail" in stages:
+        mail = cfg.get("mail", {}) or {}
+        servers = [
+            ("ir.mail_server", mail.get("outgoing_smtp"), outgoing_mail_vals),
+            ("fetchmail.server", mail.get("incoming_imap"), incoming_mail_vals),
+        ]
+        for model, section, to_vals in servers:
+            if section:
+                vals = to_vals(section)
+                ops.append(
+                    {
+                        "op": "upsert",
+                        "model": model,
+                        "key": vals["name"],
+                        "domain": [["name", "=", vals["name"]]],
+                        "vals": vals,
+                    }
+                )
+    return ops
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--config", required=True)
-    ap.add_argument(
-        "--only",
-        choices=["mail", "modules", "langs", "params", "company", "users", "all"],
-        default="all",
+def deep_none_to_false(value: Any) -> Any:
+    if value is None:
+        return False
+    if isinstance(value, dict):
+        return {k: deep_none_to_false(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [deep_none_to_false(v) for v in value]
+    return value
+
+
+def log_apply_report(report: List[Dict[str, Any]], plan: bool):
+    prefix = "[PLAN] " if plan else ""
+    counts: Dict[str, int] = {}
+    for entry in report:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        label = f"{entry.get('model') or entry['op']} {entry.get('key') or ''}".strip()
+        for warning in entry.get("warnings") or []:
+            stage_warning(f"  {label}: {warning}")
+        if entry["status"] == "error":
+            logger.error(f"  {label}: {entry.get('error')}")
+        elif entry["status"] != "unchanged":
+            fields = [
+                "***" if f in SECRET_FIELDS else f for f in entry.get("fields") or []
+            ]
+            logger.info(f"  {prefix}{label}: {entry['status']} {fields}")
+    logger.info(f"{prefix}Resumen de la aplicación en servidor: {counts}")
+
+
+def apply_server_side(
+    models,
+    db,
+    uid,
+    password,
+    cfg: Dict[str, Any],
+    stages: List[str],
+    plan: bool = False,
+):
+    """
+    Aplica langs/params/company/users/mail en una única llamada: la acción de
+    servidor APPLY_ACTION_CODE lo ejecuta todo en una transacción y devuelve
+    un informe por operación. Si algo falla se revierte entero; en modo plan
+    siempre se revierte y el informe hace de diff.
+    """
+    # None no viaja por XML-RPC sin allow_none: en Odoo equivale a False
+    ops = deep_none_to_false(build_apply_ops(cfg, stages))
+    if not ops:
+        return
+    action_id, _ = ensure_server_action(
+        models, db, uid, password, APPLY_ACTION_NAME, APPLY_ACTION_CODE
+    )
+    logger.info(f"Aplicando {len(ops)} operaciones en el servidor ({stages})...")
+    result = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.actions.server",
+        "run",
+        [action_id],
+        context={"provision_payload": {"ops": ops, "dry_run": plan}},
+    )
+    log_apply_report(result["provision_report"], plan)
+    errors = [e for e in result["provision_report"] if e["status"] == "error"]
+    if errors:
+        die(f"Aplicación en servidor revertida: {len(errors)} operaciones con error.")
+
+
+# Filas por llamada a `load` y llamadas simultáneas en la etapa data
+DATA_CHUNK_SIZE = 2000
+DATA_WORKERS = 4
+
+
+def external_id(value: str) -> Tuple[str, str]:
+    # Igual que `load`: un XML ID sin módulo va a __import__
+    module, _, name = value.rpartition(".")
+    return (module or "__import__", name)
+
+
+def existing_xml_ids(
+    models, db, uid, password, model: str, xml_ids: List[Tuple[str, str]]
+) -> set:
+    # XML IDs de `model` que ya existen, agrupados por módulo en un solo search_read
+    by_module: Dict[str, List[str]] = {}
+    for module, name in xml_ids:
+        by_module.setdefault(module, []).append(name)
+    domain: List[Any] = [("model", "=", model)] + ["|"] * (len(by_module) - 1)
+    for module, names in by_module.items():
+        domain += ["&", ("module", "=", module), ("name", "in", names)]
+    rows = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.model.data",
+        "search_read",
+        domain,
+        fields=["module", "name"],
     )
-    args = ap.parse_args()
+    return {(r["module"], r["name"]) for r in rows}
+
+
+def read_csv_header(path: str) -> Optional[List[str]]:
+    # Primera fila del CSV, sin dejar el fichero abierto
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader(f), None)
+
+
+def read_csv_chunks(path: str, chunk_size: int):
+    # Iterador de (nº de línea de cada fila, filas) tras la cabecera, sin leer
+    # todo el fichero; la línea es la del fichero aunque haya campos multilínea
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        while True:
+            lines, rows = [], []
+            for row in itertools.islice(reader, chunk_size):
+                lines.append(reader.line_num)
+                rows.append(row)
+            if not rows:
+                return
+            yield lines, rows
+
+
+def self_referencing_columns(
+    models, db, uid, password, model: str, header: List[str]
+) -> List[str]:
+    # Columnas `campo/id` cuyo campo apunta al propio modelo (p.ej. parent_id/id)
+    fields = [c[: -len("/id")] for c in header if c.endswith("/id")]
+    if not fields:
+        return []
+    info = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        model,
+        "fields_get",
+        fields,
+        attributes=["relation"],
+    )
+    return [f"{f}/id" for f in fields if (info.get(f) or {}).get("relation") == model]
+
+
+def import_data_file(
+    models,
+    db,
+    uid,
+    password,
+    entry: Dict[str, Any],
+    chunk_size: int = DATA_CHUNK_SIZE,
+    plan: bool = False,
+    workers: int = 1,
+) -> Dict[str, int]:
+    """
+    Importa un CSV (formato de importación de Odoo, con columna `id`) en
+    bloques de `chunk_size` filas mediante `load`, hasta `workers` bloques a
+    la vez. Si el CSV referencia a su propio modelo (`parent_id/id`), los
+    bloques van en orden: una fila puede apuntar a otra de un bloque
+    anterior. Antes de cada bloque se resuelven sus XML IDs: las filas que ya
+    existen se omiten salvo `update: true`, de modo que re-ejecutar solo lee.
+    Cada bloque es atómico en Odoo; los errores se informan por fila, con su
+    número de línea en el CSV.
+    """
+    model, path = entry["model"], entry["file"]
+    update = bool(entry.get("update"))
+    header = read_csv_header(path)
+    if not header or "id" not in header:
+        die(f"{path}: el CSV necesita una columna 'id' (XML ID) para ser idempotente")
+    id_col = header.index("id")
+    totals = {"imported": 0, "skipped": 0, "failed": 0}
+    totals_lock = threading.Lock()
+    prefix = "[PLAN] " if plan else ""
+
+    def import_chunk(n: int, lines: List[int], rows: List[List[str]]):
+        # Filas con otro número de columnas que la cabecera: no se envían
+        bad = [i for i, r in enumerate(rows) if len(r) != len(header)]
+        for i in bad:
+            logger.error(
+                f"    {path} línea {lines[i]}: {len(rows[i])} columnas, "
+                f"la cabecera tiene {len(header)}"
+            )
+        if bad:
+            keep = [i for i, r in enumerate(rows) if len(r) == len(header)]
+            rows, lines = [rows[i] for i in keep], [lines[i] for i in keep]
+        total = len(rows)
+        if rows and not update:
+            xml_ids = [external_id(r[id_col]) for r in rows]
+            existing = existing_xml_ids(models, db, uid, password, model, xml_ids)
+            keep = [i for i, x in enumerate(xml_ids) if x not in existing]
+            rows, lines = [rows[i] for i in keep], [lines[i] for i in keep]
+        skipped = total - len(rows)
+        errors = []
+        if rows and not plan:
+            result = model_exec(
+                models,
+                db,
+                uid,
+                password,
+                model,
+                "load",
+                header,
+                rows,
+                context={"tracking_disable": True},
+            )
+            errors = [m for m in result.get("messages", []) if m.get("type") == "error"]
+        with totals_lock:
+            totals["failed"] += len(bad) + (len(rows) if errors else 0)
+            totals["imported"] += 0 if errors else len(rows)
+            totals["skipped"] += skipped
+        if errors:
+            # `load` revierte el bloque entero: se informa fila a fila
+            logger.error(
+                f"  {model} bloque {n}: {len(errors)} errores, bloque no importado"
+            )
+            for m in errors[:20]:
+                row = m.get("record")
+                where = (
+                    f"línea {lines[row]}"
+                    if isinstance(row, int) and row < len(lines)
+                    else "bloque"
+                )
+                logger.error(f"    {path} {where}: {m.get('message')}")
+        else:
+            logger.info(
+                f"  {prefix}{model} bloque {n}: {len(rows)} filas importadas, "
+                f"{skipped} ya existentes."
+            )
 
-    cfg = deep_env_expand(load_config(args.config))
+    chunks = enumerate(
+        read_csv_chunks(path, int(entry.get("chunk_size", chunk_size))), 1
+    )
+    if workers > 1:
+        ordered = self_referencing_columns(models, db, uid, password, model, header)
+        if ordered:
+            logger.info(
+                f"{path}: {', '.join(ordered)} apunta a {model}, bloques en orden."
+            )
+            workers = 1
+    logger.info(f"Importando {path} en {model}...")
+    if workers <= 1:
+        for n, (lines, rows) in chunks:
+            import_chunk(n, lines, rows)
+        return totals
+    # Como mucho 2 bloques en cola por hilo: el CSV no se carga entero en memoria
+    task = in_current_stage(import_chunk)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for n, (lines, rows) in chunks:
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    fut.result()
+            pending.add(pool.submit(task, n, lines, rows))
+        for fut in as_completed(pending):
+            fut.result()
+    return totals
+
+
+def import_data(
+    models,
+    db,
+    uid,
+    password,
+    data: Dict[str, Any],
+    plan: bool = False,
+    chunk_workers: int = 1,
+) -> bool:
+    """
+    Importa los ficheros de `data`, hasta `workers` a la vez y cada uno con
+    hasta `chunk_workers` bloques en paralelo. Los ficheros son
+    independientes salvo que declaren `depends: [...]` (rutas de otros
+    ficheros que deben importarse antes, p.ej. compañías antes que contactos).
+    """
+    files = data.get("files") or []
+    chunk_size = int(data.get("chunk_size", DATA_CHUNK_SIZE))
+    results: Dict[str, Dict[str, int]] = {}
+
+    def import_file(entry: Dict[str, Any]) -> Callable[[], None]:
+        def run():
+            start = time.monotonic()
+            totals = import_data_file(
+                models, db, uid, password, entry, chunk_size, plan, chunk_workers
+            )
+            results[entry["file"]] = totals
+            logger.info(
+                f"{entry['file']}: {totals['imported']} importadas, "
+                f"{totals['skipped']} ya existentes, {totals['failed']} con error "
+                f"({time.monotonic() - start:.1f}s)."
+            )
+            if totals["failed"]:
+                raise RuntimeError(
+                    f"{entry['file']}: {totals['failed']} filas con error"
+                )
 
-    odoo = cfg.get("odoo", {})
-    base_url = odoo.get("base_url")
-    db = odoo.get("db")
-    login = odoo.get("admin_login", "admin")
-    password = odoo.get("admin_password")
+        return run
+
+    stages = {entry["file"]: import_file(entry) for entry in files}
+    depends = {entry["file"]: list(entry.get("depends") or []) for entry in files}
+    status = run_stages(stages, depends, int(data.get("workers", DATA_WORKERS)))
+    return all(st == "done" for st in status.values())
+
+
+def run_parallel(fn: Callable[[Any], Any], items: List[Any], workers: int) -> List[Any]:
+    # Ejecuta fn sobre cada elemento de forma concurrente, conservando el orden
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(in_current_stage(fn), items))
+
+
+# Dependencias reales entre etapas. Los usuarios necesitan los grupos que
+# definen los módulos y sus idiomas activos; fetchmail.server (mail) lo aporta
+# el módulo mail. params, company y langs no dependen de nada.
+STAGE_DEPENDS = {
+    "langs": [],
+    "params": [],
+    "company": [],
+    "modules": [],
+    "users": ["langs", "modules"],
+    "mail": ["modules"],
+    "data": ["modules", "company"],
+}
+
+
+# Secciones de provision.yml que determinan el resultado de cada etapa
+STAGE_SECTIONS = {
+    "langs": ["instance"],
+    "params": ["settings"],
+    "company": ["company"],
+    "modules": ["modules"],
+    "users": ["users"],
+    "mail": ["mail"],
+    "data": ["data"],
+}
+
+# Huellas de la última aplicación correcta de cada etapa, guardadas en la
+# propia instancia como ir.config_parameter provision.fingerprint.<etapa>
+FINGERPRINT_PREFIX = "provision.fingerprint."
+FINGERPRINT_VERSION = 2
+
+
+def fingerprint_key() -> bytes:
+    """
+    Clave del HMAC de las huellas. Las secciones incluyen contraseñas (usuarios,
+    SMTP, IMAP) y las huellas las puede leer cualquier administrador: con un
+    sha256 sin clave se podrían comprobar contraseñas débiles sin conexión.
+    La clave nunca llega a Odoo: PROVISION_FINGERPRINT_KEY o, si no está
+    definida, una aleatoria guardada en CACHE_DIR (solo legible por el usuario).
+    Otra clave (otra máquina) solo hace que las etapas se vuelvan a aplicar.
+    """
+    key = os.getenv("PROVISION_FINGERPRINT_KEY")
+    if key:
+        return key.encode("utf-8")
+    path = os.path.join(CACHE_DIR, "fingerprint.key")
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Otro proceso (p.ej. --fleet) la ha creado a la vez
+        with open(path, "rb") as f:
+            return f.read().strip()
+    key = secrets.token_hex(32).encode("ascii")
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def section_fingerprints(cfg: Dict[str, Any]) -> Dict[str, str]:
+    """
+    HMAC (con fingerprint_key) de la configuración normalizada de cada etapa.
+    Incluye las huellas de sus dependencias: si cambian los módulos, los
+    usuarios se vuelven a aplicar.
+    """
+    prints: Dict[str, str] = {}
+    key = fingerprint_key()
+
+    def fingerprint(stage: str) -> str:
+        if stage not in prints:
+            payload = {
+                "version": FINGERPRINT_VERSION,
+                "config": {s: cfg.get(s) for s in STAGE_SECTIONS[stage]},
+                "depends": [fingerprint(d) for d in STAGE_DEPENDS[stage]],
+            }
+            if stage == "data":
+                # Lo que importa de los CSV es su contenido, no su ruta
+                payload["files"] = [
+                    file_sha256(e["file"])
+                    for e in (cfg.get("data") or {}).get("files") or []
+                ]
+            blob = json.dumps(payload, sort_keys=True, default=str)
+            prints[stage] = hmac.new(key, blob.encode("utf-8"), "sha256").hexdigest()
+        return prints[stage]
+
+    for stage in STAGE_DEPENDS:
+        fingerprint(stage)
+    return prints
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fetch_fingerprints(models, db, uid, password) -> Dict[str, str]:
+    # Todas las huellas guardadas en una única lectura
+    rows = model_exec(
+        models,
+        db,
+        uid,
+        password,
+        "ir.config_parameter",
+        "search_read",
+        [("key", "=like", f"{FINGERPRINT_PREFIX}%")],
+        fields=["key", "value"],
+    )
+    return {r["key"][len(FINGERPRINT_PREFIX) :]: r["value"] for r in rows}
 
-    if not base_url or not db or not password:
-        die(
-            "Config incompleta: odoo.base_url, odoo.db y odoo.admin_password son obligatorios."
-        )
 
-    uid, models = xmlrpc_connect(base_url, db, login, password)
-    logger.info(f"Conexión establecida. uid={uid} db={db}")
+def save_fingerprints(models, db, uid, password, prints: Dict[str, str]):
+    ensure_ir_configs(
+        models,
+        db,
+        uid,
+        password,
+        {f"{FINGERPRINT_PREFIX}{stage}": value for stage, value in prints.items()},
+    )
 
-    # Ejecución secuencial según lógica
 
-    # 1. Idiomas (lo primero, para que afecte a traducciones si se necesitan)
-    if args.only in ("all", "langs"):
+def build_stages(
+    models,
+    db,
+    uid,
+    password,
+    cfg: Dict[str, Any],
+    args: argparse.Namespace,
+    index: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Callable[[], None]]:
+    workers = args.concurrency
+    plan = args.plan
+    module_names = (cfg.get("modules", {}) or {}).get("install", []) or []
+    xml_id_cache = xml_id_cache_path(cfg["odoo"]["base_url"], db)
+
+    def stage_langs():
+        # Idiomas (afectan a traducciones y al idioma de los usuarios)
         inst = cfg.get("instance", {})
         langs = [inst.get("main_lang")] + (inst.get("extra_langs") or [])
         langs = [l for l in langs if l]
-        for lang in langs:
-            ensure_language(models, db, uid, password, lang)
+        run_parallel(
+            lambda lang: ensure_language(models, db, uid, password, lang, plan, index),
+            langs,
+            workers,
+        )
 
         main_lang = inst.get("main_lang")
         if main_lang:
-            ensure_default_lang(models, db, uid, password, main_lang)
+            ensure_default_lang(models, db, uid, password, main_lang, plan, index)
 
         logger.info("Idiomas verificados.")
 
-    # 2. Config de Parámetros (puede afectar URLs y comportamiento)
-    if args.only in ("all", "params"):
+    def stage_params():
+        # Config de Parámetros (puede afectar URLs y comportamiento)
         params = (cfg.get("settings", {}) or {}).get("ir_config_parameter", []) or []
-        for p in params:
-            ensure_ir_config(models, db, uid, password, p["key"], str(p["value"]))
+        ensure_ir_configs(
+            models,
+            db,
+            uid,
+            password,
+            {p["key"]: str(p["value"]) for p in params},
+            plan,
+        )
         logger.info("Parámetros del sistema aplicados.")
 
-    # 3. Compañía (metadata importante para informes/web)
-    if args.only in ("all", "company"):
+    def stage_company():
+        # Compañía (metadata importante para informes/web)
         comp = cfg.get("company", {})
         if comp:
-            ensure_company(models, db, uid, password, comp)
+            ensure_company(models, db, uid, password, comp, plan, index)
         else:
             logger.info("No hay configuración de company en el YAML.")
 
-    # 4. Módulos (lo más pesado al final)
-    if args.only in ("all", "modules"):
-        module_names = (cfg.get("modules", {}) or {}).get("install", []) or []
+    def stage_modules():
+        # Módulos (lo más pesado; uno a uno o en una única pasada con --install-mode batch)
         if module_names:
-            install_modules(models, db, uid, password, module_names)
+            installed = install_modules(
+                models, db, uid, password, module_names, args.install_mode, plan
+            )
+            if installed:
+                # Nuevos módulos pueden aportar (o cambiar) XML IDs de grupos
+                invalidate_xml_id_cache(xml_id_cache)
             logger.info("Proceso de módulos finalizado.")
         else:
             logger.info("No hay lista de módulos a instalar.")
 
-    # 5. Usuarios (dependen de grupos definidos por módulos)
-    if args.only in ("all", "users"):
+    def stage_users():
+        # Usuarios (dependen de grupos definidos por módulos)
         users_list = cfg.get("users", []) or []
-        for u in users_list:
-            ensure_user(models, db, uid, password, u)
+        xml_ids = {}
+        group_xml_ids = collect_xml_ids(cfg)
+        if group_xml_ids:
+            xml_ids = resolve_xml_ids(
+                models,
+                db,
+                uid,
+                password,
+                group_xml_ids,
+                xml_id_cache,
+                modules_signature(module_names),
+            )
+        ensure_users(
+            models, db, uid, password, users_list, xml_ids, args.batch_size, plan
+        )
         if users_list:
             logger.info("Usuarios procesados.")
         else:
             logger.info("No hay usuarios definidos.")
 
-    # 6. Mail
-    if args.only in ("all", "mail"):
+    def stage_mail():
         mail = cfg.get("mail", {}) or {}
-        smtp = mail.get("outgoing_smtp") or None
-        if smtp:
-            server_id = ensure_outgoing_mail_server(models, db, uid, password, smtp)
-            logger.info(f"SMTP configurado correctamente (id={server_id}).")
-        else:
-            logger.info("No hay configuración SMTP pendiente.")
 
-        imap = mail.get("incoming_imap") or None
-        if imap:
-            server_id = ensure_incoming_mail_server(models, db, uid, password, imap)
-            logger.info(f"IMAP/POP configurado correctamente (id={server_id}).")
-        else:
-            logger.info("No hay configuración IMAP/POP pendiente.")
+        def outgoing():
+            smtp = mail.get("outgoing_smtp") or None
+            if smtp:
+                server_id = ensure_outgoing_mail_server(
+                    models, db, uid, password, smtp, plan
+                )
+                logger.info(f"SMTP configurado correctamente (id={server_id}).")
+            else:
+                logger.info("No hay configuración SMTP pendiente.")
+
+        def incoming():
+            imap = mail.get("incoming_imap") or None
+            if imap:
+                server_id = ensure_incoming_mail_server(
+                    models, db, uid, password, imap, plan
+                )
+                logger.info(f"IMAP/POP configurado correctamente (id={server_id}).")
+            else:
+                logger.info("No hay configuración IMAP/POP pendiente.")
+
+        run_parallel(lambda fn: fn(), [outgoing, incoming], workers)
+
+    def stage_data():
+        # Datos maestros desde CSV (después de módulos y compañía)
+        data = cfg.get("data") or {}
+        if not data.get("files"):
+            logger.info("No hay datos que importar.")
+            return
+        if not import_data(models, db, uid, password, data, plan, workers):
+            die("Importación de datos incompleta: revisa los bloques con error.")
+
+    return {
+        "langs": stage_langs,
+        "params": stage_params,
+        "company": stage_company,
+        "modules": stage_modules,
+        "users": stage_users,
+        "mail": stage_mail,
+        "data": stage_data,
+    }
+
+
+def run_stages(
+    stages: Dict[str, Callable[[], None]],
+    depends: Dict[str, List[str]],
+    workers: int,
+    warned: Optional[set] = None,
+) -> Dict[str, str]:
+    """
+    Ejecuta las etapas respetando sus dependencias (DAG), lanzando en paralelo
+    las que ya tienen resueltas todas las suyas. Las dependencias que no están
+    en `stages` (p.ej. con --only) se dan por satisfechas.
+
+    Devuelve el estado final de cada etapa: done, failed o skipped. Las etapas
+    que emiten stage_warning se añaden a `warned`; llamado desde dentro de una
+    etapa, los avisos cuentan para esa etapa.
+    """
+    warned = set() if warned is None else warned
+
+    def in_stage(name: str, fn: Callable[[], None]) -> Callable[[], None]:
+        if getattr(STAGE_CONTEXT, "current", None):
+            return in_current_stage(fn)
+
+        def run():
+            STAGE_CONTEXT.current = (name, warned)
+            try:
+                fn()
+            finally:
+                STAGE_CONTEXT.current = None
+
+        return run
+
+    status: Dict[str, str] = {}
+    pending = dict(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            for name in list(pending):
+                deps = [d for d in depends.get(name, []) if d in stages]
+                broken = [d for d in deps if status.get(d) in ("failed", "skipped")]
+                if broken:
+                    logger.error(
+                        f"Etapa {name} omitida: dependencias fallidas {broken}"
+                    )
+                    status[name] = "skipped"
+                    del pending[name]
+                elif all(status.get(d) == "done" for d in deps):
+                    logger.info(f"Iniciando etapa: {name}")
+                    running[pool.submit(in_stage(name, pending.pop(name)))] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                try:
+                    fut.result()
+                    status[name] = "done"
+                except BaseException as e:
+                    # die() lanza SystemExit dentro del hilo de la etapa
+                    logger.error(f"Etapa {name} fallida: {e!r}")
+                    status[name] = "failed"
+    for name in pending:
+        status[name] = "skipped"
+    return status
+
+
+def find_fleet_configs(pattern: str) -> List[str]:
+    # Acepta un directorio (todos sus *.yml / *.yaml) o un patrón glob
+    if os.path.isdir(pattern):
+        paths = glob.glob(os.path.join(pattern, "*.yml")) + glob.glob(
+            os.path.join(pattern, "*.yaml")
+        )
+    else:
+        paths = glob.glob(pattern)
+    return sorted({os.path.abspath(p) for p in paths if os.path.isfile(p)})
+
+
+def fleet_tenant_names(paths: List[str]) -> Dict[str, str]:
+    # Nombre del tenant = nombre del fichero; si se repite (p.ej. varios
+    # tenants/<x>/provision.yml) se antepone el directorio padre.
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    names = {}
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            parent = os.path.basename(os.path.dirname(path))
+            stem = f"{parent}_{stem}"
+        names[path] = stem
+    return names
 
+
+def provision_tenant(
+    config_path: str, name: str, only: str, log_dir: str, extra_args: List[str]
+):
+    """
+    Provisiona un tenant en un proceso hijo con su propio log y código de salida.
+    """
+    log_path = os.path.join(log_dir, f"provision_{name}.log")
+    cmd = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--config",
+        config_path,
+        "--only",
+        only,
+    ] + extra_args
+    start = time.monotonic()
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        proc = subprocess.run(cmd, stdout=log_file, stderr=subprocess.STDOUT)
+    return {
+        "tenant": name,
+        "config": config_path,
+        "log": log_path,
+        "code": proc.returncode,
+        "duration": time.monotonic() - start,
+    }
+
+
+# Opciones propias del modo flota que no se reenvían a cada tenant
+FLEET_ONLY_ARGS = ("--fleet", "--workers", "--log-dir", "--only")
+
+
+def fleet_child_args(argv: List[str]) -> List[str]:
+    # Reenvía a cada tenant el resto de opciones de la línea de comandos
+    out = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        name = arg.split("=", 1)[0]
+        if name in FLEET_ONLY_ARGS:
+            skip = "=" not in arg
+            continue
+        out.append(arg)
+    return out
+
+
+def run_fleet(
+    pattern: str, only: str, workers: int, log_dir: str, extra_args: List[str]
+) -> int:
+    paths = find_fleet_configs(pattern)
+    if not paths:
+        die(f"No se encontraron ficheros de configuración en: {pattern}")
+    os.makedirs(log_dir, exist_ok=True)
+    names = fleet_tenant_names(paths)
+
+    logger.info(
+        f"Provisionando {len(paths)} tenants con {workers} workers (logs en {log_dir})..."
+    )
+    start = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(provision_tenant, path, names[path], only, log_dir, extra_args)
+            for path in paths
+        ]
+        for fut in as_completed(futures):
+            res = fut.result()
+            status = "OK" if res["code"] == 0 else f"FALLO (código {res['code']})"
+            logger.info(f"Tenant {res['tenant']}: {status} en {res['duration']:.1f}s")
+            results.append(res)
+    elapsed = time.monotonic() - start
+
+    # Tabla resumen
+    width = max(len(r["tenant"]) for r in results)
+    logger.info("Resumen de provisioning:")
+    logger.info(f"  {'tenant'.ljust(width)}  {'estado':<7}  {'duración':>9}  log")
+    for r in sorted(results, key=lambda r: r["duration"], reverse=True):
+        status = "OK" if r["code"] == 0 else "FALLO"
+        logger.info(
+            f"  {r['tenant'].ljust(width)}  {status:<7}  {r['duration']:>8.1f}s  {r['log']}"
+        )
+    failed = [r for r in results if r["code"] != 0]
+    logger.info(
+        f"Total: {len(results)} tenants, {len(failed)} fallidos, {elapsed:.1f}s de reloj."
+    )
+    return 1 if failed else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    global MAX_RETRIES, RETRY_DELAY, RETRY_MAX_DELAY
+    ap = argparse.ArgumentParser()
+    target = ap.add_mutually_exclusive_group(required=True)
+    target.add_argument("--config")
+    target.add_argument(
+        "--fleet",
+        metavar="DIR_O_GLOB",
+        help="Directorio o patrón glob con varios provision.yml a ejecutar en paralelo",
+    )
+    ap.add_argument(
+        "--only",
+        choices=[
+            "mail",
+            "modules",
+            "langs",
+            "params",
+            "company",
+            "users",
+            "data",
+            "all",
+        ],
+        default="all",
+    )
+    ap.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Etapas y elementos de una etapa ejecutados a la vez contra Odoo",
+    )
+    ap.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Registros por RPC en las operaciones en lote (usuarios)",
+    )
+    ap.add_argument(
+        "--install-mode",
+        choices=["immediate", "batch"],
+        default="immediate",
+        help="immediate: button_immediate_install por módulo; batch: una sola pasada con sondeo de progreso",
+    )
+    ap.add_argument(
+        "--plan",
+        action="store_true",
+        help="Solo lee el estado actual y muestra el diff campo a campo, sin escribir",
+    )
+    ap.add_argument(
+        "--engine",
+        choices=["rpc", "server"],
+        default="rpc",
+        help="rpc: etapas por RPC; server: todo salvo módulos en una acción de servidor transaccional",
+    )
+    ap.add_argument(
+        "--template",
+        action="store_true",
+        help="Si la DB no existe, la crea clonando una plantilla con los módulos ya instalados",
+    )
+    ap.add_argument(
+        "--template-prefix",
+        default="provision_tpl_",
+        help="Prefijo de las bases de datos plantilla (se añade el hash de los módulos)",
+    )
+    ap.add_argument(
+        "--force",
+        action="store_true",
+        help="Aplica todas las etapas aunque su huella coincida con la de la última ejecución",
+    )
+    ap.add_argument(
+        "--check",
+        action="store_true",
+        help="Solo valida la configuración (esquema y variables de entorno) y termina",
+    )
+    ap.add_argument(
+        "--max-retries",
+        type=int,
+        default=MAX_RETRIES,
+        help="Intentos máximos por llamada ante errores de transporte",
+    )
+    ap.add_argument(
+        "--retry-base-delay",
+        type=float,
+        default=RETRY_DELAY,
+        help="Espera base (s) del backoff exponencial entre reintentos",
+    )
+    ap.add_argument(
+        "--retry-max-delay",
+        type=float,
+        default=RETRY_MAX_DELAY,
+        help="Espera máxima (s) entre reintentos",
+    )
+    ap.add_argument(
+        "--protocol",
+        choices=["xmlrpc", "jsonrpc"],
+        default="xmlrpc",
+        help="Transporte RPC: jsonrpc es más compacto para search_read/fields_get grandes",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="Muestra el perfil RPC por modelo/método y lo guarda en JSON y Prometheus",
+    )
+    ap.add_argument(
+        "--profile-dir",
+        default=".",
+        help="Directorio donde se guarda el perfil de --profile",
+    )
+    replay = ap.add_mutually_exclusive_group()
+    replay.add_argument(
+        "--record",
+        metavar="CASSETTE",
+        help="Graba todas las llamadas RPC (sin secretos) en este fichero ({db} se sustituye)",
+    )
+    replay.add_argument(
+        "--replay",
+        metavar="CASSETTE",
+        help="Reproduce un cassette grabado con --record sin conectar a Odoo",
+    )
+    ap.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="Multiplicador de las latencias grabadas en --replay (0 = sin espera)",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Tenants provisionados a la vez en modo --fleet",
+    )
+    ap.add_argument(
+        "--log-dir",
+        default="logs",
+        help="Directorio de logs por tenant en modo --fleet",
+    )
+    args = ap.parse_args(argv)
+
+    MAX_RETRIES = max(1, args.max_retries)
+    RETRY_DELAY = args.retry_base_delay
+    RETRY_MAX_DELAY = args.retry_max_delay
+    return args
+
+
+def template_language_country(cfg: Dict[str, Any]) -> Tuple[str, str]:
+    # Idioma y país con los que create_database inicializa la plantilla; el
+    # país es el de la compañía, como en la etapa company
+    inst = cfg.get("instance", {}) or {}
+    company = cfg.get("company", {}) or {}
+    return inst.get("main_lang") or "en_US", company.get("country_code") or ""
+
+
+def template_name(
+    prefix: str, module_names: List[str], lang: str = "en_US", country: str = ""
+) -> str:
+    # El idioma y el país quedan fijados al crear la DB: forman parte del nombre
+    signature = modules_signature(module_names + [f"lang:{lang}", f"country:{country}"])
+    return f"{prefix}{signature[:12]}"
+
+
+def template_credentials(master: str, template: str) -> Tuple[str, str]:
+    # Admin de la plantilla: derivado de la master password, así cualquier
+    # tenant del mismo servidor puede entrar en su clon sin conocer el YAML de
+    # quien construyó la plantilla
+    secret = hmac.new(master.encode("utf-8"), template.encode("utf-8"), "sha256")
+    return "admin", secret.hexdigest()[:32]
+
+
+def ensure_from_template(cfg: Dict[str, Any], args: argparse.Namespace):
+    """
+    Si la base de datos del tenant no existe, la crea duplicando una base de
+    datos plantilla con los módulos ya instalados (una por conjunto de
+    módulos, idioma principal y país de la compañía). La plantilla se construye la primera vez ejecutando solo la etapa
+    de módulos, lo que deja guardada su huella: el tenant clonado la hereda y
+    el resto de la ejecución salta directamente a las etapas propias.
+    """
+    odoo = cfg["odoo"]
+    base_url, db = odoo["base_url"], odoo["db"]
+    master = odoo.get("master_password")
+    if not master:
+        die("El modo --template necesita odoo.master_password (servicio db de Odoo).")
+    service = db_service(base_url, args.protocol)
+    try:
+        if service.db_exist(db):
+            logger.info(f"La base de datos {db} ya existe: no se clona la plantilla.")
+            return
+        module_names = (cfg.get("modules", {}) or {}).get("install", []) or []
+        template = template_name(
+            args.template_prefix, module_names, *template_language_country(cfg)
+        )
+
+        # Un solo proceso construye cada plantilla (p.ej. varios tenants en --fleet)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, f"{template}.lock"), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if not service.db_exist(template):
+                build_template(service, cfg, args, template, master)
+
+        start = time.monotonic()
+        service.duplicate_database(master, template, db)
+        logger.info(
+            f"Base de datos {db} creada desde la plantilla {template} "
+            f"en {time.monotonic() - start:.1f}s."
+        )
+    except xmlrpc.client.Fault as e:
+        die(f"Error en el servicio db de Odoo: {e.faultString}")
+    reset_template_admin(cfg, args, template, master)
+
+
+def reset_template_admin(
+    cfg: Dict[str, Any], args: argparse.Namespace, template: str, master: str
+):
+    # El clon conserva el admin de la plantilla: se le ponen los del tenant
+    odoo = cfg["odoo"]
+    tpl_login, tpl_password = template_credentials(master, template)
+    uid, models = connect(
+        odoo["base_url"], odoo["db"], tpl_login, tpl_password, args.protocol
+    )
+    model_exec(
+        models,
+        odoo["db"],
+        uid,
+        tpl_password,
+        "res.users",
+        "write",
+        [uid],
+        {
+            "login": odoo.get("admin_login", "admin"),
+            "password": odoo["admin_password"],
+        },
+    )
+    logger.info("Credenciales de admin del tenant aplicadas sobre el clon.")
+
+
+def build_template(
+    service, cfg: Dict[str, Any], args: argparse.Namespace, template: str, master
+):
+    odoo = cfg["odoo"]
+    lang, country = template_language_country(cfg)
+    tpl_login, tpl_password = template_credentials(master, template)
+    logger.info(f"Construyendo plantilla {template}...")
+    start = time.monotonic()
+    service.create_database(
+        master,
+        template,
+        False,
+        lang,
+        tpl_password,
+        tpl_login,
+        # XML-RPC no admite None
+        country or False,
+    )
+    tpl_cfg = dict(
+        cfg,
+        odoo=dict(
+            odoo, db=template, admin_login=tpl_login, admin_password=tpl_password
+        ),
+    )
+    tpl_args = argparse.Namespace(**vars(args))
+    tpl_args.only, tpl_args.template, tpl_args.force = "modules", False, False
+    tpl_args.record = tpl_args.replay = None
+    tpl_args.plan = tpl_args.profile = False
+    provision(tpl_cfg, tpl_args)
+    logger.info(f"Plantilla {template} lista en {time.monotonic() - start:.0f}s.")
+
+
+def provision(cfg: Dict[str, Any], args: argparse.Namespace):
+    odoo = cfg.get("odoo", {})
+    base_url = odoo.get("base_url")
+    db = odoo.get("db")
+    login = odoo.get("admin_login", "admin")
+    password = odoo.get("admin_password")
+
+    if not base_url or not db or not (password or args.replay):
+        die(
+            "Config incompleta: odoo.base_url, odoo.db y odoo.admin_password son obligatorios."
+        )
+
+    if args.template and not (args.replay or args.plan):
+        ensure_from_template(cfg, args)
+
+    if args.replay:
+        models = CassettePlayer(args.replay, args.replay_speed)
+        uid = models.uid
+        logger.info(f"Reproduciendo {args.replay} ({models.total} llamadas) db={db}")
+    else:
+        uid, models = connect(base_url, db, login, password, args.protocol)
+        logger.info(f"Conexión establecida. uid={uid} db={db}")
+    if args.record:
+        header = {"db": db, "uid": uid, "base_url": base_url}
+        models = CassetteRecorder(models, args.record.format(db=db), header)
+    try:
+        run_provision(models, db, uid, password, cfg, args)
+    finally:
+        if args.record:
+            models.close()
+        if args.replay:
+            models.log_summary()
+
+
+def run_server_engine(
+    models,
+    db,
+    uid,
+    password,
+    cfg: Dict[str, Any],
+    args: argparse.Namespace,
+    selected: List[str],
+    warned: set,
+) -> Dict[str, str]:
+    # Módulos y datos por RPC como siempre; el resto, en una sola llamada
+    rpc_stages = ("modules", "data")
+    combined = [name for name in selected if name not in rpc_stages]
+    built = build_stages(models, db, uid, password, cfg, args)
+    stages = {name: built[name] for name in selected if name in rpc_stages}
+    if combined:
+        stages["apply"] = lambda: apply_server_side(
+            models, db, uid, password, cfg, combined, args.plan
+        )
+    depends = {"apply": ["modules"], "data": ["modules", "apply"]}
+    status = run_stages(stages, depends, args.concurrency, warned)
+    apply_status = status.pop("apply", None)
+    status.update({name: apply_status for name in combined})
+    if "apply" in warned:
+        warned.update(combined)
+    return status
+
+
+def run_provision(
+    models, db, uid, password, cfg: Dict[str, Any], args: argparse.Namespace
+):
+    selected = list(STAGE_DEPENDS) if args.only == "all" else [args.only]
+    # Etapas cuya configuración no ha cambiado desde la última ejecución correcta
+    prints = section_fingerprints(cfg)
+    stored = {} if args.force else fetch_fingerprints(models, db, uid, password)
+    unchanged = [name for name in selected if stored.get(name) == prints[name]]
+    if unchanged:
+        logger.info(f"Etapas sin cambios desde la última ejecución: {unchanged}")
+    selected = [name for name in selected if name not in unchanged]
+
+    warned: set = set()
+    if args.engine == "server":
+        status = run_server_engine(
+            models, db, uid, password, cfg, args, selected, warned
+        )
+    else:
+        # Búsquedas auxiliares de todas las etapas, una consulta por modelo
+        index = (
+            preflight(
+                models,
+                db,
+                uid,
+                password,
+                collect_lookups(cfg, selected),
+                args.concurrency,
+            )
+            if selected
+            else {}
+        )
+        stages = build_stages(models, db, uid, password, cfg, args, index)
+        stages = {name: stages[name] for name in selected}
+        status = run_stages(stages, STAGE_DEPENDS, args.concurrency, warned)
+    failed = [name for name, st in status.items() if st != "done"]
+    if not args.plan:
+        # En orden de STAGE_DEPENDS, no de finalización: la petición que guarda
+        # las huellas tiene que ser la misma en cada ejecución (cassettes)
+        # Las etapas con avisos no han convergido: se reintentan la próxima vez
+        applied = {
+            n: prints[n]
+            for n in STAGE_DEPENDS
+            if status.get(n) == "done" and n not in warned
+        }
+        pending = [n for n in STAGE_DEPENDS if n in warned and n in status]
+        if pending:
+            logger.warning(f"Etapas con avisos (no se guarda su huella): {pending}")
+        if applied:
+            save_fingerprints(models, db, uid, password, applied)
+
+    log_connection_stats(models)
+    log_rpc_stats()
+    if args.profile:
+        log_profile()
+        os.makedirs(args.profile_dir, exist_ok=True)
+        write_profile(
+            os.path.join(args.profile_dir, f"provision_profile_{db}"), {"db": db}
+        )
+    if failed:
+        die(f"Provisioning incompleto. Etapas no completadas: {failed}")
+    if args.plan:
+        logger.info("Plan completado: no se ha escrito nada en Odoo.")
+        return
     logger.info("Provisioning completado con éxito.")
 
 
+def main():
+    args = parse_args()
+
+    if args.fleet:
+        extra_args = fleet_child_args(sys.argv[1:])
+        sys.exit(
+            run_fleet(
+                args.fleet, args.only, max(1, args.workers), args.log_dir, extra_args
+            )
+        )
+
+    cfg = compile_config(args.config, bool(args.replay))
+    if args.check:
+        logger.info(f"Configuración válida: {args.config}")
+        return
+    provision(cfg, args)
+
+
 if __name__ == "__main__":
     main()
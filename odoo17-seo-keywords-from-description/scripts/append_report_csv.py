@@ -4,7 +4,7 @@ import os
 import sys
 from datetime import datetime, timezone
 
-HEADER = ["timestamp", "product_name", "product_ref", "website_slug", "meta_title", "meta_description", "keywords", "status", "notes"]
+from report_store import CSV_NAME, DB_NAME, HEADER, ReportStore
 
 
 def main() -> None:
@@ -17,7 +17,7 @@ def main() -> None:
         sys.exit(2)
 
     product_name, product_ref, website_slug, meta_title, meta_description, keywords, status, notes = sys.argv[1:9]
-    path = os.path.join(os.getcwd(), "seo_keywords_report.csv")
+    path = os.path.join(os.getcwd(), CSV_NAME)
     exists = os.path.exists(path)
 
     ts = datetime.now(timezone.utc).isoformat()
@@ -28,6 +28,10 @@ def main() -> None:
             w.writerow(HEADER)
         w.writerow([ts, product_name, product_ref, website_slug, meta_title, meta_description, keywords, status, notes])
 
+    # Indexed copy for "already processed?" lookups (imports the CSV on first use)
+    with ReportStore(os.path.join(os.getcwd(), DB_NAME), csv_path=path if exists else None) as store:
+        store.upsert([dict(zip(HEADER, [ts, product_name, product_ref, website_slug, meta_title, meta_description, keywords, status, notes]))])
+
     print(f"OK: appended report line to {path}")
 
 
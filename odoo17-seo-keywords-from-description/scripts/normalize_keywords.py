@@ -1,35 +1,150 @@
 #!/usr/bin/env python3
+import argparse
+import csv
+import itertools
+import json
 import re
 import sys
+from multiprocessing import Pool
 
+MAX_KEYWORDS = 15
 
-def normalize(raw: str) -> str:
-    # Split by commas, trim, collapse spaces
-    parts = [re.sub(r"\s+", " ", p.strip()) for p in raw.split(",")]
+# Catalog-wide stop words (see --stop-words), set once per process
+STOP_WORDS = frozenset()
+
+QUOTED_RE = re.compile(r"[“\"]([^”\"]+)[”\"]")
+
+
+def normalize(raw: str, limit: int = MAX_KEYWORDS, stop_words=None) -> str:
+    # Split by commas, trim, collapse spaces (str.split: same as \s+, much faster)
+    # and lowercase to keep consistent SEO format
+    parts = [" ".join(p.split()).lower() for p in raw.split(",")]
     parts = [p for p in parts if p]
 
-    # Lowercase to keep consistent SEO format
-    parts = [p.lower() for p in parts]
+    # Drop empty generic keywords
+    stop_words = STOP_WORDS if stop_words is None else stop_words
+    if stop_words:
+        parts = [p for p in parts if p not in stop_words]
+
+    # De-duplicate preserving order and hard limit to 15
+    out = list(dict.fromkeys(parts))[:limit]
+    return ", ".join(out)
+
+
+def load_stop_words(path: str) -> frozenset:
+    # Plain list (one per line, # comments) or seo_keyword_rules.md, where the
+    # quoted terms of the "Evitar ..." rule are used
+    words = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if path.endswith(".md"):
+                if line.lstrip("- ").lower().startswith("evitar"):
+                    words.update(w.strip().lower() for w in QUOTED_RE.findall(line))
+            elif line and not line.startswith("#"):
+                words.add(line.lower())
+    return frozenset(words)
+
+
+def init_worker(stop_words: frozenset) -> None:
+    global STOP_WORDS
+    STOP_WORDS = stop_words
+
 
-    # De-duplicate preserving order
-    seen = set()
+def normalize_lines(task):
+    # One batch of input lines -> output lines, in the same order
+    fmt, field, limit, lines = task
     out = []
-    for p in parts:
-        if p not in seen:
-            seen.add(p)
-            out.append(p)
+    for line in lines:
+        if fmt == "lines":
+            out.append(normalize(line.rstrip("\r\n"), limit) + "\n")
+        else:
+            item = json.loads(line)
+            item[field] = normalize(item.get(field) or "", limit)
+            out.append(json.dumps(item, ensure_ascii=False) + "\n")
+    return out
+
+
+def normalize_rows(task):
+    field, limit, rows = task
+    for row in rows:
+        row[field] = normalize(row.get(field) or "", limit)
+    return rows
+
+
+def batches(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
 
-    # Hard limit to 15
-    out = out[:15]
-    return ", ".join(out)
+
+def process(tasks, fn, workers: int, stop_words: frozenset):
+    # Results in input order; at most 4 batches per worker in memory
+    if workers <= 1:
+        init_worker(stop_words)
+        yield from map(fn, tasks)
+        return
+    with Pool(workers, initializer=init_worker, initargs=(stop_words,)) as pool:
+        for window in batches(tasks, 4 * workers):
+            yield from pool.map(fn, window)
+
+
+def stream(args, stop_words: frozenset) -> int:
+    count = 0
+    if args.format == "csv":
+        reader = csv.DictReader(sys.stdin)
+        if reader.fieldnames is None:
+            return 0
+        if args.field not in reader.fieldnames:
+            print(f"Column '{args.field}' not found in CSV header", file=sys.stderr)
+            sys.exit(2)
+        writer = csv.DictWriter(sys.stdout, fieldnames=reader.fieldnames, lineterminator="\n")
+        writer.writeheader()
+        tasks = ((args.field, args.limit, rows) for rows in batches(reader, args.batch_size))
+        for rows in process(tasks, normalize_rows, args.workers, stop_words):
+            writer.writerows(rows)
+            count += len(rows)
+    else:
+        lines = sys.stdin if args.format == "lines" else (line for line in sys.stdin if line.strip())
+        tasks = ((args.format, args.field, args.limit, b) for b in batches(lines, args.batch_size))
+        for out in process(tasks, normalize_lines, args.workers, stop_words):
+            sys.stdout.writelines(out)
+            count += len(out)
+    sys.stdout.flush()
+    return count
 
 
 def main() -> None:
-    if len(sys.argv) < 2:
-        print('Usage: normalize_keywords.py "kw1, kw2, kw3"', file=sys.stderr)
+    if len(sys.argv) == 2 and not sys.argv[1].startswith("-"):
+        # Single string (original interface)
+        print(normalize(sys.argv[1]))
+        return
+    ap = argparse.ArgumentParser(
+        description="Normalize SEO keywords",
+        usage='normalize_keywords.py "kw1, kw2, kw3"\n'
+        "       normalize_keywords.py --format {jsonl,csv,lines} [options] < input > output",
+    )
+    ap.add_argument("keywords", nargs="?", help="Comma-separated keywords")
+    ap.add_argument("--format", choices=["jsonl", "csv", "lines"], help="Stream mode: read stdin, write stdout")
+    ap.add_argument("--field", default="keywords", help="JSONL key / CSV column with the keywords")
+    ap.add_argument("--limit", type=int, default=MAX_KEYWORDS, help="Keywords kept per product")
+    ap.add_argument("--stop-words", help="Words to drop catalog-wide: list file or references/seo_keyword_rules.md")
+    ap.add_argument("--workers", type=int, default=1, help="Processes (stream mode)")
+    ap.add_argument("--batch-size", type=int, default=2000, help="Lines per batch (stream mode)")
+    args = ap.parse_args()
+
+    stop_words = load_stop_words(args.stop_words) if args.stop_words else frozenset()
+    if args.format:
+        count = stream(args, stop_words)
+        print(f"OK: {count} records normalized", file=sys.stderr)
+    elif args.keywords is not None:
+        print(normalize(args.keywords, args.limit, stop_words))
+    else:
+        ap.print_usage(sys.stderr)
         sys.exit(2)
-    raw = sys.argv[1]
-    print(normalize(raw))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Minimal Odoo RPC client for the scripts of this skill (XML-RPC or JSON-RPC).
+
+One keep-alive HTTP connection per thread, gzip responses, retries on dropped
+connections and keyset pagination for reading whole models. Standard library
+only, so the skill does not depend on any other folder of the repository.
+
+Usage:
+    odoo = OdooClient("https://palomar.xtd.es/", "palomar", protocol="jsonrpc")
+    if not odoo.login("xtendoo", password):
+        ...
+    for product in odoo.search_read_pages("product.template", [("is_published", "=", True)], ["name"]):
+        ...
+"""
+import gzip
+import http.client
+import itertools
+import json
+import ssl
+import threading
+import time
+import urllib.parse
+import xmlrpc.client
+
+
+class RPCError(Exception):
+    # Fault (XML-RPC) or error (JSON-RPC) returned by Odoo, or an HTTP error
+    pass
+
+
+class OdooClient:
+    def __init__(self, url: str, db: str, protocol: str = "xmlrpc", timeout: float = 120, retries: int = 3):
+        parts = urllib.parse.urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.db = db
+        self.protocol = protocol
+        self.timeout = timeout
+        self.retries = retries
+        self.uid = False
+        self.password = None
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+
+    def connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            if self.https:
+                conn = http.client.HTTPSConnection(self.host, timeout=self.timeout, context=ssl._create_unverified_context())
+            else:
+                conn = http.client.HTTPConnection(self.host, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def post(self, path: str, body: bytes, content_type: str) -> bytes:
+        headers = {"Content-Type": content_type, "Accept-Encoding": "gzip"}
+        for attempt in range(self.retries + 1):
+            conn = self.connection()
+            try:
+                conn.request("POST", self.prefix + path, body, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException):
+                # Keep-alive connection closed by the server (or network error): reconnect
+                conn.close()
+                self.local.conn = None
+                if attempt == self.retries:
+                    raise
+                time.sleep(min(2**attempt, 10))
+                continue
+            if resp.getheader("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            if resp.status != 200:
+                raise RPCError(f"HTTP {resp.status} {resp.reason} ({self.prefix + path})")
+            return data
+
+    def call(self, service: str, method: str, *args):
+        if self.protocol == "jsonrpc":
+            request = {"jsonrpc": "2.0", "method": "call", "params": {"service": service, "method": method, "args": args}, "id": next(self.ids)}
+            resp = json.loads(self.post("/jsonrpc", json.dumps(request).encode("utf-8"), "application/json"))
+            error = resp.get("error")
+            if error:
+                raise RPCError((error.get("data") or {}).get("message") or error.get("message"))
+            return resp.get("result")
+        body = xmlrpc.client.dumps(args, method).encode("utf-8")
+        try:
+            result, _ = xmlrpc.client.loads(self.post(f"/xmlrpc/2/{service}", body, "text/xml"), use_builtin_types=True)
+        except xmlrpc.client.Fault as e:
+            raise RPCError(e.faultString) from None
+        return result[0]
+
+    def login(self, user: str, password: str):
+        # uid, or False if the credentials are wrong
+        self.uid = self.call("common", "authenticate", self.db, user, password, {})
+        self.password = password
+        return self.uid
+
+    def execute(self, model: str, method: str, *args, **kwargs):
+        return self.call("object", "execute_kw", self.db, self.uid, self.password, model, method, list(args), kwargs)
+
+    def search_read_pages(self, model: str, domain: list, fields: list, page_size: int = 1000, context: dict = None):
+        # Whole model in pages of `id > last id`: every page costs the same, no offset scans
+        last_id = 0
+        while True:
+            kwargs = {"fields": fields, "limit": page_size, "order": "id asc"}
+            if context:
+                kwargs["context"] = context
+            page = self.execute(model, "search_read", list(domain) + [("id", ">", last_id)], **kwargs)
+            yield from page
+            if len(page) < page_size:
+                return
+            last_id = page[-1]["id"]
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Indexed store for the SEO report (SQLite), one row per product.
+
+Replaces scanning seo_keywords_report.csv to know whether a product is done:
+lookups by product id / ref / slug / status use indexes, results are upserted
+in batches and the CSV can be regenerated at any time with the same HEADER.
+
+Usage:
+    python scripts/report_store.py import-csv [seo_keywords_report.csv]
+    python scripts/report_store.py lookup --ref G02150
+    python scripts/report_store.py lookup --slug /shop/ad200-adblue-greenchem-200l-23222
+    python scripts/report_store.py since 2026-02-18T00:00:00
+    python scripts/report_store.py stats
+    python scripts/report_store.py export-csv [out.csv]
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+HEADER = ["timestamp", "product_name", "product_ref", "website_slug", "meta_title", "meta_description", "keywords", "status", "notes"]
+
+DB_NAME = "seo_keywords_report.db"
+CSV_NAME = "seo_keywords_report.csv"
+
+# Values the browser flow writes when a field is unknown
+EMPTY = {"", "N/A"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS report (
+    product_key TEXT PRIMARY KEY,
+    product_id INTEGER,
+    description_hash TEXT NOT NULL DEFAULT '',
+    write_date TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL,
+    product_name TEXT NOT NULL DEFAULT '',
+    product_ref TEXT NOT NULL DEFAULT '',
+    website_slug TEXT NOT NULL DEFAULT '',
+    meta_title TEXT NOT NULL DEFAULT '',
+    meta_description TEXT NOT NULL DEFAULT '',
+    keywords TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+    notes TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS report_product_id ON report (product_id);
+CREATE INDEX IF NOT EXISTS report_product_ref ON report (product_ref);
+CREATE INDEX IF NOT EXISTS report_website_slug ON report (website_slug);
+CREATE INDEX IF NOT EXISTS report_status ON report (status);
+CREATE INDEX IF NOT EXISTS report_timestamp ON report (timestamp);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release of the store
+MIGRATIONS = {
+    "description_hash": "ALTER TABLE report ADD COLUMN description_hash TEXT NOT NULL DEFAULT ''",
+    "write_date": "ALTER TABLE report ADD COLUMN write_date TEXT NOT NULL DEFAULT ''",
+}
+
+COLUMNS = ["product_key", "product_id", "description_hash", "write_date"] + HEADER
+
+UPSERT = (
+    f"INSERT INTO report ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+    "ON CONFLICT (product_key) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:])
+    + " WHERE excluded.timestamp >= report.timestamp"
+)
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def product_key(row: dict) -> str:
+    # Most stable identifier available: Odoo id, then internal ref, then slug, then name
+    if row.get("product_id"):
+        return f"id:{int(row['product_id'])}"
+    for field in ("product_ref", "website_slug", "product_name"):
+        value = (row.get(field) or "").strip()
+        if value not in EMPTY:
+            return f"{field.split('_')[-1]}:{value}"
+    raise ValueError(f"Report row without product identifier: {row!r}")
+
+
+def product_keys(product_id: int = None, ref: str = None, slug: str = None) -> list:
+    # Every key a product may be stored under (same order as product_key):
+    # rows of the browser flow have no Odoo id and are keyed by ref or slug
+    keys = [f"id:{int(product_id)}"] if product_id else []
+    for prefix, value in (("ref", ref), ("slug", slug)):
+        value = (value or "").strip()
+        if value not in EMPTY:
+            keys.append(f"{prefix}:{value}")
+    return keys
+
+
+class ReportStore:
+    def __init__(self, path: str = DB_NAME, csv_path: str = None):
+        new = path == ":memory:" or not os.path.exists(path)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.executescript(SCHEMA)
+        existing = {r["name"] for r in self.db.execute("PRAGMA table_info(report)")}
+        for column, sql in MIGRATIONS.items():
+            if column not in existing:
+                self.db.execute(sql)
+        # First use next to an existing CSV report: take it over
+        if new and csv_path and os.path.exists(csv_path):
+            self.import_csv(csv_path)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def upsert(self, rows) -> int:
+        # One transaction per batch; an older result never overwrites a newer one
+        params = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("timestamp", now())
+            params.append(
+                [product_key(row), row.get("product_id") or None, row.get("description_hash") or "", row.get("write_date") or ""]
+                + [row.get(c) or "" for c in HEADER]
+            )
+        with self.db:
+            self.db.executemany(UPSERT, params)
+        return len(params)
+
+    def import_csv(self, path: str, batch_size: int = 5000) -> int:
+        count = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            batch = []
+            for row in csv.DictReader(f):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    count += self.upsert(batch)
+                    batch = []
+            count += self.upsert(batch)
+        return count
+
+    def lookup(self, product_id: int = None, ref: str = None, slug: str = None):
+        # Row for the product if any of the given identifiers matches (indexed)
+        clauses, params = [], []
+        for column, value in (("product_id", product_id), ("product_ref", ref), ("website_slug", slug)):
+            if value not in (None, "") and value not in EMPTY:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if not clauses:
+            return None
+        row = self.db.execute(
+            f"SELECT * FROM report WHERE {' OR '.join(clauses)} ORDER BY timestamp DESC LIMIT 1",
+            params,
+        ).fetchone()
+        return dict(row) if row else None
+
+    def is_processed(self, product_id: int = None, ref: str = None, slug: str = None, statuses=None) -> bool:
+        row = self.lookup(product_id, ref, slug)
+        return bool(row) and (statuses is None or row["status"] in statuses)
+
+    def processed_keys(self, statuses=None) -> set:
+        # Keys of the products already in the report, for checking a whole
+        # catalog at once against product_keys() of each product
+        sql, params = "SELECT product_key FROM report", list(statuses or [])
+        if statuses:
+            sql += f" WHERE status IN ({', '.join('?' * len(params))})"
+        return {r[0] for r in self.db.execute(sql, params)}
+
+    def lookup_keys(self, keys_by_product: dict) -> dict:
+        # {product: row} for many products at once, given {product: product_keys(...)};
+        # the first key found wins, so an id row is preferred over a ref or slug row
+        wanted = list({key for keys in keys_by_product.values() for key in keys})
+        found = {}
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i : i + 500]
+            sql = f"SELECT product_key, description_hash, write_date, status FROM report WHERE product_key IN ({', '.join('?' * len(chunk))})"
+            for row in self.db.execute(sql, chunk):
+                found[row["product_key"]] = dict(row)
+        result = {}
+        for product, keys in keys_by_product.items():
+            row = next((found[key] for key in keys if key in found), None)
+            if row:
+                result[product] = row
+        return result
+
+    def set_checked(self, values: dict) -> None:
+        # Record the description hash and write_date a product was last checked
+        # with ({product_key: (hash, write_date)}), without touching the rest
+        with self.db:
+            self.db.executemany(
+                "UPDATE report SET description_hash = ?, write_date = ? WHERE product_key = ?",
+                [(digest, write_date, key) for key, (digest, write_date) in values.items()],
+            )
+
+    def get_state(self, key: str, default: str = None) -> str:
+        row = self.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value: str) -> None:
+        with self.db:
+            self.db.execute(
+                "INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def rows(self, statuses=None):
+        # Whole report in a single pass (optionally only some statuses)
+        sql, params = "SELECT * FROM report", list(statuses or [])
+        if statuses:
+            sql += f" WHERE status IN ({', '.join('?' * len(params))})"
+        for row in self.db.execute(sql, params):
+            yield dict(row)
+
+    def by_status(self, status: str):
+        for row in self.db.execute("SELECT * FROM report WHERE status = ? ORDER BY timestamp", (status,)):
+            yield dict(row)
+
+    def processed_since(self, since: str):
+        # ISO-8601 UTC timestamps sort lexicographically
+        for row in self.db.execute("SELECT * FROM report WHERE timestamp >= ? ORDER BY timestamp", (since,)):
+            yield dict(row)
+
+    def counts(self) -> dict:
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM report GROUP BY status ORDER BY status").fetchall())
+
+    def export_csv(self, out) -> int:
+        # Same columns as append_report_csv.py, one line per product
+        w = csv.writer(out)
+        w.writerow(HEADER)
+        count = 0
+        for row in self.db.execute(f"SELECT {', '.join(HEADER)} FROM report ORDER BY timestamp"):
+            w.writerow(list(row))
+            count += 1
+        return count
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="SEO report store (SQLite)")
+    ap.add_argument("--db", default=os.path.join(os.getcwd(), DB_NAME))
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import-csv", help="Load (upsert) an existing CSV report")
+    p.add_argument("csv", nargs="?", default=os.path.join(os.getcwd(), CSV_NAME))
+    p = sub.add_parser("lookup", help="Show the report row of a product")
+    p.add_argument("--id", type=int)
+    p.add_argument("--ref")
+    p.add_argument("--slug")
+    p = sub.add_parser("since", help="Products processed since an ISO timestamp")
+    p.add_argument("timestamp")
+    p.add_argument("--status")
+    sub.add_parser("stats", help="Products per status")
+    p = sub.add_parser("export-csv", help="Write the report as CSV (stdout by default)")
+    p.add_argument("out", nargs="?")
+    args = ap.parse_args()
+
+    with ReportStore(args.db) as store:
+        if args.cmd == "import-csv":
+            print(f"OK: {store.import_csv(args.csv)} rows imported into {args.db}")
+        elif args.cmd == "lookup":
+            row = store.lookup(args.id, args.ref, args.slug)
+            if row is None:
+                print("NOT FOUND")
+                sys.exit(1)
+            for column in ["product_id"] + HEADER:
+                print(f"{column}: {row[column]}")
+        elif args.cmd == "since":
+            w = csv.writer(sys.stdout)
+            w.writerow(HEADER)
+            for row in store.processed_since(args.timestamp):
+                if args.status is None or row["status"] == args.status:
+                    w.writerow([row[c] for c in HEADER])
+        elif args.cmd == "stats":
+            for status, count in store.counts().items():
+                print(f"{status or '-'}: {count}")
+        elif args.out:
+            with open(args.out, "w", newline="", encoding="utf-8") as f:
+                count = store.export_csv(f)
+            print(f"OK: {count} rows exported to {args.out}", file=sys.stderr)
+        else:
+            store.export_csv(sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Headless SEO pipeline: the browser runbook of references/skill.md over RPC.
+
+Reads the published product.template records in pages (only the description
+and website_meta_* fields), generates or normalizes title, description and
+keywords (seo_rules.py, or values prepared beforehand with --input), writes
+them back in batches with `load` and logs every product to the report store.
+
+Usage:
+    export ODOO_PASSWORD="..."
+    python scripts/seo_pipeline.py --url https://palomar.xtd.es/ --db palomar --user xtendoo
+    python scripts/seo_pipeline.py --dry-run --limit 20
+    python scripts/seo_pipeline.py --input seo_ai.jsonl   # {"id"|"product_ref", "meta_title", "meta_description", "keywords"}
+    python scripts/seo_pipeline.py --incremental          # nightly: only products changed since the last run
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from odoo_rpc import OdooClient
+from report_store import CSV_NAME, DB_NAME, HEADER, ReportStore, now, product_keys
+from seo_rules import DESC_MAX, DESC_MIN, TITLE_MAX, TITLE_MIN
+from seo_rules import check, clean, html_to_text, make_description, make_keywords, make_title, split_keywords
+
+MODEL = "product.template"
+DOMAIN = [("is_published", "=", True)]
+FIELDS = ["name", "default_code", "website_url", "description_ecommerce", "website_meta_title", "website_meta_description", "website_meta_keywords", "write_date"]
+# Light fields of the first pass, which decides what to process without
+# transferring the descriptions
+LIST_FIELDS = ["default_code", "website_url", "write_date"]
+LIST_PAGE_SIZE = 5000
+META_FIELDS = ["website_meta_title", "website_meta_description", "website_meta_keywords"]
+
+# Statuses that mean "already done" (the rest are retried on the next run)
+DONE_STATUSES = {"OK", "REVIEW", "SKIPPED_EMPTY"}
+
+# Notes of a REVIEW row whose values were not written to Odoo
+HELD_BACK = "not written, needs review (--write-review)"
+
+
+def description_hash(product: dict) -> str:
+    # Hash of the description text: HTML-only edits do not trigger a regeneration
+    return hashlib.sha256(html_to_text(product.get("description_ecommerce")).encode("utf-8")).hexdigest()
+
+
+def load_overrides(path: str) -> dict:
+    # SEO values generated elsewhere (e.g. by the AI), keyed by id and by ref
+    overrides = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item.get("id"):
+                overrides[int(item["id"])] = item
+            if item.get("product_ref"):
+                overrides[item["product_ref"]] = item
+    return overrides
+
+
+def build_seo(product: dict, brand: str, override: dict = None) -> dict:
+    """
+    Report row for one product, plus the `vals` to write (only the meta fields
+    that change). Priority: --input value, current value if it already follows
+    the rules, generated value. Existing keyword tags are kept.
+    """
+    text = html_to_text(product.get("description_ecommerce"))
+    row = {
+        "product_id": product["id"],
+        "product_name": product["name"],
+        "product_ref": product.get("default_code") or "",
+        "website_slug": product.get("website_url") or "",
+        "description_hash": description_hash(product),
+        "write_date": product.get("write_date") or "",
+    }
+    if not text:
+        row.update(status="SKIPPED_EMPTY", notes="description_ecommerce empty")
+        return {"row": row, "vals": {}}
+    override = override or {}
+    current_title = clean(product.get("website_meta_title"))
+    current_desc = clean(product.get("website_meta_description"))
+    current_keywords = split_keywords(product.get("website_meta_keywords"))
+
+    title = clean(override.get("meta_title"))
+    if not title:
+        title = current_title if TITLE_MIN <= len(current_title) <= TITLE_MAX else make_title(product["name"], text, brand)
+    desc = clean(override.get("meta_description"))
+    if not desc:
+        desc = current_desc if DESC_MIN <= len(current_desc) <= DESC_MAX else make_description(text)
+    extra = override.get("keywords")
+    if isinstance(extra, str):
+        extra = split_keywords(extra)
+    keywords = make_keywords(product["name"], text, current_keywords + list(extra or []))
+
+    vals = {}
+    for field, value in (("website_meta_title", title), ("website_meta_description", desc), ("website_meta_keywords", ", ".join(keywords))):
+        if clean(product.get(field)) != value:
+            vals[field] = value
+    problems = check(title, desc, keywords)
+    notes = "merged existing keywords" if current_keywords else "seo saved"
+    if not vals:
+        notes = "already up to date"
+    if problems:
+        notes += "; " + "; ".join(problems)
+    row.update(
+        meta_title=title,
+        meta_description=desc,
+        keywords=", ".join(keywords),
+        status="REVIEW" if problems else "OK",
+        notes=notes,
+    )
+    return {"row": row, "vals": vals}
+
+
+def write_batch(odoo: OdooClient, items: list, dry_run: bool) -> list:
+    """
+    Writes the meta fields of a batch with a single `load` (`.id` column), so
+    each product gets its own values in one call. `load` is all or nothing:
+    rows rejected by Odoo are marked ERROR and the rest is sent again.
+    """
+    pending = [it for it in items if it["vals"]]
+    while pending and not dry_run:
+        rows = [[str(it["row"]["product_id"])] + [it["vals"].get(f, it["row"][k]) for f, k in zip(META_FIELDS, ["meta_title", "meta_description", "keywords"])] for it in pending]
+        result = odoo.execute(MODEL, "load", [".id"] + META_FIELDS, rows, context={"tracking_disable": True})
+        errors = [m for m in result.get("messages", []) if m.get("type") == "error"]
+        if not errors:
+            # Our own write bumps write_date: keep Odoo's new value, so the next
+            # incremental run can tell that nobody changed the product since
+            written = {it["row"]["product_id"]: it["row"] for it in pending}
+            for product in odoo.execute(MODEL, "search_read", [("id", "in", list(written))], fields=["write_date"]):
+                written[product["id"]]["write_date"] = product["write_date"]
+            break
+        failed = {m["record"] for m in errors if isinstance(m.get("record"), int)}
+        if not failed:
+            # Error not tied to a row: the whole batch fails
+            failed = set(range(len(pending)))
+        for i in sorted(failed):
+            message = next((m.get("message") for m in errors if m.get("record") == i), errors[0].get("message"))
+            pending[i]["row"].update(status="ERROR", notes=f"write failed: {message}")
+        pending = [it for i, it in enumerate(pending) if i not in failed]
+    return [it["row"] for it in items]
+
+
+def hold_back_review(items: list) -> None:
+    # Values that break the rules stay in the report for a human, not in Odoo
+    for it in items:
+        if it["row"]["status"] == "REVIEW" and it["vals"]:
+            it["vals"] = {}
+            it["row"]["notes"] += f"; {HELD_BACK}"
+
+
+def untouched(row: dict, product: dict, done: set) -> bool:
+    # Done and not modified since (the write_date of our own write is stored)
+    return bool(row) and row["status"] in done and bool(row["write_date"]) and row["write_date"] == product["write_date"]
+
+
+def skip_unchanged(store: ReportStore, products: list, previous: dict, force: bool, dry_run: bool, counts: dict, done: set = DONE_STATUSES) -> list:
+    """
+    Incremental mode: drops the products whose description has not changed
+    since they were processed (`previous`: report rows by product id, found
+    by id, ref or slug). Products done before the hash existed (empty hash)
+    are adopted as they are: their hash is recorded, SEO is not redone. The
+    write_date of the dropped ones is recorded too, so they are not read
+    again until they change.
+    """
+    keep, checked = [], {}
+    for product in products:
+        row = previous.get(product["id"])
+        if force or not row or row["status"] not in done:
+            keep.append(product)
+        elif row["description_hash"] and row["description_hash"] != description_hash(product):
+            keep.append(product)
+        else:
+            checked[row["product_key"]] = (description_hash(product), product.get("write_date") or "")
+    if checked and not dry_run:
+        store.set_checked(checked)
+    counts["UNCHANGED"] = counts.get("UNCHANGED", 0) + len(products) - len(keep)
+    return keep
+
+
+def chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Headless SEO pipeline for published products")
+    ap.add_argument("--url", default=os.environ.get("ODOO_URL", "https://palomar.xtd.es/"))
+    ap.add_argument("--db", default=os.environ.get("ODOO_DB", "palomar"))
+    ap.add_argument("--user", default=os.environ.get("ODOO_USER", "xtendoo"))
+    ap.add_argument("--password", default=os.environ.get("ODOO_PASSWORD"), help="Default: $ODOO_PASSWORD")
+    ap.add_argument("--protocol", choices=["xmlrpc", "jsonrpc"], default="xmlrpc")
+    ap.add_argument("--brand", default="Palomar", help="Store name at the end of the title")
+    ap.add_argument("--input", help="JSONL with SEO values generated beforehand")
+    ap.add_argument("--page-size", type=int, default=500, help="Products read per call")
+    ap.add_argument("--batch-size", type=int, default=200, help="Products written per `load`")
+    ap.add_argument("--workers", type=int, default=2, help="Batches written in parallel")
+    ap.add_argument("--limit", type=int, help="Process at most N products")
+    ap.add_argument("--force", action="store_true", help="Also reprocess products already in the report")
+    ap.add_argument(
+        "--write-review",
+        action="store_true",
+        help="Also write values that break the rules (REVIEW); they are only reported by default. Retries the REVIEW rows held back before",
+    )
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only products modified since the last incremental run (write_date) whose description changed",
+    )
+    ap.add_argument("--dry-run", action="store_true", help="Print what would be written; nothing is saved in Odoo or the report")
+    ap.add_argument("--report-db", default=os.path.join(os.getcwd(), DB_NAME))
+    ap.add_argument("--report-csv", default=os.path.join(os.getcwd(), CSV_NAME))
+    args = ap.parse_args()
+    if not args.password:
+        print("Missing password: use --password or ODOO_PASSWORD", file=sys.stderr)
+        sys.exit(2)
+
+    overrides = load_overrides(args.input) if args.input else {}
+    done_statuses = DONE_STATUSES - {"REVIEW"} if args.write_review else DONE_STATUSES
+    # A dry run leaves no files behind
+    report_db = ":memory:" if args.dry_run and not os.path.exists(args.report_db) else args.report_db
+    store = ReportStore(report_db, csv_path=args.report_csv)
+    odoo = OdooClient(args.url, args.db, protocol=args.protocol)
+    if not odoo.login(args.user, args.password):
+        print(f"Authentication failed for {args.user} on {args.db}", file=sys.stderr)
+        sys.exit(2)
+
+    counts = {}
+    previous, last_write_date = {}, None
+    if args.incremental:
+        # Everything modified since the watermark, oldest first, minus what was
+        # not touched after it was processed (e.g. our own writes of the last
+        # run); the description hash decides later which of the rest really
+        # need new SEO
+        watermark_key = f"write_date:{args.url.rstrip('/')}/{args.db}"
+        watermark = None if args.force else store.get_state(watermark_key)
+        domain = DOMAIN + ([("write_date", ">=", watermark)] if watermark else [])
+        listed = sorted(odoo.search_read_pages(MODEL, domain, LIST_FIELDS, LIST_PAGE_SIZE), key=lambda p: (p["write_date"] or "", p["id"]))
+        listed = listed[: args.limit]
+        last_write_date = max((p["write_date"] for p in listed if p["write_date"]), default=None)
+        previous = store.lookup_keys({p["id"]: product_keys(p["id"], p["default_code"], p["website_url"]) for p in listed})
+        todo = [p["id"] for p in listed if args.force or not untouched(previous.get(p["id"]), p, done_statuses)]
+        if len(todo) < len(listed):
+            counts["UNCHANGED"] = len(listed) - len(todo)
+        print(f"{len(listed)} published products modified since {watermark or 'the beginning'}, {len(listed) - len(todo)} untouched since processed", flush=True)
+    else:
+        listed = list(odoo.search_read_pages(MODEL, DOMAIN, LIST_FIELDS, LIST_PAGE_SIZE))
+        # Matched by id, ref or slug: products done with the browser flow count too
+        done = set() if args.force else store.processed_keys(done_statuses)
+        todo = [p["id"] for p in listed if done.isdisjoint(product_keys(p["id"], p["default_code"], p["website_url"]))]
+        print(f"{len(listed)} published products, {len(listed) - len(todo)} already in the report", flush=True)
+        todo = todo[: args.limit]
+
+    report_path = os.devnull if args.dry_run else args.report_csv
+    csv_exists = os.path.exists(report_path)
+    with open(report_path, "a", newline="", encoding="utf-8") as report_csv, ThreadPoolExecutor(max(1, args.workers) + 1) as pool:
+        w = csv.writer(report_csv)
+        if not csv_exists:
+            w.writerow(HEADER)
+
+        def log(rows):
+            ts = now()
+            for row in rows:
+                counts[row["status"]] = counts.get(row["status"], 0) + 1
+                if args.dry_run:
+                    print(f"[DRY] {row['product_id']} {row['status']}: {row.get('meta_title', '')} | {row.get('meta_description', '')} | {row.get('keywords', '')} ({row['notes']})")
+                    continue
+                row["timestamp"] = ts
+                w.writerow([row.get(c, "") for c in HEADER])
+            if not args.dry_run:
+                store.upsert(rows)
+                report_csv.flush()
+
+        def read(page):
+            return odoo.execute(MODEL, "search_read", [("id", "in", page)], fields=FIELDS, order="id asc")
+
+        pages = list(chunks(todo, args.page_size))
+        # Next page is read while the current one is generated and written
+        next_read = pool.submit(read, pages[0]) if pages else None
+        writing = set()
+        for n in range(len(pages)):
+            products = next_read.result()
+            next_read = pool.submit(read, pages[n + 1]) if n + 1 < len(pages) else None
+            if args.incremental:
+                products = skip_unchanged(store, products, previous, args.force, args.dry_run, counts, done_statuses)
+            items = [build_seo(p, args.brand, overrides.get(p["id"]) or overrides.get(p.get("default_code"))) for p in products]
+            if not args.write_review:
+                hold_back_review(items)
+            for batch in chunks(items, args.batch_size):
+                if len(writing) >= max(1, args.workers):
+                    finished, writing = wait(writing, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        log(fut.result())
+                writing.add(pool.submit(write_batch, odoo, batch, args.dry_run))
+            print(f"page {n + 1}/{len(pages)}: {min((n + 1) * args.page_size, len(todo))}/{len(todo)} products", flush=True)
+        for fut in writing:
+            log(fut.result())
+    if args.incremental and last_write_date and not args.dry_run and not counts.get("ERROR"):
+        # Failed products keep the old watermark so the next run fetches them again
+        store.set_state(watermark_key, last_write_date)
+        print(f"Watermark: {last_write_date}")
+    store.close()
+
+    summary = ", ".join(f"{status}={count}" for status, count in sorted(counts.items()) if count)
+    print(f"OK: {sum(counts.values())} products checked{' (dry run)' if args.dry_run else ''}: {summary or 'nothing to do'}")
+    sys.exit(1 if counts.get("ERROR") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+SEO content rules of references/skill.md as code: limits, checks and a
+deterministic generator (title, description, keywords) from the product name
+and its description_ecommerce.
+"""
+import html
+import re
+
+from normalize_keywords import normalize
+
+TITLE_MIN, TITLE_MAX = 50, 60
+DESC_MIN, DESC_MAX = 140, 160
+KEYWORDS_MIN, KEYWORDS_MAX = 8, 15
+
+# Empty keywords without purchase intent (seo_keyword_rules.md)
+GENERIC_KEYWORDS = {"producto", "productos", "oficial", "tienda", "tienda online", "online"}
+
+STOP_WORDS = {
+    "a", "al", "con", "de", "del", "e", "el", "en", "es", "la", "las", "lo", "los", "o", "para", "por",
+    "que", "se", "su", "sus", "u", "un", "una", "y", "muy", "mas", "más", "sin", "sobre", "como", "cada",
+    "todo", "toda", "todos", "todas", "este", "esta", "estos", "estas", "ideal", "gran",
+}
+
+TAG_RE = re.compile(r"<[^>]+>")
+SPACE_RE = re.compile(r"\s+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+PHRASE_SPLIT_RE = re.compile(r"[.,;:!?()\[\]\"/\n]+")
+
+
+def html_to_text(value) -> str:
+    # description_ecommerce is HTML (False when empty)
+    if not value:
+        return ""
+    text = TAG_RE.sub(" ", str(value))
+    return SPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def clean(value) -> str:
+    return SPACE_RE.sub(" ", str(value or "")).strip()
+
+
+def split_keywords(value) -> list:
+    return [k for k in normalize(value or "").split(", ") if k]
+
+
+def fit_words(text: str, limit: int) -> str:
+    # Longest prefix of whole words within `limit` characters
+    if len(text) <= limit:
+        return text
+    cut = text[: limit + 1].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:-|")
+
+
+def strip_stop_words(text: str) -> str:
+    # A cut title must not end in "de", "para la"...: drop trailing stop words
+    words = text.split()
+    while len(words) > 1 and words[-1].lower().strip(",;:-") in STOP_WORDS:
+        words.pop()
+    return " ".join(words).rstrip(" ,;:-|")
+
+
+def make_title(name: str, text: str, brand: str) -> str:
+    # "[Nombre Producto] [Atributo clave] | [Marca/Tienda]" within 50-60 chars
+    name = clean(name)
+    name = name[:1].upper() + name[1:]
+    suffix = f" | {brand}" if brand else ""
+    title = strip_stop_words(fit_words(name, TITLE_MAX - len(suffix)))
+    if len(title) + len(suffix) < TITLE_MIN and text:
+        # Key attribute: first words of the description not already in the name
+        seen = {w.lower() for w in title.split()}
+        for word in SENTENCE_RE.split(text)[0].rstrip(".!?").split():
+            if word.lower() in seen:
+                continue
+            candidate = f"{title} {word}" if " - " in title else f"{title} - {word}"
+            if len(candidate) + len(suffix) > TITLE_MAX:
+                break
+            title = candidate
+            seen.add(word.lower())
+            if len(title) + len(suffix) >= TITLE_MIN and word.lower() not in STOP_WORDS:
+                break
+        title = strip_stop_words(title)
+    return title + suffix
+
+
+def make_description(text: str) -> str:
+    # Whole sentences within 140-160 chars; a single long sentence is cut at a word
+    out = ""
+    for sentence in SENTENCE_RE.split(clean(text)):
+        candidate = f"{out} {sentence}".strip()
+        if len(candidate) > DESC_MAX:
+            break
+        out = candidate
+        if len(out) >= DESC_MIN:
+            break
+    if len(out) < DESC_MIN and len(clean(text)) > len(out):
+        out = fit_words(clean(text), DESC_MAX - 1).rstrip(".") + "."
+    return out
+
+
+def phrases(text: str):
+    # Candidate long-tail keywords: 2-5 word phrases between punctuation,
+    # without leading/trailing stop words
+    for phrase in PHRASE_SPLIT_RE.split(text.lower()):
+        words = phrase.split()
+        while words and words[0] in STOP_WORDS:
+            words.pop(0)
+        while words and words[-1] in STOP_WORDS:
+            words.pop()
+        if len(words) >= 2:
+            yield words
+
+
+def make_keywords(name: str, text: str, existing=None) -> list:
+    # Existing tags first, then the product name, then phrases of the text;
+    # long phrases only contribute their 3 and 2 word windows, if still short
+    candidates = split_keywords(existing) if isinstance(existing, str) else list(existing or [])
+    candidates.append(clean(name).lower())
+    found = list(phrases(text))
+    candidates += [" ".join(words) for words in found if len(set(words)) == len(words) <= 5]
+    for size in (3, 2):
+        for words in found:
+            for i in range(len(words) - size + 1):
+                window = words[i : i + size]
+                if window[0] not in STOP_WORDS and window[-1] not in STOP_WORDS and len(set(window)) == size:
+                    candidates.append(" ".join(window))
+    keywords = [k for k in split_keywords(", ".join(candidates)) if k not in GENERIC_KEYWORDS]
+    return keywords[:KEYWORDS_MAX]
+
+
+def violations(meta_title: str, meta_description: str, keywords) -> list:
+    # Rule violations of one product as (rule, detail); [] if it follows references/skill.md
+    found = []
+    if not TITLE_MIN <= len(meta_title or "") <= TITLE_MAX:
+        found.append(("title_length", f"title length {len(meta_title or '')} not in {TITLE_MIN}-{TITLE_MAX}"))
+    if not DESC_MIN <= len(meta_description or "") <= DESC_MAX:
+        found.append(("description_length", f"description length {len(meta_description or '')} not in {DESC_MIN}-{DESC_MAX}"))
+    if isinstance(keywords, str):
+        keywords = [k.strip() for k in keywords.split(",") if k.strip()]
+    if not KEYWORDS_MIN <= len(keywords) <= KEYWORDS_MAX:
+        found.append(("keywords_count", f"{len(keywords)} keywords not in {KEYWORDS_MIN}-{KEYWORDS_MAX}"))
+    if any(k != k.lower() for k in keywords):
+        found.append(("keywords_case", "keywords not lowercase"))
+    if len(set(keywords)) != len(keywords):
+        found.append(("keywords_duplicated", "duplicated keywords"))
+    return found
+
+
+def check(meta_title: str, meta_description: str, keywords) -> list:
+    return [detail for _, detail in violations(meta_title, meta_description, keywords)]
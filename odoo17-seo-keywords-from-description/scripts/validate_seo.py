@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Catalog-wide SEO validation in one pass: length and keyword rules of
+references/skill.md for every product, plus products sharing the same meta
+title or description (exact or normalized: case, accents, punctuation).
+
+Reads the report store (default) or the live catalog (--catalog) and writes a
+violations CSV; exits with 1 when there are more than --max-violations, so a
+nightly run can be gated on it.
+
+Usage:
+    python scripts/validate_seo.py --out seo_violations.csv
+    python scripts/validate_seo.py --catalog --url https://palomar.xtd.es/ --db palomar --user xtendoo
+"""
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sys
+import time
+import unicodedata
+
+from odoo_rpc import OdooClient
+from report_store import DB_NAME, ReportStore
+from seo_pipeline import DOMAIN, MODEL
+from seo_rules import violations
+
+REPORT_HEADER = ["product", "product_ref", "product_name", "rule", "detail"]
+
+# Statuses of report rows that carry SEO to validate
+VALIDATED_STATUSES = ("OK", "REVIEW")
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+# Combining diacritical marks left by NFKD (á -> a + U+0301)
+DIACRITICS_RE = re.compile("[\u0300-\u036f]+")
+
+
+def normalized(text: str) -> str:
+    # Lowercase, no accents, only letters/digits separated by single spaces
+    text = text.casefold()
+    if not text.isascii():
+        text = DIACRITICS_RE.sub("", unicodedata.normalize("NFKD", text))
+    return NON_WORD_RE.sub(" ", text).strip()
+
+
+def digest(text: str) -> bytes:
+    # 16-byte key instead of the full text: the indexes of 100k products stay small
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def store_products(path: str):
+    with ReportStore(path) as store:
+        for row in store.rows(VALIDATED_STATUSES):
+            yield {
+                "product": row["product_id"] or row["product_key"],
+                "product_ref": row["product_ref"],
+                "product_name": row["product_name"],
+                "meta_title": row["meta_title"],
+                "meta_description": row["meta_description"],
+                "keywords": row["keywords"],
+            }
+
+
+def catalog_products(args):
+    # Published products with a description, read with keyset pagination
+    odoo = OdooClient(args.url, args.db, protocol=args.protocol)
+    if not odoo.login(args.user, args.password):
+        print(f"Authentication failed for {args.user} on {args.db}", file=sys.stderr)
+        sys.exit(2)
+    fields = ["name", "default_code", "website_meta_title", "website_meta_description", "website_meta_keywords"]
+    domain = DOMAIN + [("description_ecommerce", "!=", False)]
+    for p in odoo.search_read_pages(MODEL, domain, fields, page_size=args.page_size):
+        yield {
+            "product": p["id"],
+            "product_ref": p.get("default_code") or "",
+            "product_name": p["name"],
+            "meta_title": p.get("website_meta_title") or "",
+            "meta_description": p.get("website_meta_description") or "",
+            "keywords": p.get("website_meta_keywords") or "",
+        }
+
+
+class DuplicateIndex:
+    """
+    Hash indexes of one field: exact value and normalized value -> products.
+    A product is reported if its normalized value is shared; the rule says
+    whether the text is identical or only equal once normalized.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.exact = {}
+        self.normal = {}
+
+    def add(self, product, text: str) -> None:
+        if not text:
+            return
+        self.exact.setdefault(digest(text), []).append(product)
+        self.normal.setdefault(digest(normalized(text)), []).append((product, digest(text)))
+
+    def detail(self, members, count, product) -> str:
+        # First 5 other products of a member list (only its first 6 are kept)
+        shown = [p for p in members if p != product][:5]
+        more = count - 1 - len(shown)
+        return f"same {self.field} as {', '.join(str(p) for p in shown)}" + (f" (+{more} more)" if more > 0 else "")
+
+    def duplicates(self):
+        # Linear in the catalog: each group's member list is built once
+        for group in self.normal.values():
+            if len(group) < 2:
+                continue
+            others = [p for p, _ in group[:6]]
+            for product, exact_key in group:
+                same = self.exact[exact_key]
+                if len(same) > 1:
+                    yield product, f"duplicate_{self.field}", self.detail(same[:6], len(same), product)
+                else:
+                    yield product, f"duplicate_{self.field}_normalized", self.detail(others, len(group), product)
+
+
+def validate(products, out) -> dict:
+    # Writes one CSV line per violation, returns the count per rule
+    w = csv.writer(out)
+    w.writerow(REPORT_HEADER)
+    counts = {}
+    info = {}
+    titles, descriptions = DuplicateIndex("title"), DuplicateIndex("description")
+
+    def emit(product, rule, detail):
+        ref, name = info[product]
+        w.writerow([product, ref, name, rule, detail])
+        counts[rule] = counts.get(rule, 0) + 1
+
+    for p in products:
+        product = p["product"]
+        info[product] = (p["product_ref"], p["product_name"])
+        title, desc = (p["meta_title"] or "").strip(), (p["meta_description"] or "").strip()
+        keywords = [k.strip() for k in (p["keywords"] or "").split(",") if k.strip()]
+        for rule, detail in violations(title, desc, keywords):
+            emit(product, rule, detail)
+        if any(" ".join(k.split()) != k for k in keywords):
+            emit(product, "keywords_format", "repeated or odd spaces in keywords")
+        titles.add(product, title)
+        descriptions.add(product, desc)
+    for index in (titles, descriptions):
+        for product, rule, detail in index.duplicates():
+            emit(product, rule, detail)
+    counts["_products"] = len(info)
+    return counts
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Validate the SEO of the whole catalog")
+    ap.add_argument("--report-db", default=os.path.join(os.getcwd(), DB_NAME), help="Report store to validate")
+    ap.add_argument("--catalog", action="store_true", help="Validate the live catalog in Odoo instead of the report")
+    ap.add_argument("--url", default=os.environ.get("ODOO_URL", "https://palomar.xtd.es/"))
+    ap.add_argument("--db", default=os.environ.get("ODOO_DB", "palomar"))
+    ap.add_argument("--user", default=os.environ.get("ODOO_USER", "xtendoo"))
+    ap.add_argument("--password", default=os.environ.get("ODOO_PASSWORD"), help="Default: $ODOO_PASSWORD")
+    ap.add_argument("--protocol", choices=["xmlrpc", "jsonrpc"], default="xmlrpc")
+    ap.add_argument("--page-size", type=int, default=2000)
+    ap.add_argument("--out", help="Violations CSV (stdout by default)")
+    ap.add_argument("--max-violations", type=int, default=0, help="Exit with 1 above this number")
+    args = ap.parse_args()
+
+    if args.catalog:
+        if not args.password:
+            print("Missing password: use --password or ODOO_PASSWORD", file=sys.stderr)
+            sys.exit(2)
+        products = catalog_products(args)
+    elif not os.path.exists(args.report_db):
+        print(f"Report store not found: {args.report_db}", file=sys.stderr)
+        sys.exit(2)
+    else:
+        products = store_products(args.report_db)
+
+    start = time.monotonic()
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            counts = validate(products, f)
+    else:
+        counts = validate(products, sys.stdout)
+    checked = counts.pop("_products")
+    total = sum(counts.values())
+    for rule, count in sorted(counts.items()):
+        print(f"  {rule}: {count}", file=sys.stderr)
+    print(f"{'OK' if total <= args.max_violations else 'FAIL'}: {checked} products, {total} violations ({time.monotonic() - start:.1f}s)", file=sys.stderr)
+    sys.exit(0 if total <= args.max_violations else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import ssl
+import sys
+import urllib.parse
+
+# Transporte JSON-RPC de provision.py (pool keep-alive, gzip, orjson/ujson)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "odoo-provisioning")
+)
+from provision import HTTPConnectionPool, JsonRpcProxy  # noqa: E402
+
+
+def jsonrpc_services(url):
+    # Proxies `common` y `object` de /jsonrpc sobre un único pool de conexiones
+    parts = urllib.parse.urlsplit(url)
+    context = ssl._create_unverified_context()
+    pool = HTTPConnectionPool(parts.scheme, parts.netloc, context=context)
+    path = f"{parts.path.rstrip('/')}/jsonrpc"
+    return JsonRpcProxy(pool, path, "common"), JsonRpcProxy(pool, path, "object")